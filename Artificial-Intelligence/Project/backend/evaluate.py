@@ -0,0 +1,115 @@
+"""
+Evaluation Script for Breast Tumor Classifier
+=============================================
+
+Evaluates any checkpoint on a dataset split without retraining (a weights
+file such as best_model.pth, or the training state in last_checkpoint.pth):
+confusion matrix, accuracy, per-class precision/recall/F1, sensitivity and
+specificity for the malignant class, ROC-AUC and calibration (ECE, Brier,
+reliability bins).
+
+Outputs:
+    models/evaluation_report.json        Machine-readable metrics report
+
+Usage:
+    python3 evaluate.py --checkpoint models/best_model.pth --split test
+    python3 evaluate.py --checkpoint models/final_model.pth --split val --output models/val_report.json
+    python3 evaluate.py --checkpoint models/last_checkpoint.pth --split val
+"""
+
+import os
+import sys
+import time
+import argparse
+
+from src.ml.checkpoint import load_checkpoint
+from src.ml.cnn_classifier import model_from_state_dict
+from src.ml.evaluation import evaluate_model, format_summary, write_report
+from train import EVAL_IMAGE_SIZE, PRECISIONS, get_device, get_transforms, load_split, make_loader
+
+
+def load_weights(path: str, device):
+    """
+    Classifier from a weights file (best_model.pth, final_model.pth) or from
+    the "model" entry of a training-state checkpoint (last_checkpoint.pth).
+    """
+    state = load_checkpoint(path, map_location=device)
+    if isinstance(state.get("model"), dict):
+        state = state["model"]
+    return model_from_state_dict(state)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate Breast Tumor Classifier')
+    parser.add_argument('--checkpoint', type=str, default='models/best_model.pth')
+    parser.add_argument('--data-dir', type=str, default='../datasets/mammograms')
+    parser.add_argument('--split', type=str, default='test')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Report path (default: evaluation_report.json next to the checkpoint)')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--num-workers', type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument('--prefetch-factor', type=int, default=2)
+    parser.add_argument('--pin-memory', action=argparse.BooleanOptionalAction, default=None)
+    parser.add_argument('--precision', type=str, choices=list(PRECISIONS), default='fp32')
+    parser.add_argument('--positive-class', type=str, default='malignant')
+    parser.add_argument('--calibration-bins', type=int, default=15)
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Preprocessed image cache (default: <data-dir>/.cache)')
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in ('checkpoint', 'data_dir'):
+        if not os.path.isabs(getattr(args, name)):
+            setattr(args, name, os.path.join(base_dir, getattr(args, name)))
+    if args.cache_dir is None:
+        args.cache_dir = os.path.join(args.data_dir, '.cache')
+    split_dir = os.path.join(args.data_dir, args.split)
+    if not os.path.exists(args.checkpoint):
+        print(f"Error: Checkpoint not found: {args.checkpoint}")
+        return 1
+    if not os.path.exists(split_dir):
+        print(f"Error: Split not found: {split_dir}")
+        return 1
+
+    device = get_device()
+    model = load_weights(args.checkpoint, device).to(device)
+
+    _, val_transform = get_transforms(resize=args.no_cache)
+    dataset = load_split(args, split_dir, EVAL_IMAGE_SIZE, val_transform)
+    loader = make_loader(dataset, args, device)
+    if args.positive_class not in dataset.classes:
+        print(f"Error: Unknown positive class {args.positive_class!r} (classes: {dataset.classes})")
+        return 1
+
+    print(f"Evaluating {args.checkpoint} on {len(dataset)} images from {split_dir}...")
+    start = time.perf_counter()
+    accumulator = evaluate_model(
+        model, loader, device, num_classes=len(dataset.classes),
+        autocast_dtype=PRECISIONS[args.precision]
+    )
+    seconds = time.perf_counter() - start
+    metrics = accumulator.metrics(
+        dataset.classes,
+        positive_class=dataset.classes.index(args.positive_class),
+        calibration_bins=args.calibration_bins
+    )
+
+    print("\n" + "=" * 60)
+    print(format_summary(metrics))
+    print(f"Evaluated in {seconds:.1f}s ({len(dataset) / max(seconds, 1e-9):.1f} images/s)")
+
+    output = args.output or os.path.join(os.path.dirname(args.checkpoint), 'evaluation_report.json')
+    write_report({
+        "checkpoint": args.checkpoint,
+        "data_dir": split_dir,
+        "precision": args.precision,
+        "seconds": round(seconds, 2),
+        **metrics,
+    }, output)
+    print(f"Report written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Export Script for Breast Tumor Classifier
+=========================================
+
+Turns a trained checkpoint into graph-optimized inference artifacts and
+checks that each one reproduces the eager PyTorch outputs. An artifact
+that fails the check is deleted and the script exits with status 1.
+
+    torchscript -> models/best_model.torchscript.pt  (traced and frozen)
+    onnx        -> models/best_model.onnx            (dynamic batch axis)
+
+Select the artifact at serving time with INFERENCE_BACKEND=torchscript|onnx.
+INFERENCE_BACKEND=compile needs no export (torch.compile runs at startup).
+
+Usage:
+    python3 export_model.py --checkpoint models/best_model.pth --formats torchscript onnx
+    python3 export_model.py --verify-dir ../datasets/mammograms/test --num-images 64
+"""
+
+import os
+import sys
+import argparse
+import time
+
+import torch
+import torch.nn.functional as F
+
+from src.ml.cnn_classifier import BreastTumorClassifier
+from src.ml.backends import create_backend, default_artifact_path
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+def export_torchscript(model: torch.nn.Module, path: str, example: torch.Tensor):
+    """Trace and freeze the model (weights become constants)."""
+    with torch.no_grad():
+        frozen = torch.jit.freeze(torch.jit.trace(model, example))
+    frozen.save(path)
+
+
+def export_onnx(model: torch.nn.Module, path: str, example: torch.Tensor):
+    """Export the model to ONNX with a dynamic batch dimension."""
+    torch.onnx.export(
+        model,
+        (example,),
+        path,
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=17,
+        # TorchScript-based exporter (the default flipped to the dynamo exporter in torch 2.9)
+        dynamo=False
+    )
+
+
+EXPORTERS = {
+    "torchscript": export_torchscript,
+    "onnx": export_onnx,
+}
+
+
+def load_parity_inputs(classifier: BreastTumorClassifier, verify_dir: str, num_images: int) -> torch.Tensor:
+    """
+    Fixed input set for the parity check: the first `num_images` images
+    (sorted by path) under `verify_dir`, or seeded random tensors.
+    """
+    paths = []
+    if verify_dir:
+        for root, _, files in os.walk(verify_dir):
+            paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+        paths = sorted(paths)[:num_images]
+
+    if paths:
+        print(f"Parity set: {len(paths)} images from {verify_dir}")
+        tensors = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                tensors.append(classifier.preprocess(f.read()))
+        return torch.stack(tensors)
+
+    print(f"Parity set: {num_images} seeded random inputs")
+    generator = torch.Generator().manual_seed(0)
+    return torch.randn(num_images, 3, *classifier.input_size, generator=generator)
+
+
+def check_parity(classifier, backend, inputs: torch.Tensor, batch_size: int, atol: float) -> bool:
+    """Compare backend probabilities against eager outputs batch by batch."""
+    max_diff, agree, latency = 0.0, 0, 0.0
+
+    for start in range(0, len(inputs), batch_size):
+        batch = inputs[start:start + batch_size].to(classifier.device)
+        with torch.no_grad():
+            expected = F.softmax(classifier.model(batch), dim=1)
+
+        begin = time.perf_counter()
+        actual = F.softmax(backend(batch), dim=1)
+        latency += time.perf_counter() - begin
+
+        max_diff = max(max_diff, (expected - actual).abs().max().item())
+        agree += expected.argmax(1).eq(actual.argmax(1)).sum().item()
+
+    passed = max_diff <= atol and agree == len(inputs)
+    print(f"  max |Δp|: {max_diff:.2e} | argmax agreement: {agree}/{len(inputs)} | "
+          f"{len(inputs) / latency:.1f} img/s | {'PASS' if passed else 'FAIL'}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export Breast Tumor Classifier')
+    parser.add_argument('--checkpoint', type=str, default='models/best_model.pth')
+    parser.add_argument('--formats', nargs='+', choices=list(EXPORTERS), default=list(EXPORTERS))
+    parser.add_argument('--verify-dir', type=str, default=None,
+                        help='Directory of images for the parity check (default: random inputs)')
+    parser.add_argument('--num-images', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--atol', type=float, default=1e-4,
+                        help='Max allowed difference in class probabilities')
+
+    args = parser.parse_args()
+
+    if not os.path.isabs(args.checkpoint):
+        args.checkpoint = os.path.join(os.path.dirname(__file__), args.checkpoint)
+    if not os.path.exists(args.checkpoint):
+        print(f"Error: Checkpoint not found: {args.checkpoint}")
+        return 1
+
+    # Export on CPU so artifacts run on the CPU-only serving nodes
+    classifier = BreastTumorClassifier(model_path=args.checkpoint, device="cpu")
+    example = torch.zeros(1, 3, *classifier.input_size)
+    inputs = load_parity_inputs(classifier, args.verify_dir, args.num_images)
+
+    all_passed = True
+    for fmt in args.formats:
+        path = default_artifact_path(args.checkpoint, fmt)
+        print(f"\nExporting {fmt} -> {path}")
+        EXPORTERS[fmt](classifier.model, path, example)
+
+        backend = create_backend(fmt, classifier.model, artifact_path=path, device=classifier.device)
+        if not check_parity(classifier, backend, inputs, args.batch_size, args.atol):
+            # Don't leave an artifact behind that INFERENCE_BACKEND could pick up
+            os.remove(path)
+            print(f"  Removed {path}: outputs differ from the eager model")
+            all_passed = False
+
+    eager = create_backend("eager", classifier.model)
+    print("\nEager reference:")
+    check_parity(classifier, eager, inputs, args.batch_size, args.atol)
+
+    if not all_passed:
+        print("\nError: parity check failed (see FAIL above)")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
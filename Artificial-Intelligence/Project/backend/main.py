@@ -3,14 +3,41 @@ Breast Tumor Diagnosis System - FastAPI Backend
 Main application entry point
 """
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Match
 import uvicorn
+import asyncio
+import time
 import os
 
-from src.api.routes import router
+from src.api.routes import router, load_models, close_models, collect_cache_stats, get_job_manager
+from src.api.executor import run_inference, run_preprocess, shutdown_executors
+from src.api.uploads import UploadLimitMiddleware, MB
+from src.config import get_settings
+from src.metrics import REQUESTS, REQUEST_SECONDS, IN_FLIGHT, render_metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load and warm up the models in the background; release resources on exit."""
+    settings = get_settings()
+    loading = asyncio.create_task(run_inference(load_models, settings.warmup_batch_sizes))
+    # Failures are reported through /api/ready; don't log them again as unretrieved
+    loading.add_done_callback(lambda task: task.cancelled() or task.exception())
+    # Job workers wait for the load themselves
+    get_job_manager().start(recover=app.state.recover_jobs)
+    yield
+    if not loading.done():
+        loading.cancel()
+    await close_models()
+    shutdown_executors()
+
 
 # Create FastAPI app
 app = FastAPI(
@@ -20,7 +47,23 @@ app = FastAPI(
     """,
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
+)
+# serve.py re-queues interrupted jobs once, before forking its workers
+app.state.recover_jobs = True
+
+# Reject oversized uploads before they are read. /api/jobs also takes
+# batch archives; single-image jobs are checked against MAX_UPLOAD_MB
+# once their form is parsed
+settings = get_settings()
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_bytes=int(settings.max_upload_mb * MB),
+    path_limits={
+        "/api/diagnose/batch": int(settings.max_batch_upload_mb * MB),
+        "/api/jobs": int(settings.max_batch_upload_mb * MB)
+    }
 )
 
 # Configure CORS for frontend
@@ -41,6 +84,51 @@ app.add_middleware(
 app.include_router(router, prefix="/api", tags=["Diagnosis"])
 
 
+def _route_path(request: Request) -> str:
+    """Route template for a request (e.g. /api/diagnose), keeping metric labels bounded."""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Count requests and time them end to end, per route.
+    
+    call_next returns as soon as the headers are ready, so the request is
+    only recorded once its body has been sent: streaming endpoints (NDJSON
+    /api/diagnose/batch, SSE job events) are timed to their last chunk.
+    """
+    endpoint = _route_path(request)
+    IN_FLIGHT.inc(endpoint=endpoint)
+    start = time.perf_counter()
+    
+    def finish(status: int):
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, method=request.method, status=status)
+        IN_FLIGHT.dec(endpoint=endpoint)
+    
+    try:
+        response = await call_next(request)
+    except BaseException:
+        finish(500)
+        raise
+    response.body_iterator = _finish_after_body(response.body_iterator, finish, response.status_code)
+    return response
+
+
+async def _finish_after_body(body: AsyncIterator[bytes], finish, status: int) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        # Also runs when the client disconnects mid-stream
+        finish(status)
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
@@ -50,12 +138,24 @@ async def root():
         "documentation": "/docs",
         "endpoints": {
             "health": "/api/health",
+            "ready": "/api/ready",
             "diagnose": "/api/diagnose",
-            "gradcam": "/api/gradcam"
+            "gradcam": "/api/gradcam",
+            "jobs": "/api/jobs",
+            "metrics": "/metrics"
         }
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: request rates, per-stage latencies, batch sizes and cache hits."""
+    collect_cache_stats()
+    # Under serve.py this reads the other workers' snapshots from disk
+    text = await run_preprocess(render_metrics)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler."""
@@ -0,0 +1,165 @@
+"""
+INT8 Quantization Script for Breast Tumor Classifier
+====================================================
+
+Calibrates a static INT8 backbone + dynamic INT8 fc head on a sample of
+the validation split used by train.py, then compares accuracy and latency
+against the FP32 model.
+
+Outputs:
+    models/best_model.int8.pt            TorchScript INT8 model (INFERENCE_BACKEND=quantized)
+    models/quantization_report.json      FP32 vs INT8 accuracy, latency and size
+
+Usage:
+    python3 quantize.py --data-dir ../datasets/mammograms --calibration-images 256
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+import torch
+from torch.utils.data import DataLoader, Subset
+from torchvision import datasets
+
+from src.ml.cnn_classifier import TransferLearningCNN
+from src.ml.backends import default_artifact_path
+from src.ml.quantization import quantize_model, default_engine
+from train import get_transforms
+
+
+def evaluate(model, loader) -> dict:
+    """Accuracy of a model and its predictions over a loader."""
+    correct, total, predictions = 0, 0, []
+    with torch.no_grad():
+        for images, labels in loader:
+            predicted = model(images).argmax(1)
+            correct += predicted.eq(labels).sum().item()
+            total += labels.size(0)
+            predictions.append(predicted)
+    return {"accuracy": correct / total if total else 0.0, "predictions": torch.cat(predictions)}
+
+
+def measure_latency(model, batch_size: int, repeats: int = 10) -> float:
+    """Median forward latency in milliseconds for one batch."""
+    batch = torch.randn(batch_size, 3, 224, 224)
+    timings = []
+    with torch.no_grad():
+        model(batch)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model(batch)
+            timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantize Breast Tumor Classifier to INT8')
+    parser.add_argument('--checkpoint', type=str, default='models/best_model.pth')
+    parser.add_argument('--data-dir', type=str, default='../datasets/mammograms')
+    parser.add_argument('--calibration-images', type=int, default=256)
+    parser.add_argument('--eval-split', type=str, default='test',
+                        help='Split used for the accuracy comparison (falls back to val)')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--latency-batch-sizes', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--engine', type=str, default=None,
+                        help='Quantized engine: x86, fbgemm or qnnpack (default: auto)')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=42)
+
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(__file__)
+    if not os.path.isabs(args.checkpoint):
+        args.checkpoint = os.path.join(base_dir, args.checkpoint)
+    if not os.path.isabs(args.data_dir):
+        args.data_dir = os.path.join(base_dir, args.data_dir)
+
+    val_dir = os.path.join(args.data_dir, 'val')
+    eval_dir = os.path.join(args.data_dir, args.eval_split)
+    if not os.path.exists(eval_dir):
+        eval_dir = val_dir
+    for path in (args.checkpoint, val_dir):
+        if not os.path.exists(path):
+            print(f"Error: Not found: {path}")
+            return 1
+
+    engine = args.engine or default_engine()
+    print(f"Quantized engine: {engine}")
+
+    # Float reference
+    model = TransferLearningCNN(num_classes=2, pretrained=False)
+    model.load_state_dict(torch.load(args.checkpoint, map_location="cpu"))
+    model.eval()
+
+    # Calibration sample from the validation split, preprocessed like train.py
+    _, val_transform = get_transforms()
+    val_dataset = datasets.ImageFolder(val_dir, transform=val_transform)
+    generator = torch.Generator().manual_seed(args.seed)
+    count = min(args.calibration_images, len(val_dataset))
+    indices = torch.randperm(len(val_dataset), generator=generator)[:count].tolist()
+    calibration_loader = DataLoader(Subset(val_dataset, indices), batch_size=args.batch_size)
+    print(f"Calibrating on {count} validation images...")
+
+    quantized = quantize_model(model, (images for images, _ in calibration_loader), engine)
+
+    # Save as TorchScript so serving doesn't need the FX graph code
+    output_path = default_artifact_path(args.checkpoint, "quantized")
+    with torch.no_grad():
+        scripted = torch.jit.freeze(torch.jit.trace(quantized, torch.zeros(1, 3, 224, 224)))
+    torch.jit.save(scripted, output_path, _extra_files={"engine": engine})
+    print(f"Saved INT8 model to {output_path}")
+
+    # Accuracy and latency comparison
+    eval_dataset = datasets.ImageFolder(eval_dir, transform=val_transform)
+    eval_loader = DataLoader(eval_dataset, batch_size=args.batch_size, shuffle=False)
+    print(f"Evaluating on {len(eval_dataset)} images from {eval_dir}...")
+
+    report = {
+        "engine": engine,
+        "calibration_images": count,
+        "eval_dir": eval_dir,
+        "eval_images": len(eval_dataset),
+        "threads": torch.get_num_threads(),
+    }
+    results = {}
+    for name, net, path in (("fp32", model, args.checkpoint), ("int8", scripted, output_path)):
+        results[name] = evaluate(net, eval_loader)
+        report[name] = {
+            "accuracy": round(results[name]["accuracy"], 4),
+            "latency_ms": {str(bs): measure_latency(net, bs) for bs in args.latency_batch_sizes},
+            "size_mb": round(os.path.getsize(path) / 1024 ** 2, 2),
+        }
+
+    accuracy_drop = report["fp32"]["accuracy"] - report["int8"]["accuracy"]
+    agreement = results["fp32"]["predictions"].eq(results["int8"]["predictions"]).float().mean().item()
+    report.update({
+        "accuracy_drop": round(accuracy_drop, 4),
+        "prediction_agreement": round(agreement, 4),
+        "max_accuracy_drop": args.max_accuracy_drop,
+        "within_tolerance": accuracy_drop <= args.max_accuracy_drop,
+    })
+
+    report_path = os.path.join(os.path.dirname(output_path), 'quantization_report.json')
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("\n" + "=" * 60)
+    print(f"{'':8s}{'accuracy':>10s}{'size MB':>10s}" +
+          "".join(f"{'bs=' + str(bs) + ' ms':>12s}" for bs in args.latency_batch_sizes))
+    for name in ("fp32", "int8"):
+        row = report[name]
+        print(f"{name:8s}{row['accuracy']:>10.4f}{row['size_mb']:>10.1f}" +
+              "".join(f"{row['latency_ms'][str(bs)]:>12.1f}" for bs in args.latency_batch_sizes))
+    print(f"Accuracy drop: {accuracy_drop:.4f} (tolerance {args.max_accuracy_drop}) -> "
+          f"{'OK to enable' if report['within_tolerance'] else 'keep FP32'}")
+    print(f"Report written to {report_path}")
+
+    return 0 if report["within_tolerance"] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Production Launcher for the Diagnosis API
+=========================================
+
+Loads the classifier once in a parent process, then forks uvicorn workers
+that accept connections on one shared listening socket.
+
+The checkpoint is memory-mapped and the model's parameters are the mapped
+pages themselves, so every worker reads the same physical copy of the
+weights and memory per node stays flat as workers are added. Each worker
+gets its own share of the cores for PyTorch and OpenCV threads, runs its
+own warmup, and is restarted by the parent if it dies; the jobs it was
+running are re-queued for its replacement. Workers share
+their metrics through METRICS_DIR, so /metrics reports the whole server
+whichever worker answers the scrape.
+
+main.py (uvicorn with reload) remains the development server.
+
+Usage:
+    python3 serve.py --workers 4 --port 8000
+    WORKERS=4 TORCH_THREADS=2 python3 serve.py
+"""
+
+import os
+import sys
+import argparse
+import signal
+import socket
+import tempfile
+import time
+import traceback
+
+import uvicorn
+
+from main import app
+from src.api import routes
+from src.api.executor import configure_native_threads
+from src.config import get_settings
+from src.metrics import enable_multiprocess, reset_multiprocess_dir
+
+
+def preload():
+    """Build every model in the parent so forked workers inherit them."""
+    start = time.perf_counter()
+    # No forward pass here: thread pools started before fork() are not
+    # usable in the children, so warmup runs in each worker's lifespan
+    routes.get_classifier()
+    routes.get_expert_system()
+    routes.get_fuzzy_system()
+    print(f"Preloaded models in {time.perf_counter() - start:.3f}s")
+
+    requeued = routes.recover_jobs()
+    if requeued:
+        print(f"Re-queued {requeued} interrupted job(s)")
+    app.state.recover_jobs = False
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(index: int, workers: int, sock: socket.socket, args) -> int:
+    """Body of a forked worker process; returns its exit code."""
+    # Leave terminal signals to the parent, which forwards a single SIGTERM
+    os.setpgid(0, 0)
+    intra_op, inter_op = configure_native_threads(workers)
+    enable_multiprocess(args.metrics_dir)
+    print(f"Worker {index} (pid {os.getpid()}): {intra_op} intra-op / {inter_op} inter-op threads")
+
+    config = uvicorn.Config(
+        app,
+        log_level=args.log_level,
+        timeout_keep_alive=args.timeout_keep_alive
+    )
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    # Exit code 3 tells the parent not to restart a worker that cannot start
+    return 0 if server.started else 3
+
+
+def spawn(index: int, workers: int, sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            code = run_worker(index, workers, sock, args)
+        except BaseException:
+            traceback.print_exc()
+            code = 3
+        finally:
+            sys.stdout.flush()
+            os._exit(code)
+    return pid
+
+
+def main():
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description='Serve the Breast Tumor Diagnosis API with prefork workers')
+    parser.add_argument('--host', type=str, default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=settings.workers)
+    parser.add_argument('--backlog', type=int, default=2048)
+    parser.add_argument('--timeout-keep-alive', type=int, default=5)
+    parser.add_argument('--log-level', type=str, default='info')
+    args = parser.parse_args()
+    workers = max(1, args.workers)
+
+    args.metrics_dir = settings.metrics_dir or tempfile.mkdtemp(prefix="diagnosis-metrics-")
+    reset_multiprocess_dir(args.metrics_dir)
+
+    preload()
+    sock = bind_socket(args.host, args.port, args.backlog)
+    print(f"Listening on {args.host}:{args.port} with {workers} worker(s)")
+
+    children = {spawn(index, workers, sock, args): index for index in range(workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        if code == 3:
+            print(f"Worker {index} (pid {pid}) failed to start, shutting down")
+            stop(signal.SIGTERM, None)
+            continue
+        print(f"Worker {index} (pid {pid}) exited with {code}, restarting")
+        # The replacement picks these up when its job workers start
+        requeued = routes.recover_jobs(owner_pid=pid)
+        if requeued:
+            print(f"Re-queued {requeued} job(s) of worker {index}")
+        time.sleep(1)
+        children[spawn(index, workers, sock, args)] = index
+
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
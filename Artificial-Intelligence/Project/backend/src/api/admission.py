@@ -0,0 +1,164 @@
+"""
+Admission Control for Inference Routes
+Bounded concurrency, a bounded wait queue and per-request deadlines, shedding load with 429/503
+"""
+
+import asyncio
+import collections
+import math
+import time
+from typing import Awaitable, Callable, Deque, TypeVar
+
+from fastapi import HTTPException
+
+from ..metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_SHED
+
+
+T = TypeVar("T")
+
+
+class AdmissionController:
+    """
+    Admission budget for one class of requests (e.g. diagnose, gradcam).
+
+    Up to `max_in_flight` requests run at once; the next `max_queue` wait
+    in FIFO order. A request is shed instead of queued when:
+
+    - the queue is full (429),
+    - its expected wait, from the recent service time, would exceed
+      `queue_timeout` (503, rejected up front instead of timing out later),
+    - it actually waits longer than `queue_timeout` (503).
+
+    Admitted requests that run longer than `deadline` are abandoned with
+    503 so a burst cannot grow latency without bound. Their slot stays taken
+    until the abandoned work has actually stopped (executor calls and
+    dispatched batches cannot be interrupted), so `max_in_flight` bounds the
+    CPU work, not just the waiting clients. Every rejection carries a
+    Retry-After estimate.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float,
+        deadline: float
+    ):
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.deadline = deadline
+
+        self.in_flight = 0
+        self.shed = collections.Counter()
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+        # Exponentially weighted mean service time, seeded on first completion
+        self._service_time = None
+
+    async def run(self, func: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """Run `func(*args, **kwargs)` once admitted, within the request deadline."""
+        await self._acquire()
+        start = time.perf_counter()
+        task = asyncio.ensure_future(func(*args, **kwargs))
+        task.add_done_callback(lambda task: self._finish(task, start))
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=self.deadline or None)
+        except asyncio.TimeoutError:
+            task.cancel()
+            self._reject("deadline", 503, f"{self.name} did not finish within {self.deadline:g}s")
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "mean_service_seconds": round(self._service_time or 0.0, 4),
+            "shed": dict(self.shed),
+        }
+
+    def _expected_wait(self, position: int) -> float:
+        """Seconds until a request at queue `position` (1-based) gets a slot."""
+        if self._service_time is None:
+            return 0.0
+        return math.ceil(position / self.max_in_flight) * self._service_time
+
+    async def _acquire(self):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self._update_gauges()
+            return
+
+        position = len(self._waiters) + 1
+        if position > self.max_queue:
+            self._reject("queue_full", 429, f"Too many {self.name} requests queued")
+        if self.queue_timeout and self._expected_wait(position) > self.queue_timeout:
+            self._reject("expected_wait", 503, f"{self.name} queue wait would exceed {self.queue_timeout:g}s")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        try:
+            # The slot is handed over by _release, so in_flight is already counted
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout or None)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self._reject("queue_timeout", 503, f"{self.name} waited over {self.queue_timeout:g}s for a slot")
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        finally:
+            self._update_gauges()
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done() and not waiter.cancelled():
+            # Granted a slot at the same moment we gave up: pass it on
+            self._release()
+        else:
+            waiter.cancel()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def _finish(self, task: asyncio.Future, start: float):
+        """Free the slot once the request's work has stopped, even if it was abandoned."""
+        if not task.cancelled():
+            task.exception()  # retrieved here when nobody is awaiting it any more
+        self._record_service_time(time.perf_counter() - start)
+        self._release()
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self.in_flight -= 1
+        self._update_gauges()
+
+    def _record_service_time(self, seconds: float):
+        if self._service_time is None:
+            self._service_time = seconds
+        else:
+            self._service_time = 0.8 * self._service_time + 0.2 * seconds
+
+    def _reject(self, reason: str, status_code: int, detail: str):
+        self.shed[reason] += 1
+        ADMISSION_SHED.inc(route=self.name, reason=reason)
+        retry_after = max(1, math.ceil(self._expected_wait(len(self._waiters) + 1)))
+        raise HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    def _update_gauges(self):
+        ADMISSION_IN_FLIGHT.set(self.in_flight, route=self.name)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters), route=self.name)
@@ -0,0 +1,84 @@
+"""
+Batch Diagnosis Helpers
+Lazy iteration over uploaded archives and per-image patient metadata
+"""
+
+import json
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+
+DICOM_EXTENSIONS = ('.dcm', '.dicom')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff') + DICOM_EXTENSIONS
+
+PATIENT_FIELDS = ("age", "pain_level", "family_history", "lump_detected", "nipple_discharge")
+
+
+def _is_image_name(name: str) -> bool:
+    base = os.path.basename(name)
+    return (
+        base.lower().endswith(IMAGE_EXTENSIONS)
+        and not base.startswith(".")
+        and "__MACOSX" not in name
+    )
+
+
+def iter_archive_images(fileobj: BinaryIO) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yield (member_name, image_bytes) from a zip or tar archive, one at a time.
+
+    Only the current member is held in memory, so the archive can be far
+    larger than RAM (uploads are already spooled to disk by Starlette).
+    """
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _is_image_name(info.filename):
+                    yield info.filename, archive.read(info)
+        return
+
+    fileobj.seek(0)
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode="r:*")
+    except tarfile.TarError as e:
+        raise ValueError("Archive must be a zip or tar file") from e
+
+    with archive:
+        # Iterating the TarFile streams headers instead of indexing all members first
+        for member in archive:
+            if member.isfile() and _is_image_name(member.name):
+                extracted = archive.extractfile(member)
+                if extracted is not None:
+                    yield member.name, extracted.read()
+            archive.members = []  # don't keep every header in memory
+
+
+def parse_patient_metadata(text: Optional[str]):
+    """
+    Parse the `patients` form field of a batch request.
+
+    Accepts either a JSON object keyed by file name or a JSON list in
+    upload order; each entry may contain age, pain_level, family_history,
+    lump_detected and nipple_discharge.
+    """
+    if not text:
+        return {}
+    try:
+        metadata = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"patients must be valid JSON: {e}") from e
+    if not isinstance(metadata, (dict, list)):
+        raise ValueError("patients must be a JSON object or list")
+    return metadata
+
+
+def patient_fields_for(metadata, name: str, index: int) -> Dict:
+    """Patient fields for one image, looked up by file name, base name or position."""
+    if isinstance(metadata, list):
+        entry = metadata[index] if index < len(metadata) else {}
+    else:
+        entry = metadata.get(name) or metadata.get(os.path.basename(name)) or {}
+    return {field: entry[field] for field in PATIENT_FIELDS if field in entry}
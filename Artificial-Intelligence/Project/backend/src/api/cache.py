@@ -0,0 +1,133 @@
+"""
+Content-Addressed Result Cache
+Reuses classifier and Grad-CAM outputs for re-uploaded images
+"""
+
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+def cache_key(image_bytes: bytes, **flags) -> str:
+    """
+    Build a cache key from the image content and the flags that change its result.
+
+    Args:
+        image_bytes: Raw upload bytes (any buffer-protocol object)
+        **flags: Preprocessing options, e.g. enhance=True
+
+    Returns:
+        Hex digest of the bytes followed by the sorted flags
+    """
+    digest = hashlib.blake2b(image_bytes, digest_size=20).hexdigest()
+    return derive_key(digest, **flags)
+
+
+def derive_key(key: str, **flags) -> str:
+    """Extend an existing cache key with more flags, without rehashing the image."""
+    if not flags:
+        return key
+    options = ",".join(f"{name}={flags[name]}" for name in sorted(flags))
+    return f"{key}|{options}"
+
+
+def estimate_size(value: Any) -> int:
+    """Rough in-memory size of a cached value in bytes."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with a time-to-live and a memory cap.
+
+    Entries are evicted least-recently-used first whenever the entry count
+    or the estimated total size exceeds its limit. Expired entries are
+    dropped lazily when they are looked up.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 3600.0,
+        max_bytes: int = 256 * 1024 * 1024
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for `key`, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any):
+        """Store a value, evicting old entries as needed."""
+        size = estimate_size(value)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, time.monotonic(), size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,108 @@
+"""
+Executor Layer for CPU-bound Diagnosis Work
+Keeps model inference, OpenCV and expert/fuzzy stages off the asyncio event loop
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Tuple
+
+import cv2
+import torch
+
+from ..config import get_settings
+
+
+INFERENCE = "inference"
+PREPROCESS = "preprocess"
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+
+
+def get_executor(name: str) -> ThreadPoolExecutor:
+    """
+    Get (or create) the bounded thread pool for a stage.
+
+    PyTorch, OpenCV and NumPy release the GIL inside their kernels, so
+    threads keep several cores busy without pickling the model into
+    worker processes.
+    """
+    if name not in _executors:
+        settings = get_settings()
+        sizes = {
+            INFERENCE: settings.inference_threads,
+            PREPROCESS: settings.preprocess_threads,
+        }
+        _executors[name] = ThreadPoolExecutor(
+            max_workers=sizes[name],
+            thread_name_prefix=f"diagnosis-{name}"
+        )
+    return _executors[name]
+
+
+async def run_in_executor(name: str, func: Callable, *args, **kwargs):
+    """
+    Run a blocking call on the named pool and await its result.
+    
+    A running thread cannot be interrupted, so when the caller is cancelled
+    this waits for the call to finish before re-raising. Cancellation then
+    means "no further stages", and a cancelled task is only done once its
+    CPU work really is (AdmissionController counts slots on that basis).
+    """
+    call = get_executor(name).submit(functools.partial(func, *args, **kwargs))
+    future = asyncio.wrap_future(call)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        if not call.cancel():  # only succeeds while the call is still queued
+            await asyncio.wait([future])
+        raise
+
+
+async def run_inference(func: Callable, *args, **kwargs):
+    """Run model forward/backward passes on the inference pool."""
+    return await run_in_executor(INFERENCE, func, *args, **kwargs)
+
+
+async def run_preprocess(func: Callable, *args, **kwargs):
+    """Run decoding, OpenCV and expert/fuzzy stages on the preprocessing pool."""
+    return await run_in_executor(PREPROCESS, func, *args, **kwargs)
+
+
+def shutdown_executors():
+    """Wait for running work and release all pools."""
+    for executor in _executors.values():
+        executor.shutdown(wait=True)
+    _executors.clear()
+
+
+def configure_native_threads(workers: int = 1) -> Tuple[int, int]:
+    """
+    Size PyTorch's and OpenCV's internal thread pools for one of `workers`
+    server processes on this machine.
+
+    Every process already runs `inference_threads` forward passes at once,
+    so by default each pass gets an equal share of the cores instead of
+    every pass in every process spawning one thread per core. Must run
+    before the process does any parallel work.
+
+    Returns:
+        (intra-op threads, inter-op threads)
+    """
+    settings = get_settings()
+    cores = os.cpu_count() or 1
+    workers = max(1, workers)
+    intra_op = settings.torch_threads or max(1, cores // (workers * settings.inference_threads))
+    # Forward passes are already parallel across pool threads; inter-op
+    # parallelism would only add more threads
+    inter_op = settings.torch_interop_threads or 1
+
+    torch.set_num_threads(intra_op)
+    try:
+        torch.set_num_interop_threads(inter_op)
+    except RuntimeError:
+        pass  # already set, or inter-op work already ran in this process
+    cv2.setNumThreads(max(1, cores // (workers * settings.preprocess_threads)))
+    return intra_op, inter_op
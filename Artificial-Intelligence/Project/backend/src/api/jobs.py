@@ -0,0 +1,344 @@
+"""
+Asynchronous Diagnosis Jobs
+SQLite-backed job store, worker pool and progress events for long-running requests
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+
+from .executor import run_preprocess
+
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+# handler(job, input_dir, report_progress) -> JSON-serializable result;
+# handlers await report_progress(done, total)
+JobHandler = Callable[[dict, str, Callable[[int, Optional[int]], Awaitable[None]]], Awaitable[Any]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    progress INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL,
+    owner_pid INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at);
+"""
+
+
+class JobStore:
+    """
+    Local persistence for jobs.
+
+    Job metadata and results live in one SQLite database; the uploaded
+    inputs of each job are kept as files in their own directory until the
+    job finishes. Both survive restarts.
+
+    Every method blocks (SQLite I/O, JSON encoding of results): call them
+    from async code through run_preprocess.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "jobs.sqlite3"),
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner_pid" not in columns:  # store created before jobs recorded their owner
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+        self._lock = threading.Lock()
+
+    def input_dir(self, job_id: str) -> str:
+        return os.path.join(self.directory, job_id)
+
+    def create(self, kind: str, params: dict) -> str:
+        """Insert a queued job and create its input directory."""
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.input_dir(job_id), exist_ok=True)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params), time.time())
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(jsonable_encoder(fields["result"]))
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?",
+                (*fields.values(), job_id)
+            )
+
+    def claim(self, job_id: str) -> bool:
+        """
+        Atomically move a queued job to running, owned by this process;
+        False if another worker got it first.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, owner_pid = ? WHERE id = ? AND status = ?",
+                (RUNNING, time.time(), os.getpid(), job_id, QUEUED)
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        shutil.rmtree(self.input_dir(job_id), ignore_errors=True)
+
+    def requeue_interrupted(self, owner_pid: Optional[int] = None) -> int:
+        """
+        Put running jobs back in the queue; returns how many.
+
+        Args:
+            owner_pid: Only the jobs claimed by this (dead) process; None
+                re-queues every running job, for a server that was stopped
+        """
+        query = "UPDATE jobs SET status = ?, started_at = NULL, owner_pid = NULL WHERE status = ?"
+        params = (QUEUED, RUNNING)
+        if owner_pid is not None:
+            query += " AND owner_pid = ?"
+            params += (owner_pid,)
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+        return cursor.rowcount
+
+    def queued(self) -> List[str]:
+        """Ids of queued jobs, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Delete finished jobs past their expiry time; returns how many."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            ).fetchall()
+        for row in rows:
+            self.delete(row["id"])
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def job_view(job: dict) -> dict:
+    """Public representation of a job (what the status endpoints return)."""
+    view = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": {"done": job["progress"], "total": job["total"]},
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "expires_at": job["expires_at"],
+    }
+    if job["status"] == SUCCEEDED:
+        view["result"] = job["result"]
+    elif job["status"] == FAILED:
+        view["error"] = job["error"]
+    return view
+
+
+class JobManager:
+    """
+    Runs queued jobs on a fixed pool of asyncio workers.
+
+    Workers call the registered handler for each job's kind; handlers do
+    their CPU work on the shared executors and batching engine, so the
+    number of jobs in progress is bounded by `workers` no matter how many
+    clients submit or poll. Status changes are pushed to subscribers
+    (the SSE endpoint) as they happen. Store reads and writes run on the
+    preprocessing pool, so finishing a large job never blocks the event loop.
+
+    Several server processes may share one store: jobs are claimed
+    atomically before they run, so a job queued in more than one process
+    still runs once.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        handlers: Dict[str, JobHandler],
+        workers: int = 2,
+        ttl_seconds: float = 86400.0
+    ):
+        self.store = store
+        self.handlers = handlers
+        self.workers = max(1, workers)
+        self.ttl_seconds = ttl_seconds
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def start(self, recover: bool = True):
+        """
+        Start the workers and the expiry sweep, and pick up jobs already queued.
+
+        Args:
+            recover: Also re-queue jobs that were running when the server
+                stopped. Multi-process launchers do this once before starting
+                their workers, since a running job may belong to a live sibling,
+                and again for the jobs of each worker that dies (claims record
+                the owning process).
+        """
+        if self._tasks:
+            return
+        if recover:
+            self.store.requeue_interrupted()
+        self._queue = asyncio.Queue()
+        for job_id in self.store.queued():
+            self._queue.put_nowait(job_id)
+
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(loop.create_task(self._sweep()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind: str, params: dict, save_inputs: Optional[Callable[[str], None]] = None) -> dict:
+        """
+        Queue a new job.
+
+        Args:
+            kind: Handler name
+            params: JSON-serializable job parameters
+            save_inputs: Blocking callable that writes the job's input files
+                into the directory it is given (run off the event loop)
+
+        Returns:
+            The job's public view
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue is None:
+            raise RuntimeError("Job workers are not running")
+        job_id = await run_preprocess(self.store.create, kind, params)
+        if save_inputs is not None:
+            try:
+                await run_preprocess(save_inputs, self.store.input_dir(job_id))
+            except Exception:
+                await run_preprocess(self.store.delete, job_id)
+                raise
+        self._queue.put_nowait(job_id)
+        return job_view(await run_preprocess(self.store.get, job_id))
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Queue that receives (event, job_view) pairs for one job."""
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    async def _publish(self, job_id: str, event: str):
+        if not self._subscribers.get(job_id):
+            return
+        job = await run_preprocess(self.store.get, job_id)
+        if job is None:
+            return
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait((event, job_view(job)))
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job {job_id} crashed: {e}")
+
+    async def _run(self, job_id: str):
+        if not await run_preprocess(self.store.claim, job_id):
+            return  # deleted while queued, or taken by another worker
+        job = await run_preprocess(self.store.get, job_id)
+        if job is None:
+            return
+
+        await self._publish(job_id, "status")
+
+        async def report(done: int, total: Optional[int] = None):
+            await run_preprocess(self.store.update, job_id, progress=done, total=total)
+            await self._publish(job_id, "progress")
+
+        try:
+            result = await self.handlers[job["kind"]](job, self.store.input_dir(job_id), report)
+            fields = {"status": SUCCEEDED, "result": result}
+        except Exception as e:
+            fields = {"status": FAILED, "error": str(e)}
+
+        finished = time.time()
+        # Serializing a large batch result takes a while: keep it off the event loop
+        await run_preprocess(
+            self.store.update, job_id,
+            finished_at=finished, expires_at=finished + self.ttl_seconds, **fields
+        )
+        # Inputs are only needed until the job has run
+        await run_preprocess(shutil.rmtree, self.store.input_dir(job_id), ignore_errors=True)
+        await self._publish(job_id, "done")
+
+    async def _sweep(self):
+        interval = min(max(self.ttl_seconds / 10, 1.0), 300.0)
+        while True:
+            await asyncio.sleep(interval)
+            await run_preprocess(self.store.purge_expired)
@@ -4,14 +4,32 @@ Handles image upload, prediction, and diagnosis
 """
 
 from fastapi import APIRouter, UploadFile, File, HTTPException, Form
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import AsyncIterator, BinaryIO, List, Optional, Tuple
+import asyncio
+import json
 import io
+import os
+import time
+import uuid
+import shutil
 import base64
-from PIL import Image
+import cv2
 
+from ..config import get_settings
+from ..metrics import timed, IMAGE_BYTES, IMAGE_MEGAPIXELS, MODEL_LOAD_SECONDS, CACHE_LOOKUPS
 from ..ml.cnn_classifier import BreastTumorClassifier
-from ..ml.preprocessing import enhance_contrast, get_image_stats
+from ..ml.batching import BatchingEngine
+from ..ml.pipeline import ImagePipeline
+from ..ml.preprocessing import InvalidImageError
+from .batch import iter_archive_images, parse_patient_metadata, patient_fields_for, DICOM_EXTENSIONS
+from .cache import ResultCache, cache_key, derive_key
+from .uploads import MB, check_upload_size, map_upload
+from .admission import AdmissionController
+from .jobs import JobManager, JobStore, job_view, FINISHED, RUNNING
+from .executor import get_executor, run_inference, run_preprocess, INFERENCE
 from ..traditional_ai.expert_system import BreastTumorExpertSystem
 from ..traditional_ai.fuzzy_logic import FuzzyDiagnosisSystem
 
@@ -20,24 +38,191 @@ router = APIRouter()
 
 # Initialize models (loaded once at startup)
 classifier = None
+batching_engine = None
 expert_system = None
 fuzzy_system = None
+prediction_cache = None
+gradcam_cache = None
+job_manager = None
+admission = {}
+
+# Grad-CAM overlay encodings: format -> (media type, cv2 extension, quality flag)
+HEATMAP_FORMATS = {
+    "png": ("image/png", ".png", None),
+    "webp": ("image/webp", ".webp", cv2.IMWRITE_WEBP_QUALITY),
+    "jpeg": ("image/jpeg", ".jpg", cv2.IMWRITE_JPEG_QUALITY),
+}
+GRADCAM_RESPONSES = ("json", "binary", "multipart")
+# How often job event streams re-read the store for jobs run by another worker
+JOB_POLL_SECONDS = 1.0
+
+# Startup lifecycle: not_loaded -> loading -> ready (or failed)
+model_status = {"state": "not_loaded", "load_seconds": None, "error": None}
 
 
 def get_classifier():
     """Lazy initialization of classifier."""
     global classifier
     if classifier is None:
-        import os
-        model_path = os.path.join(os.path.dirname(__file__), "../../models/best_model.pth")
+        settings = get_settings()
+        model_path = settings.model_path or os.path.join(
+            os.path.dirname(__file__), "../../models/best_model.pth"
+        )
         classifier = BreastTumorClassifier(
             model_path=model_path,
             model_type="transfer",
-            backbone="resnet50"
+            backbone="resnet50",
+            inference_backend=settings.inference_backend,
+            backend_path=settings.backend_path or None
         )
     return classifier
 
 
+def get_batching_engine():
+    """Lazy initialization of the micro-batching engine around the classifier."""
+    global batching_engine
+    if batching_engine is None:
+        settings = get_settings()
+        batching_engine = BatchingEngine(
+            get_classifier(),
+            max_batch_size=settings.batch_max_size,
+            max_wait_ms=settings.batch_max_wait_ms,
+            executor=get_executor(INFERENCE)
+        )
+    return batching_engine
+
+
+def _new_result_cache() -> ResultCache:
+    settings = get_settings()
+    return ResultCache(
+        max_entries=settings.cache_max_entries,
+        ttl_seconds=settings.cache_ttl_seconds,
+        max_bytes=int(settings.cache_max_mb * 1024 * 1024)
+    )
+
+
+def get_prediction_cache():
+    """Lazy initialization of the CNN prediction cache."""
+    global prediction_cache
+    if prediction_cache is None:
+        prediction_cache = _new_result_cache()
+    return prediction_cache
+
+
+def get_gradcam_cache():
+    """Lazy initialization of the Grad-CAM result cache."""
+    global gradcam_cache
+    if gradcam_cache is None:
+        gradcam_cache = _new_result_cache()
+    return gradcam_cache
+
+
+def get_admission(name: str) -> AdmissionController:
+    """
+    Lazy initialization of the admission budget for "diagnose" or "gradcam".
+    
+    Explained diagnoses run Grad-CAM and share the gradcam budget.
+    """
+    if name not in admission:
+        settings = get_settings()
+        admission[name] = AdmissionController(
+            name,
+            max_in_flight=getattr(settings, f"{name}_max_in_flight"),
+            max_queue=getattr(settings, f"{name}_max_queue"),
+            queue_timeout=getattr(settings, f"{name}_queue_timeout"),
+            deadline=getattr(settings, f"{name}_deadline")
+        )
+    return admission[name]
+
+
+def get_job_manager():
+    """Lazy initialization of the asynchronous job store and workers."""
+    global job_manager
+    if job_manager is None:
+        settings = get_settings()
+        job_manager = JobManager(
+            JobStore(_jobs_dir()),
+            handlers={"diagnose": _diagnose_job, "gradcam": _gradcam_job, "batch": _batch_job},
+            workers=settings.job_workers,
+            ttl_seconds=settings.job_ttl_seconds
+        )
+    return job_manager
+
+
+def recover_jobs(owner_pid: Optional[int] = None) -> int:
+    """
+    Re-queue jobs interrupted by a restart, once for all server processes,
+    or those of one worker that died (see serve.py).
+    """
+    store = JobStore(_jobs_dir())
+    try:
+        return store.requeue_interrupted(owner_pid)
+    finally:
+        store.close()
+
+
+def _jobs_dir() -> str:
+    return get_settings().jobs_dir or os.path.join(os.path.dirname(__file__), "../../jobs")
+
+
+def load_models(warmup_batch_sizes: Tuple[int, ...] = ()):
+    """
+    Eagerly build every diagnosis component and warm the classifier up.
+    
+    Called once at startup (off the event loop). Until it finishes,
+    /api/ready reports 503 and the diagnosis routes ask clients to retry.
+    """
+    model_status.update(state="loading", error=None)
+    start = time.perf_counter()
+    try:
+        clf = get_classifier()
+        get_expert_system()
+        get_fuzzy_system()
+        
+        if not warmup_batch_sizes:
+            warmup_batch_sizes = tuple(sorted({1, get_settings().batch_max_size}))
+        clf.warmup(warmup_batch_sizes)
+    except Exception as e:
+        model_status.update(state="failed", error=str(e))
+        print(f"Model loading failed: {e}")
+        raise
+    
+    model_status.update(state="ready", load_seconds=round(time.perf_counter() - start, 3))
+    MODEL_LOAD_SECONDS.set(model_status["load_seconds"])
+    print(f"Models ready in {model_status['load_seconds']}s (warmup batches: {warmup_batch_sizes})")
+
+
+async def close_models():
+    """Stop background inference tasks and job workers on shutdown."""
+    if job_manager is not None:
+        await job_manager.stop()
+    if batching_engine is not None:
+        await batching_engine.stop()
+
+
+async def _wait_for_models():
+    """Hold a background job until the startup load has finished."""
+    while model_status["state"] in ("not_loaded", "loading"):
+        await asyncio.sleep(0.5)
+    if model_status["state"] == "failed":
+        raise RuntimeError(f"Model failed to load: {model_status['error']}")
+
+
+def _require_loaded():
+    """Reject requests while the startup load is still running, or after it failed."""
+    if model_status["state"] == "loading":
+        raise HTTPException(
+            status_code=503,
+            detail="Model is loading, please retry shortly",
+            headers={"Retry-After": "5"}
+        )
+    if model_status["state"] == "failed":
+        raise HTTPException(
+            status_code=503,
+            detail=f"Model failed to load: {model_status['error']}"
+        )
+
+
 def get_expert_system():
     """Lazy initialization of expert system."""
     global expert_system
@@ -63,10 +248,40 @@ async def health_check():
         "status": "healthy",
         "service": "Breast Tumor Diagnosis API",
         "version": "1.0.0",
-        "model_accuracy": "94.0%"
+        "model_accuracy": "94.0%",
+        "model_status": model_status["state"],
+        "admission": {name: get_admission(name).stats() for name in ("diagnose", "gradcam")}
     }
 
 
+@router.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 only once the model is loaded and warmed up."""
+    ready = model_status["state"] == "ready"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, **model_status}
+    )
+
+
+@router.get("/cache")
+async def cache_stats():
+    """Hit/miss counters of the result caches."""
+    return collect_cache_stats()
+
+
+def collect_cache_stats() -> dict:
+    """Current result cache statistics, also mirrored into the Prometheus counters."""
+    stats = {
+        "prediction": get_prediction_cache().stats(),
+        "gradcam": get_gradcam_cache().stats()
+    }
+    for name, cache in stats.items():
+        CACHE_LOOKUPS.set_total(cache["hits"], cache=name, result="hit")
+        CACHE_LOOKUPS.set_total(cache["misses"], cache=name, result="miss")
+    return stats
+
+
 @router.post("/diagnose")
 async def full_diagnosis(
     image: UploadFile = File(...),
@@ -75,7 +290,8 @@ async def full_diagnosis(
     family_history: bool = Form(False),
     lump_detected: bool = Form(False),
     nipple_discharge: bool = Form(False),
-    enhance: bool = Form(False)
+    enhance: bool = Form(False),
+    explain: bool = Form(False)
 ):
     """
     Perform complete diagnosis combining ML and Traditional AI.
@@ -88,111 +304,713 @@ async def full_diagnosis(
         lump_detected: Whether lump was detected
         nipple_discharge: Whether nipple discharge is present
         enhance: Apply contrast enhancement
+        explain: Also return a Grad-CAM heatmap, computed from the same
+            forward pass as the prediction
     
     Returns:
         Complete diagnosis with ML predictions, expert analysis, and recommendations
     """
     try:
         # Validate file type
-        if not image.content_type.startswith("image/"):
+        if not _is_image_upload(image):
             raise HTTPException(status_code=400, detail="File must be an image")
+        _require_loaded()
         
-        # Read image bytes
-        image_bytes = await image.read()
-        
-        # Optional contrast enhancement
-        if enhance:
-            image_bytes = enhance_contrast(image_bytes)
+        # Map the spooled upload instead of copying it into memory
+        image_bytes = await run_preprocess(map_upload, image.file)
         
-        # Get image statistics
-        stats = get_image_stats(image_bytes)
-        
-        # Step 1: ML Prediction
-        clf = get_classifier()
-        ml_prediction = clf.predict(image_bytes)
-        
-        # Step 2: Expert System Analysis
-        patient_data = {}
-        if age is not None:
-            patient_data["age"] = age
-        if pain_level is not None:
-            patient_data["pain_level"] = pain_level
-        patient_data["family_history"] = family_history
-        patient_data["lump_detected"] = lump_detected
-        patient_data["nipple_discharge"] = nipple_discharge
-        
-        expert = get_expert_system()
-        expert_analysis = expert.analyze(ml_prediction, patient_data)
-        
-        # Step 3: Fuzzy Logic Analysis
-        fuzzy = get_fuzzy_system()
-        fuzzy_analysis = fuzzy.analyze(
-            confidence=ml_prediction["confidence"],
-            severity_score=ml_prediction["severity_score"],
-            age=age,
-            pain_level=pain_level
-        )
-        
-        # Step 4: Combine results for final recommendation
-        combined = _combine_analyses(ml_prediction, expert_analysis, fuzzy_analysis)
-        
-        return {
-            "success": True,
-            "ml_prediction": ml_prediction,
-            "expert_analysis": expert_analysis,
-            "fuzzy_analysis": fuzzy_analysis,
-            "combined_recommendation": combined,
-            "image_stats": stats
-        }
+        patient_data = _patient_data(age, pain_level, family_history, lump_detected, nipple_discharge)
+        budget = get_admission("gradcam" if explain else "diagnose")
+        return await budget.run(_run_diagnosis, image_bytes, patient_data, enhance, explain)
     
+    except HTTPException:
+        raise
+    except InvalidImageError:
+        raise HTTPException(status_code=400, detail="Invalid image")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/diagnose/batch")
+async def batch_diagnosis(
+    images: List[UploadFile] = File([]),
+    archive: Optional[UploadFile] = File(None),
+    patients: Optional[str] = Form(None),
+    enhance: bool = Form(False)
+):
+    """
+    Diagnose many images in one request, streaming results as NDJSON.
+    
+    Args:
+        images: Mammogram image files
+        archive: Zip or tar archive of mammogram images
+        patients: JSON object keyed by file name (or list in upload order)
+            with age, pain_level, family_history, lump_detected, nipple_discharge
+        enhance: Apply contrast enhancement
+    
+    Returns:
+        application/x-ndjson stream with one line per image, in completion order
+    """
+    if not images and archive is None:
+        raise HTTPException(status_code=400, detail="Provide image files and/or an archive")
+    _require_loaded()
+    
+    try:
+        metadata = parse_patient_metadata(patients)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # FastAPI closes form uploads as soon as this function returns, but the
+    # stream is consumed later: take over the spooled files without copying
+    files = [_detach_upload(upload) for upload in images]
+    archive_file = _detach_upload(archive)[1] if archive is not None else None
+    
+    return StreamingResponse(
+        _stream_batch(files, archive_file, metadata, enhance),
+        media_type="application/x-ndjson"
+    )
+
+
 @router.post("/gradcam")
 async def generate_gradcam(
-    image: UploadFile = File(...)
+    image: UploadFile = File(...),
+    max_side: Optional[int] = Form(None),
+    heatmap_format: str = Form("png"),
+    quality: int = Form(85),
+    response: str = Form("json")
 ):
     """
     Generate Grad-CAM visualization for model explainability.
     
     Args:
         image: Mammogram image file
+        max_side: Longest side of the overlay in pixels (default GRADCAM_MAX_SIDE, 0 = original size)
+        heatmap_format: png, webp or jpeg
+        quality: WebP/JPEG quality (1-100)
+        response: "json" (base64 heatmap), "binary" (the image itself, prediction
+            in the X-Prediction header) or "multipart" (JSON part + image part)
     
     Returns:
-        Base64 encoded heatmap overlay image and prediction
+        Heatmap overlay image and prediction
     """
     try:
         # Validate file type
-        if not image.content_type.startswith("image/"):
+        if not _is_image_upload(image):
             raise HTTPException(status_code=400, detail="File must be an image")
+        options = _heatmap_options(max_side, heatmap_format, quality)
+        if response not in GRADCAM_RESPONSES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"response must be one of: {', '.join(GRADCAM_RESPONSES)}"
+            )
+        _require_loaded()
         
-        # Read image bytes
-        image_bytes = await image.read()
+        # Map the spooled upload instead of copying it into memory
+        image_bytes = await run_preprocess(map_upload, image.file)
         
-        # Generate Grad-CAM
-        clf = get_classifier()
-        heatmap, prediction = clf.generate_gradcam(image_bytes)
-        
-        # Convert heatmap to base64
-        pil_image = Image.fromarray(heatmap)
-        buffer = io.BytesIO()
-        pil_image.save(buffer, format="PNG")
-        buffer.seek(0)
+        prediction, heatmap_bytes = await get_admission("gradcam").run(_run_gradcam, image_bytes, options)
         
-        heatmap_base64 = base64.b64encode(buffer.getvalue()).decode()
+        media_type = HEATMAP_FORMATS[options["format"]][0]
+        if response == "binary":
+            return Response(
+                content=heatmap_bytes,
+                media_type=media_type,
+                headers={"X-Prediction": json.dumps(prediction)}
+            )
+        if response == "multipart":
+            return _multipart_response(
+                {"success": True, "prediction": prediction, "heatmap_format": options["format"]},
+                heatmap_bytes,
+                options["format"]
+            )
         
         return {
             "success": True,
             "prediction": prediction,
-            "heatmap": heatmap_base64,
-            "heatmap_format": "png"
+            "heatmap": base64.b64encode(heatmap_bytes).decode(),
+            "heatmap_format": options["format"]
         }
     
+    except HTTPException:
+        raise
+    except InvalidImageError:
+        raise HTTPException(status_code=400, detail="Invalid image")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/jobs", status_code=202)
+async def submit_job(
+    kind: str = Form("diagnose"),
+    image: Optional[UploadFile] = File(None),
+    images: List[UploadFile] = File([]),
+    archive: Optional[UploadFile] = File(None),
+    age: Optional[int] = Form(None),
+    pain_level: Optional[int] = Form(None),
+    family_history: bool = Form(False),
+    lump_detected: bool = Form(False),
+    nipple_discharge: bool = Form(False),
+    patients: Optional[str] = Form(None),
+    enhance: bool = Form(False),
+    explain: bool = Form(False),
+    max_side: Optional[int] = Form(None),
+    heatmap_format: str = Form("png"),
+    quality: int = Form(85)
+):
+    """
+    Queue a long-running request and return its job id immediately.
+    
+    Args:
+        kind: "diagnose" or "gradcam" (one `image`, same options as
+            /diagnose and /gradcam) or "batch" (`images` and/or `archive`,
+            same options as /diagnose/batch)
+    
+    Returns:
+        Job status with `job_id`; poll /api/jobs/{job_id} or subscribe to
+        /api/jobs/{job_id}/events for the result
+    """
+    try:
+        if kind in ("diagnose", "gradcam"):
+            if image is None or not _is_image_upload(image):
+                raise HTTPException(status_code=400, detail=f"{kind} jobs need one image file")
+            # The middleware allows /api/jobs bodies up to the batch limit
+            await run_preprocess(check_upload_size, image.file, int(get_settings().max_upload_mb * MB))
+            inputs = {"image": image.file}
+            if kind == "diagnose":
+                params = {
+                    "patient_data": _patient_data(age, pain_level, family_history, lump_detected, nipple_discharge),
+                    "enhance": enhance,
+                    "explain": explain
+                }
+            else:
+                params = {"options": _heatmap_options(max_side, heatmap_format, quality)}
+        elif kind == "batch":
+            if not images and archive is None:
+                raise HTTPException(status_code=400, detail="Provide image files and/or an archive")
+            try:
+                metadata = parse_patient_metadata(patients)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            inputs = {f"file-{i}": upload.file for i, upload in enumerate(images)}
+            if archive is not None:
+                inputs["archive"] = archive.file
+            params = {
+                "files": [upload.filename for upload in images],
+                "archive": archive is not None,
+                "metadata": metadata,
+                "enhance": enhance
+            }
+        else:
+            raise HTTPException(status_code=400, detail="kind must be diagnose, gradcam or batch")
+        
+        job = await get_job_manager().submit(kind, params, save_inputs=_job_input_writer(inputs))
+        return {
+            **job,
+            "status_url": f"/api/jobs/{job['job_id']}",
+            "events_url": f"/api/jobs/{job['job_id']}/events"
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of a job, with its result once it has finished."""
+    job = await run_preprocess(get_job_manager().store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job_view(job)
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events for one job: `status` and `progress` while it runs,
+    then a final `done` event carrying the result or error.
+    """
+    manager = get_job_manager()
+    if await run_preprocess(manager.store.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return StreamingResponse(
+        _stream_job_events(manager, job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Cancel a queued job or delete a finished one and its result."""
+    manager = get_job_manager()
+    job = await run_preprocess(manager.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job["status"] == RUNNING:
+        raise HTTPException(status_code=409, detail="Job is running")
+    await run_preprocess(manager.store.delete, job_id)
+    return {"success": True, "job_id": job_id}
+
+
+async def _stream_job_events(manager: JobManager, job_id: str) -> AsyncIterator[str]:
+    # Subscribe before reading the current state so no transition is missed
+    queue = manager.subscribe(job_id)
+    try:
+        job = await run_preprocess(manager.store.get, job_id)
+        if job is None:
+            return
+        event, view = ("done" if job["status"] in FINISHED else "status"), job_view(job)
+        yield _sse(event, view)
+        idle = 0.0
+        while event != "done":
+            try:
+                event, view = await asyncio.wait_for(queue.get(), timeout=JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                # The job may be running in another server process: poll the store
+                job = await run_preprocess(manager.store.get, job_id)
+                if job is None:
+                    return
+                if job_view(job) == view:
+                    idle += JOB_POLL_SECONDS
+                    if idle >= 15:
+                        idle = 0.0
+                        yield ": keep-alive\n\n"
+                    continue
+                event, view = ("done" if job["status"] in FINISHED else "progress"), job_view(job)
+            idle = 0.0
+            yield _sse(event, view)
+    finally:
+        manager.unsubscribe(job_id, queue)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+def _job_input_writer(inputs: dict):
+    """Blocking writer that copies spooled uploads into a job's input directory."""
+    def save(directory: str):
+        for name, fileobj in inputs.items():
+            fileobj.seek(0)
+            with open(os.path.join(directory, name), "wb") as out:
+                shutil.copyfileobj(fileobj, out, 1024 * 1024)
+    return save
+
+
+def _map_job_input(directory: str, name: str):
+    with open(os.path.join(directory, name), "rb") as fileobj:
+        return map_upload(fileobj)
+
+
+async def _diagnose_job(job: dict, input_dir: str, report) -> dict:
+    await _wait_for_models()
+    params = job["params"]
+    image_bytes = await run_preprocess(_map_job_input, input_dir, "image")
+    return await _run_diagnosis(image_bytes, params["patient_data"], params["enhance"], params["explain"])
+
+
+async def _gradcam_job(job: dict, input_dir: str, report) -> dict:
+    await _wait_for_models()
+    options = job["params"]["options"]
+    image_bytes = await run_preprocess(_map_job_input, input_dir, "image")
+    prediction, heatmap_bytes = await _run_gradcam(image_bytes, options)
+    return {
+        "success": True,
+        "prediction": prediction,
+        "heatmap": base64.b64encode(heatmap_bytes).decode(),
+        "heatmap_format": options["format"]
+    }
+
+
+async def _batch_job(job: dict, input_dir: str, report) -> dict:
+    await _wait_for_models()
+    params = job["params"]
+    files = [
+        (name, open(os.path.join(input_dir, f"file-{i}"), "rb"))
+        for i, name in enumerate(params["files"])
+    ]
+    archive = open(os.path.join(input_dir, "archive"), "rb") if params["archive"] else None
+    total = None if archive is not None else len(files)
+    
+    items = []
+    results = _iter_batch_results(files, archive, params["metadata"], params["enhance"])
+    try:
+        async for item in results:
+            items.append(item)
+            await report(len(items), total)
+    finally:
+        await results.aclose()
+        for _, fileobj in files:
+            fileobj.close()
+        if archive is not None:
+            archive.close()
+    
+    items.sort(key=lambda item: item["index"])
+    return {"success": True, "count": len(items), "results": items}
+
+
+async def _run_gradcam(image_bytes: bytes, options: dict) -> Tuple[dict, bytes]:
+    """
+    Cached or freshly computed Grad-CAM overlay for one image.
+    
+    Shared by /gradcam and gradcam jobs.
+    
+    Returns:
+        Tuple of (prediction, encoded heatmap bytes)
+    """
+    cache = get_gradcam_cache()
+    key = await run_preprocess(cache_key, image_bytes, enhance=False)
+    key = derive_key(key, **options)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    
+    # Generate Grad-CAM; the classifier sees the same decode as /diagnose
+    clf = get_classifier()
+    pipeline = await run_preprocess(_decode, image_bytes)
+    background = await run_preprocess(_decode_overlay, pipeline, image_bytes, options["max_side"])
+    heatmap, prediction = await run_inference(
+        _timed_gradcam, clf, pipeline.pixels, options["max_side"], background
+    )
+    
+    heatmap_bytes = await run_preprocess(
+        _encode_heatmap, heatmap, options["format"], options["quality"]
+    )
+    cache.put(key, (prediction, heatmap_bytes))
+    return prediction, heatmap_bytes
+
+
+def _heatmap_options(max_side: Optional[int], heatmap_format: str, quality: int) -> dict:
+    """Validate Grad-CAM rendering options; they are also part of the cache key."""
+    heatmap_format = heatmap_format.lower()
+    if heatmap_format == "jpg":
+        heatmap_format = "jpeg"
+    if heatmap_format not in HEATMAP_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"heatmap_format must be one of: {', '.join(HEATMAP_FORMATS)}"
+        )
+    if max_side is None:
+        max_side = get_settings().gradcam_max_side
+    if max_side < 0:
+        raise HTTPException(status_code=400, detail="max_side must be 0 or positive")
+    if not 1 <= quality <= 100:
+        raise HTTPException(status_code=400, detail="quality must be between 1 and 100")
+    
+    return {
+        "max_side": max_side,
+        "format": heatmap_format,
+        # PNG is lossless, so quality must not split its cache entries
+        "quality": quality if HEATMAP_FORMATS[heatmap_format][2] is not None else None
+    }
+
+
+def _multipart_response(metadata: dict, image_bytes: bytes, heatmap_format: str) -> Response:
+    """A multipart/mixed body with a JSON part followed by the raw image."""
+    media_type, extension, _ = HEATMAP_FORMATS[heatmap_format]
+    boundary = uuid.uuid4().hex
+    body = b"".join([
+        f"--{boundary}\r\nContent-Type: application/json\r\n\r\n".encode(),
+        json.dumps(metadata).encode(),
+        f"\r\n--{boundary}\r\nContent-Type: {media_type}\r\n"
+        f"Content-Disposition: inline; filename=\"heatmap{extension}\"\r\n\r\n".encode(),
+        image_bytes,
+        f"\r\n--{boundary}--\r\n".encode(),
+    ])
+    return Response(content=body, media_type=f"multipart/mixed; boundary={boundary}")
+
+
+async def _run_diagnosis(
+    image_bytes: bytes,
+    patient_data: dict,
+    enhance: bool = False,
+    explain: bool = False
+) -> dict:
+    """
+    Diagnose one image: cached or batched CNN prediction (optionally with
+    Grad-CAM), then the Expert System and Fuzzy Logic stages.
+    
+    Shared by /diagnose and /diagnose/batch.
+    """
+    # CNN output depends only on the image and preprocessing flags,
+    # so re-uploads and retries skip decoding and inference entirely
+    cache = get_prediction_cache()
+    key = await run_preprocess(cache_key, image_bytes, enhance=enhance)
+    cached = cache.get(key)
+    heatmap_options = _heatmap_options(None, "png", 100)
+    gradcam_key = derive_key(key, **heatmap_options)
+    explanation = get_gradcam_cache().get(gradcam_key) if explain else None
+    
+    if cached is not None and (explanation is not None or not explain):
+        ml_prediction, stats = cached
+    elif explain:
+        # Prediction and Grad-CAM from a single hooked forward pass, on the
+        # same decode as an unexplained diagnosis (the overlay may need its own)
+        clf = get_classifier()
+        pipeline, stats = await run_preprocess(_decode_upload, image_bytes, enhance)
+        background = await run_preprocess(
+            _decode_overlay, pipeline, image_bytes, heatmap_options["max_side"]
+        )
+        heatmap, ml_prediction = await run_inference(
+            _timed_gradcam, clf, pipeline.pixels, heatmap_options["max_side"], background
+        )
+        explanation = (ml_prediction, await run_preprocess(_encode_heatmap, heatmap, "png"))
+        if cached is None:
+            cache.put(key, (ml_prediction, stats))
+        get_gradcam_cache().put(gradcam_key, explanation)
+    else:
+        # Decode once; enhancement, statistics and the classifier share the pixels
+        clf = get_classifier()
+        pipeline, stats = await run_preprocess(_decode_upload, image_bytes, enhance)
+        input_tensor = await run_preprocess(_timed_preprocess, clf, pipeline.pixels)
+        
+        # Step 1: ML Prediction (batched with concurrent requests)
+        ml_prediction = await get_batching_engine().predict(input_tensor)
+        cache.put(key, (ml_prediction, stats))
+    
+    # Steps 2-4: Expert System, Fuzzy Logic and combined recommendation
+    expert_analysis, fuzzy_analysis, combined = await run_preprocess(
+        _analyze_patient, ml_prediction, patient_data
+    )
+    
+    result = {
+        "success": True,
+        "ml_prediction": ml_prediction,
+        "expert_analysis": expert_analysis,
+        "fuzzy_analysis": fuzzy_analysis,
+        "combined_recommendation": combined,
+        "image_stats": stats
+    }
+    if explanation is not None:
+        result["gradcam"] = {
+            "heatmap": base64.b64encode(explanation[1]).decode(),
+            "heatmap_format": "png"
+        }
+    return result
+
+
+def _is_image_upload(upload: UploadFile) -> bool:
+    """Images are accepted by content type; DICOM also by its usual extensions."""
+    content_type = upload.content_type or ""
+    return (
+        content_type.startswith("image/")
+        or content_type == "application/dicom"
+        or (upload.filename or "").lower().endswith(DICOM_EXTENSIONS)
+    )
+
+
+def _detach_upload(upload: UploadFile) -> Tuple[str, BinaryIO]:
+    """Take ownership of an upload's spooled file so it outlives the request handler."""
+    fileobj = upload.file
+    upload.file = io.BytesIO()
+    return upload.filename, fileobj
+
+
+async def _iter_batch_uploads(
+    files: List[Tuple[str, BinaryIO]],
+    archive: Optional[BinaryIO]
+) -> AsyncIterator[Tuple[str, bytes]]:
+    """Yield (name, image_bytes) for each uploaded file, then each archive member."""
+    for name, fileobj in files:
+        yield name, await run_preprocess(map_upload, fileobj)
+    
+    if archive is not None:
+        members = iter_archive_images(archive)
+        while True:
+            member = await run_preprocess(next, members, None)
+            if member is None:
+                break
+            yield member
+
+
+async def _diagnose_batch_item(index: int, name: str, image_bytes: bytes, metadata, enhance: bool) -> dict:
+    """Diagnose one batch image; failures are reported in the item instead of raised."""
+    try:
+        patient_data = _patient_data(**patient_fields_for(metadata, name, index))
+        result = await _run_diagnosis(image_bytes, patient_data, enhance)
+    except InvalidImageError:
+        result = {"success": False, "error": "Invalid image"}
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+    return {"index": index, "filename": name, **result}
+
+
+async def _iter_batch_results(
+    files: List[Tuple[str, BinaryIO]],
+    archive: Optional[BinaryIO],
+    metadata,
+    enhance: bool
+) -> AsyncIterator[dict]:
+    """
+    Run batch images through the diagnosis pipeline and yield results as they finish.
+    
+    At most `batch_window` images are decoded or in flight at any time, so
+    memory stays flat regardless of upload size, while still giving the
+    batching engine enough concurrent requests to fill its batches.
+    
+    Shared by /diagnose/batch and batch jobs.
+    """
+    window = get_settings().batch_window
+    pending = set()
+    try:
+        index = 0
+        async for name, image_bytes in _iter_batch_uploads(files, archive):
+            pending.add(asyncio.ensure_future(
+                _diagnose_batch_item(index, name, image_bytes, metadata, enhance)
+            ))
+            index += 1
+            
+            if len(pending) >= window:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            else:
+                done = {task for task in pending if task.done()}
+                pending -= done
+            for task in done:
+                yield task.result()
+        
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # Consumer went away or the archive was unreadable
+        for task in pending:
+            task.cancel()
+
+
+async def _stream_batch(
+    files: List[Tuple[str, BinaryIO]],
+    archive: Optional[BinaryIO],
+    metadata,
+    enhance: bool
+) -> AsyncIterator[str]:
+    """Stream batch results as NDJSON lines, closing the uploads when done."""
+    results = _iter_batch_results(files, archive, metadata, enhance)
+    try:
+        async for item in results:
+            yield json.dumps(jsonable_encoder(item)) + "\n"
+    except Exception as e:
+        yield json.dumps({"success": False, "error": str(e)}) + "\n"
+    finally:
+        await results.aclose()
+        for _, fileobj in files:
+            fileobj.close()
+        if archive is not None:
+            archive.close()
+
+
+def _patient_data(
+    age: Optional[int] = None,
+    pain_level: Optional[int] = None,
+    family_history: bool = False,
+    lump_detected: bool = False,
+    nipple_discharge: bool = False
+) -> dict:
+    """Collect patient metadata for the Expert System."""
+    patient_data = {}
+    if age is not None:
+        patient_data["age"] = age
+    if pain_level is not None:
+        patient_data["pain_level"] = pain_level
+    patient_data["family_history"] = family_history
+    patient_data["lump_detected"] = lump_detected
+    patient_data["nipple_discharge"] = nipple_discharge
+    return patient_data
+
+
+def _decode_upload(image_bytes: bytes, enhance: bool) -> tuple:
+    """
+    Decode an upload once and compute its statistics.
+    
+    Returns:
+        Tuple of (ImagePipeline, image_stats)
+    """
+    pipeline = _decode(image_bytes)
+    
+    # Optional contrast enhancement (in place, no re-encoding)
+    if enhance:
+        with timed("enhance_contrast"):
+            pipeline.enhance_contrast()
+    
+    with timed("image_stats"):
+        stats = pipeline.stats()
+    return pipeline, stats
+
+
+def _decode(image_bytes: bytes) -> ImagePipeline:
+    """
+    Decode an upload, recording its size and resolution.
+    
+    The scale depends only on the classifier input, so the prediction and
+    the image statistics are the same whether or not a Grad-CAM overlay
+    is requested.
+    """
+    IMAGE_BYTES.observe(len(image_bytes))
+    with timed("decode"):
+        pipeline = ImagePipeline.from_bytes(image_bytes, get_classifier().decode_min_side)
+    width, height = pipeline.source_size
+    IMAGE_MEGAPIXELS.observe(height * width / 1e6)
+    return pipeline
+
+
+def _decode_overlay(pipeline: ImagePipeline, image_bytes: bytes, max_side: int):
+    """Background for a Grad-CAM overlay of `max_side` (0 = original resolution)."""
+    with timed("decode_overlay"):
+        return pipeline.overlay_pixels(image_bytes, max_side)
+
+
+def _timed_preprocess(clf: BreastTumorClassifier, pixels):
+    with timed("preprocess"):
+        return clf.preprocess(pixels)
+
+
+def _timed_gradcam(clf: BreastTumorClassifier, pixels, max_side: Optional[int] = None, background=None):
+    with timed("gradcam"):
+        return clf.generate_gradcam(pixels, max_side, background)
+
+
+def _encode_heatmap(heatmap, heatmap_format: str = "png", quality: Optional[int] = None) -> bytes:
+    """Encode an RGB heatmap overlay as PNG, WebP or JPEG."""
+    _, extension, quality_flag = HEATMAP_FORMATS[heatmap_format]
+    params = [quality_flag, quality] if quality_flag is not None and quality else []
+    with timed("encode_heatmap"):
+        ok, encoded = cv2.imencode(extension, cv2.cvtColor(heatmap, cv2.COLOR_RGB2BGR), params)
+    if not ok:
+        raise ValueError(f"Could not encode heatmap as {heatmap_format}")
+    return encoded.tobytes()
+
+
+def _analyze_patient(ml_prediction: dict, patient_data: dict) -> tuple:
+    """
+    Run the Expert System and Fuzzy Logic stages on a CNN prediction.
+    
+    Returns:
+        Tuple of (expert_analysis, fuzzy_analysis, combined_recommendation)
+    """
+    # Step 2: Expert System Analysis
+    expert = get_expert_system()
+    with timed("expert_system"):
+        expert_analysis = expert.analyze(ml_prediction, patient_data)
+    
+    # Step 3: Fuzzy Logic Analysis
+    fuzzy = get_fuzzy_system()
+    with timed("fuzzy_logic"):
+        fuzzy_analysis = fuzzy.analyze(
+            confidence=ml_prediction["confidence"],
+            severity_score=ml_prediction["severity_score"],
+            age=patient_data.get("age"),
+            pain_level=patient_data.get("pain_level")
+        )
+    
+    # Step 4: Combine results for final recommendation
+    with timed("combine_analyses"):
+        combined = _combine_analyses(ml_prediction, expert_analysis, fuzzy_analysis)
+    
+    return expert_analysis, fuzzy_analysis, combined
+
+
 def _combine_analyses(
     ml_prediction: dict,
     expert_analysis: dict,
@@ -0,0 +1,136 @@
+"""
+Runtime Configuration for Breast Tumor Diagnosis System
+Reads serving settings from environment variables (or a .env file)
+"""
+
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_int_tuple(name: str, default: Tuple[int, ...]) -> Tuple[int, ...]:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return tuple(int(item) for item in value.split(",") if item.strip())
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Serving settings for the diagnosis API."""
+
+    # Model checkpoint loaded at startup ("" = models/best_model.pth)
+    model_path: str = ""
+    # Inference runtime: eager, compile, torchscript, quantized or onnx
+    # (see export_model.py and quantize.py)
+    inference_backend: str = "eager"
+    # Exported artifact ("" = next to the checkpoint, e.g. best_model.onnx)
+    backend_path: str = ""
+    # Batch sizes run through the model before the pod reports ready
+    # (empty = 1 and batch_max_size)
+    warmup_batch_sizes: Tuple[int, ...] = ()
+
+    # Dynamic micro-batching of classifier inference
+    batch_max_size: int = 8
+    batch_max_wait_ms: float = 10.0
+    # Images in flight per /diagnose/batch request
+    batch_window: int = 16
+
+    # Thread pools that keep CPU-bound work off the event loop
+    inference_threads: int = 2
+    preprocess_threads: int = min(4, os.cpu_count() or 1)
+
+    # serve.py: server processes sharing the preloaded model, and PyTorch's
+    # intra-/inter-op threads per process (0 = split the cores between workers)
+    workers: int = 1
+    torch_threads: int = 0
+    torch_interop_threads: int = 0
+
+    # Content-addressed result cache (per cache: CNN predictions, Grad-CAM)
+    cache_max_entries: int = 256
+    cache_ttl_seconds: float = 3600.0
+    cache_max_mb: float = 256.0
+
+    # Admission control per worker: concurrent requests, wait queue length,
+    # max queue wait and end-to-end deadline in seconds (0 = no limit)
+    diagnose_max_in_flight: int = 8
+    diagnose_max_queue: int = 32
+    diagnose_queue_timeout: float = 5.0
+    diagnose_deadline: float = 30.0
+    gradcam_max_in_flight: int = 2
+    gradcam_max_queue: int = 8
+    gradcam_queue_timeout: float = 10.0
+    gradcam_deadline: float = 60.0
+
+    # Request body limits in MB (0 = unlimited); archives go to /diagnose/batch
+    max_upload_mb: float = 100.0
+    max_batch_upload_mb: float = 2048.0
+
+    # Asynchronous /jobs API: store location ("" = backend/jobs), workers, result lifetime
+    jobs_dir: str = ""
+    job_workers: int = 2
+    job_ttl_seconds: float = 86400.0
+
+    # Where serve.py workers share their metrics for /metrics ("" = a new temporary directory)
+    metrics_dir: str = ""
+
+    # Longest side of Grad-CAM overlays unless the request asks otherwise (0 = original size)
+    gradcam_max_side: int = 1024
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Build settings from environment variables, falling back to defaults."""
+        return cls(
+            model_path=os.getenv("MODEL_PATH", cls.model_path),
+            inference_backend=os.getenv("INFERENCE_BACKEND", cls.inference_backend),
+            backend_path=os.getenv("BACKEND_PATH", cls.backend_path),
+            warmup_batch_sizes=_env_int_tuple("WARMUP_BATCH_SIZES", cls.warmup_batch_sizes),
+            batch_max_size=_env_int("BATCH_MAX_SIZE", cls.batch_max_size),
+            batch_max_wait_ms=_env_float("BATCH_MAX_WAIT_MS", cls.batch_max_wait_ms),
+            batch_window=_env_int("BATCH_WINDOW", cls.batch_window),
+            inference_threads=_env_int("INFERENCE_THREADS", cls.inference_threads),
+            preprocess_threads=_env_int("PREPROCESS_THREADS", cls.preprocess_threads),
+            workers=_env_int("WORKERS", cls.workers),
+            torch_threads=_env_int("TORCH_THREADS", cls.torch_threads),
+            torch_interop_threads=_env_int("TORCH_INTEROP_THREADS", cls.torch_interop_threads),
+            cache_max_entries=_env_int("CACHE_MAX_ENTRIES", cls.cache_max_entries),
+            cache_ttl_seconds=_env_float("CACHE_TTL_SECONDS", cls.cache_ttl_seconds),
+            cache_max_mb=_env_float("CACHE_MAX_MB", cls.cache_max_mb),
+            diagnose_max_in_flight=_env_int("DIAGNOSE_MAX_IN_FLIGHT", cls.diagnose_max_in_flight),
+            diagnose_max_queue=_env_int("DIAGNOSE_MAX_QUEUE", cls.diagnose_max_queue),
+            diagnose_queue_timeout=_env_float("DIAGNOSE_QUEUE_TIMEOUT", cls.diagnose_queue_timeout),
+            diagnose_deadline=_env_float("DIAGNOSE_DEADLINE", cls.diagnose_deadline),
+            gradcam_max_in_flight=_env_int("GRADCAM_MAX_IN_FLIGHT", cls.gradcam_max_in_flight),
+            gradcam_max_queue=_env_int("GRADCAM_MAX_QUEUE", cls.gradcam_max_queue),
+            gradcam_queue_timeout=_env_float("GRADCAM_QUEUE_TIMEOUT", cls.gradcam_queue_timeout),
+            gradcam_deadline=_env_float("GRADCAM_DEADLINE", cls.gradcam_deadline),
+            max_upload_mb=_env_float("MAX_UPLOAD_MB", cls.max_upload_mb),
+            max_batch_upload_mb=_env_float("MAX_BATCH_UPLOAD_MB", cls.max_batch_upload_mb),
+            jobs_dir=os.getenv("JOBS_DIR", cls.jobs_dir),
+            job_workers=_env_int("JOB_WORKERS", cls.job_workers),
+            job_ttl_seconds=_env_float("JOB_TTL_SECONDS", cls.job_ttl_seconds),
+            metrics_dir=os.getenv("METRICS_DIR", cls.metrics_dir),
+            gradcam_max_side=_env_int("GRADCAM_MAX_SIDE", cls.gradcam_max_side),
+        )
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Settings are read once per process."""
+    return Settings.from_env()
@@ -0,0 +1,301 @@
+"""
+Prometheus Metrics for Breast Tumor Diagnosis System
+Minimal thread-safe counters, gauges and histograms rendered in the text exposition format
+"""
+
+import glob
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class: one named metric with optional labels."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def snapshot(self) -> List[list]:
+        """Current values as JSON-ready [label values, value] pairs."""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, total, value):
+        """Combine one process's value into the total across processes."""
+        return value if total is None else total + value
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], object]] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels):
+        """Mirror a total that is counted elsewhere (e.g. ResultCache.hits)."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Gauge(_Metric):
+    """
+    Value that can go up and down.
+
+    Across worker processes gauges are summed (requests in flight), or the
+    maximum is taken with `aggregate="max"` (per-process values such as a
+    load time). Only live workers count.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 aggregate: str = "sum"):
+        super().__init__(name, documentation, labelnames)
+        self.aggregate = aggregate
+
+    def merge(self, total, value):
+        if total is None:
+            return value
+        return max(total, value) if self.aggregate == "max" else total + value
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def snapshot(self) -> List[list]:
+        with self._lock:
+            return [[list(key), self.merge(None, state)] for key, state in self._values.items()]
+
+    def merge(self, total, state):
+        if total is None:
+            return {"counts": list(state["counts"]), "sum": state["sum"], "count": state["count"]}
+        total["counts"] = [a + b for a, b in zip(total["counts"], state["counts"])]
+        total["sum"] += state["sum"]
+        total["count"] += state["count"]
+        return total
+
+    def _render_sample(self, key, state) -> List[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = tuple(2 ** p for p in range(16, 28))  # 64 KB .. 128 MB
+MEGAPIXEL_BUCKETS = (0.25, 1, 2, 4, 8, 16, 24, 32, 48, 64)
+
+REQUESTS = Counter(
+    "diagnosis_requests_total", "HTTP requests by route and status code", ("endpoint", "method", "status"))
+REQUEST_SECONDS = Histogram(
+    "diagnosis_request_duration_seconds", "HTTP request latency", ("endpoint",), LATENCY_BUCKETS)
+IN_FLIGHT = Gauge(
+    "diagnosis_requests_in_flight", "Requests currently being handled", ("endpoint",))
+STAGE_SECONDS = Histogram(
+    "diagnosis_stage_duration_seconds", "Time spent in each diagnosis stage", ("stage",), LATENCY_BUCKETS)
+IMAGE_BYTES = Histogram(
+    "diagnosis_image_bytes", "Size of uploaded images", (), BYTES_BUCKETS)
+IMAGE_MEGAPIXELS = Histogram(
+    "diagnosis_image_megapixels", "Resolution of decoded images", (), MEGAPIXEL_BUCKETS)
+BATCH_SIZE = Histogram(
+    "diagnosis_inference_batch_size", "Images per classifier forward pass", (), (1, 2, 4, 8, 16, 32, 64))
+MODEL_LOAD_SECONDS = Gauge(
+    "diagnosis_model_load_seconds", "Time to load and warm up the model at startup", aggregate="max")
+CACHE_LOOKUPS = Counter(
+    "diagnosis_cache_lookups_total", "Result cache lookups by cache and outcome", ("cache", "result"))
+ADMISSION_IN_FLIGHT = Gauge(
+    "diagnosis_admission_in_flight", "Admitted requests running per budget", ("route",))
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "diagnosis_admission_queue_depth", "Requests waiting for an admission slot", ("route",))
+ADMISSION_SHED = Counter(
+    "diagnosis_admission_shed_total", "Requests rejected by admission control", ("route", "reason"))
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the duration of a block under diagnosis_stage_duration_seconds{stage=...}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+# Directory shared by the server's worker processes (see enable_multiprocess)
+_multiprocess_dir: Optional[str] = None
+_snapshot_lock = threading.Lock()
+
+
+def enable_multiprocess(directory: str, interval: float = 1.0):
+    """
+    Share this process's metrics with its sibling workers through `directory`.
+
+    Under serve.py every forked worker has its own registry, and a scrape
+    lands on whichever worker accepts it. Each worker therefore writes a
+    snapshot of its registry to <directory>/<pid>.json every `interval`
+    seconds (and on every scrape), and render_metrics merges the snapshots
+    of all workers. Counters and histograms of workers that have exited are
+    kept, since their requests did happen; gauges only count live workers.
+    Call once in each worker after the fork.
+    """
+    global _multiprocess_dir
+    _multiprocess_dir = directory
+    # Anything recorded before the fork belongs to the parent
+    for metric in REGISTRY:
+        with metric._lock:
+            metric._values.clear()
+
+    def flush_periodically():
+        while True:
+            time.sleep(interval)
+            _write_snapshot()
+
+    threading.Thread(target=flush_periodically, name="metrics-flush", daemon=True).start()
+
+
+def reset_multiprocess_dir(directory: str):
+    """Create `directory` and drop snapshots left by an earlier server run."""
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        os.remove(path)
+
+
+def _write_snapshot():
+    snapshot = {metric.name: metric.snapshot() for metric in REGISTRY}
+    path = os.path.join(_multiprocess_dir, f"{os.getpid()}.json")
+    temporary = f"{path}.tmp"
+    with _snapshot_lock:
+        with open(temporary, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(temporary, path)
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_snapshots() -> Iterable[Tuple[bool, dict]]:
+    """(alive, snapshot) for every worker that has written one."""
+    for path in glob.glob(os.path.join(_multiprocess_dir, "*.json")):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue  # removed or being replaced right now
+        pid = int(os.path.splitext(os.path.basename(path))[0])
+        yield pid == os.getpid() or _is_alive(pid), snapshot
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    if _multiprocess_dir is None:
+        for metric in REGISTRY:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    _write_snapshot()
+    merged: Dict[str, Dict[Tuple[str, ...], object]] = {metric.name: {} for metric in REGISTRY}
+    by_name = {metric.name: metric for metric in REGISTRY}
+    for alive, snapshot in _read_snapshots():
+        for name, samples in snapshot.items():
+            metric = by_name.get(name)
+            if metric is None or (metric.kind == "gauge" and not alive):
+                continue
+            values = merged[name]
+            for key, value in samples:
+                key = tuple(key)
+                values[key] = metric.merge(values.get(key), value)
+    for metric in REGISTRY:
+        lines.extend(metric.render(merged[metric.name]))
+    return "\n".join(lines) + "\n"
@@ -1,6 +1,8 @@
 # Machine Learning Module
 from .cnn_classifier import BreastTumorClassifier
 from .preprocessing import preprocess_image, enhance_contrast
+from .batching import BatchingEngine
+from .gradcam import GradCAM, render_overlay
 
-__all__ = ['BreastTumorClassifier', 'preprocess_image', 'enhance_contrast']
+__all__ = ['BreastTumorClassifier', 'preprocess_image', 'enhance_contrast', 'BatchingEngine', 'GradCAM', 'render_overlay']
 
@@ -0,0 +1,175 @@
+"""
+Inference Backends for the Breast Tumor Classifier
+Eager PyTorch, TorchScript, torch.compile, INT8 and ONNX Runtime behind one interface
+"""
+
+import os
+from typing import Dict, Optional, Type
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+class InferenceBackend:
+    """
+    Runs the classifier forward pass for a batch of preprocessed images.
+
+    Every backend takes a float tensor of shape (N, 3, 224, 224) on the
+    classifier's device and returns the (N, num_classes) logits, so the
+    serving code does not care which runtime is underneath.
+    """
+
+    name = "base"
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        raise NotImplementedError
+
+
+class EagerBackend(InferenceBackend):
+    """Plain eager-mode PyTorch."""
+
+    name = "eager"
+
+    def __init__(self, model: nn.Module, artifact_path: Optional[str] = None, device=None):
+        self.model = model
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return self.model(batch)
+
+
+class CompiledBackend(InferenceBackend):
+    """
+    torch.compile of the eager model.
+
+    There is no artifact to export: compilation happens on the first
+    forward for each batch size, which is why the startup warmup matters.
+    """
+
+    name = "compile"
+
+    def __init__(self, model: nn.Module, artifact_path: Optional[str] = None, device=None):
+        self.model = torch.compile(model, dynamic=False)
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return self.model(batch)
+
+
+class TorchScriptBackend(InferenceBackend):
+    """
+    Frozen TorchScript module produced by export_model.py.
+
+    optimize_for_inference (conv/bn folding, oneDNN layouts) is applied at
+    load time because its output is not serializable.
+    """
+
+    name = "torchscript"
+
+    def __init__(self, model: nn.Module, artifact_path: Optional[str] = None, device=None):
+        if not artifact_path or not os.path.exists(artifact_path):
+            raise FileNotFoundError(
+                f"TorchScript artifact not found: {artifact_path}. Run export_model.py first."
+            )
+        module = torch.jit.load(artifact_path, map_location=device)
+        self.module = torch.jit.optimize_for_inference(module.eval())
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return self.module(batch)
+
+
+class QuantizedBackend(InferenceBackend):
+    """INT8 TorchScript module produced by quantize.py (CPU only)."""
+
+    name = "quantized"
+
+    def __init__(self, model: nn.Module, artifact_path: Optional[str] = None, device=None):
+        if not artifact_path or not os.path.exists(artifact_path):
+            raise FileNotFoundError(
+                f"Quantized artifact not found: {artifact_path}. Run quantize.py first."
+            )
+        extra_files = {"engine": ""}
+        self.module = torch.jit.load(artifact_path, map_location="cpu", _extra_files=extra_files)
+        # Kernels must match the engine the model was calibrated for
+        engine = extra_files["engine"]
+        if engine:
+            torch.backends.quantized.engine = engine.decode() if isinstance(engine, bytes) else engine
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return self.module(batch.cpu()).to(batch.device)
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """ONNX Runtime session over the graph produced by export_model.py."""
+
+    name = "onnx"
+
+    def __init__(self, model: nn.Module, artifact_path: Optional[str] = None, device=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(
+                "The onnx backend requires onnxruntime: pip install onnxruntime"
+            ) from e
+
+        if not artifact_path or not os.path.exists(artifact_path):
+            raise FileNotFoundError(
+                f"ONNX artifact not found: {artifact_path}. Run export_model.py first."
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = torch.get_num_threads()
+
+        self.session = ort.InferenceSession(
+            artifact_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        inputs = np.ascontiguousarray(batch.detach().cpu().numpy(), dtype=np.float32)
+        (logits,) = self.session.run(None, {self.input_name: inputs})
+        return torch.from_numpy(logits).to(batch.device)
+
+
+BACKENDS: Dict[str, Type[InferenceBackend]] = {
+    backend.name: backend
+    for backend in (EagerBackend, CompiledBackend, TorchScriptBackend, QuantizedBackend, OnnxRuntimeBackend)
+}
+
+# Artifact file written by export_model.py / quantize.py for each exportable backend
+ARTIFACT_SUFFIXES = {
+    "torchscript": ".torchscript.pt",
+    "quantized": ".int8.pt",
+    "onnx": ".onnx",
+}
+
+
+def default_artifact_path(model_path: str, backend: str) -> Optional[str]:
+    """Artifact path next to the checkpoint, e.g. best_model.onnx for best_model.pth."""
+    if backend not in ARTIFACT_SUFFIXES or not model_path:
+        return None
+    return os.path.splitext(model_path)[0] + ARTIFACT_SUFFIXES[backend]
+
+
+def create_backend(
+    name: str,
+    model: nn.Module,
+    artifact_path: Optional[str] = None,
+    device: Optional[torch.device] = None
+) -> InferenceBackend:
+    """
+    Build an inference backend by name.
+
+    Args:
+        name: One of BACKENDS ("eager", "compile", "torchscript", "quantized", "onnx")
+        model: Eager model (in eval mode) with the checkpoint loaded
+        artifact_path: Exported artifact for torchscript/onnx
+        device: Device the classifier runs on
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    return BACKENDS[name](model, artifact_path=artifact_path, device=device)
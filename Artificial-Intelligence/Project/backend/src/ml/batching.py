@@ -0,0 +1,136 @@
+"""
+Dynamic Micro-Batching for Classifier Inference
+Collects concurrent prediction requests into a single forward pass
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import torch
+
+from .cnn_classifier import BreastTumorClassifier
+from ..metrics import timed, BATCH_SIZE, STAGE_SECONDS
+
+
+@dataclass
+class _PendingRequest:
+    """A preprocessed image waiting for its batch."""
+    input_tensor: torch.Tensor
+    future: asyncio.Future
+    enqueued_at: float
+    # Forward pass the request was dispatched in, once it has been
+    forward: Optional[asyncio.Future] = None
+
+
+class BatchingEngine:
+    """
+    Batching inference engine in front of BreastTumorClassifier.
+
+    Requests are queued as they arrive. A single background task takes the
+    oldest request, keeps collecting until either `max_batch_size` requests
+    are waiting or the oldest one has waited `max_wait_ms`, then runs one
+    forward pass for the whole batch and hands every caller its own result.
+    """
+
+    def __init__(
+        self,
+        classifier: BreastTumorClassifier,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        executor=None
+    ):
+        self.classifier = classifier
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.executor = executor
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def predict(self, input_tensor: torch.Tensor) -> Dict:
+        """Queue one preprocessed (3, 224, 224) tensor and wait for its prediction."""
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        request = _PendingRequest(input_tensor, loop.create_future(), loop.time())
+        await self._queue.put(request)
+        try:
+            return await asyncio.shield(request.future)
+        except asyncio.CancelledError:
+            # Not dispatched yet: dropped from its batch. Already in a forward
+            # pass: that cannot be interrupted, so wait for it to end
+            request.future.cancel()
+            if request.forward is not None:
+                await asyncio.wait([request.forward])
+            raise
+
+    def _ensure_started(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background batching task."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._queue.get()
+            batch = [first]
+            deadline = first.enqueued_at + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._dispatch(batch)
+
+    async def _dispatch(self, batch: List[_PendingRequest]):
+        # Callers that gave up (client disconnect, timeout) are dropped from the batch
+        batch = [request for request in batch if not request.future.done()]
+        if not batch:
+            return
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        for request in batch:
+            STAGE_SECONDS.observe(now - request.enqueued_at, stage="batch_queue_wait")
+        BATCH_SIZE.observe(len(batch))
+        
+        forward = loop.run_in_executor(
+            self.executor,
+            self._predict_batch,
+            [request.input_tensor for request in batch]
+        )
+        for request in batch:
+            request.forward = forward
+        try:
+            results = await forward
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        for request, result in zip(batch, results):
+            if not request.future.done():
+                request.future.set_result(result)
+
+    def _predict_batch(self, input_tensors: List[torch.Tensor]) -> List[Dict]:
+        with timed("predict"):
+            return self.classifier.predict_batch(input_tensors)
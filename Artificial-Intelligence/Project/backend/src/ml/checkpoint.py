@@ -0,0 +1,103 @@
+"""
+Training Checkpoints
+Atomic, background checkpoint writes and full training-state capture for resuming
+"""
+
+import os
+import random
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, List
+
+import numpy as np
+import torch
+
+
+def snapshot(obj: Any) -> Any:
+    """
+    Deep copy of a (nested) state dict with every tensor copied to CPU.
+
+    Taken on the training thread, so the optimizer can keep updating the
+    live tensors while the copy is written.
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {key: snapshot(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(value) for value in obj)
+    return obj
+
+
+def atomic_save(obj: Any, path: str):
+    """torch.save to a temporary file, fsync, then rename over `path`."""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            torch.save(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        # `path` still holds the previous checkpoint; drop the partial write
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+class AsyncCheckpointer:
+    """
+    Writes checkpoints on a background thread.
+
+    `save` snapshots the state and returns immediately; serialization and
+    disk I/O overlap with the next epoch. Writes are atomic, so a crash
+    mid-write leaves the previous checkpoint intact. Files are written in
+    order, and at most `max_pending` snapshots are held at once: a save
+    beyond that first waits for the oldest write.
+    """
+
+    def __init__(self, max_pending: int = 2):
+        self.max_pending = max(1, max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._pending: List[Future] = []
+
+    def save(self, state: Any, path: str):
+        copy = snapshot(state)
+        while len(self._pending) >= self.max_pending:
+            self._pending.pop(0).result()
+        self._pending.append(self._executor.submit(atomic_save, copy, path))
+
+    def wait(self):
+        """Block until every queued write is on disk (re-raising the first error, if any)."""
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown(wait=True)
+
+
+def rng_state() -> dict:
+    """Python, NumPy and PyTorch (CPU and CUDA) random generator states."""
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state: dict):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def load_checkpoint(path: str, map_location="cpu") -> dict:
+    """Load a training-state checkpoint written by train.py."""
+    # Holds optimizer state and RNG tuples, not only tensors
+    return torch.load(path, map_location=map_location, weights_only=False)
@@ -5,20 +5,26 @@ Breast Tumor Classifier using Transfer Learning (ResNet50)
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torchvision import transforms, models
-from PIL import Image
+from torchvision import models
 import numpy as np
-import io
-from typing import Tuple, Dict, Optional
-import cv2
+from typing import Tuple, Dict, List, Optional, Union
+from PIL import Image
+
+from .ingest import load_image
+from .pipeline import ImagePipeline
+from .preprocessing import resize_to_max_side
+from .backends import create_backend, default_artifact_path
+from .gradcam import GradCAM, render_overlay
 
 
 class TransferLearningCNN(nn.Module):
     """ResNet50-based classifier for breast tumor detection."""
     
-    def __init__(self, num_classes: int = 2, dropout_rate: float = 0.5):
+    def __init__(self, num_classes: int = 2, dropout_rate: float = 0.5, pretrained: bool = True):
         super().__init__()
-        self.backbone = models.resnet50(weights=models.ResNet50_Weights.IMAGENET1K_V2)
+        # ImageNet weights are only needed to start training; a checkpoint overwrites them
+        weights = models.ResNet50_Weights.IMAGENET1K_V2 if pretrained else None
+        self.backbone = models.resnet50(weights=weights)
         num_features = self.backbone.fc.in_features
         
         self.backbone.fc = nn.Sequential(
@@ -34,6 +40,32 @@ class TransferLearningCNN(nn.Module):
         return self.backbone(x)
 
 
+def load_model(model_path: str, device: torch.device) -> TransferLearningCNN:
+    """
+    Build the classifier around a checkpoint's tensors without copying them.
+    
+    The model is created on the meta device and the loaded tensors are
+    assigned as its parameters. On CPU the checkpoint is memory-mapped, so
+    the weights stay clean, file-backed pages: every worker process on the
+    node shares one copy through the page cache, and processes forked after
+    loading share them without copy-on-write faults.
+    """
+    try:
+        state_dict = torch.load(model_path, map_location=device, mmap=True)
+    except RuntimeError:
+        # Checkpoints in the legacy (non-zip) format cannot be mapped
+        state_dict = torch.load(model_path, map_location=device)
+    return model_from_state_dict(state_dict)
+
+
+def model_from_state_dict(state_dict: Dict[str, torch.Tensor]) -> TransferLearningCNN:
+    """Build the classifier on the meta device and assign `state_dict`'s tensors as its parameters."""
+    with torch.device("meta"):
+        model = TransferLearningCNN(num_classes=2, pretrained=False)
+    model.load_state_dict(state_dict, assign=True)
+    return model
+
+
 class BreastTumorClassifier:
     """CNN Classifier for breast tumor detection."""
     
@@ -42,29 +74,42 @@ class BreastTumorClassifier:
         model_path: Optional[str] = None,
         model_type: str = "transfer",
         backbone: str = "resnet50",
-        device: str = "auto"
+        device: str = "auto",
+        inference_backend: str = "eager",
+        backend_path: Optional[str] = None
     ):
         self.device = self._get_device(device)
         self.model_type = model_type
         
-        self.model = TransferLearningCNN(num_classes=2)
-        
         if model_path:
             print(f"Loading model from {model_path}")
-            state_dict = torch.load(model_path, map_location=self.device)
-            self.model.load_state_dict(state_dict)
+            self.model = load_model(model_path, self.device)
+        else:
+            self.model = TransferLearningCNN(num_classes=2, pretrained=True)
         
         self.model.to(self.device)
         self.model.eval()
         
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        # Predictions go through the selected backend; Grad-CAM always needs
+        # the eager model for its hooks and backward pass
+        self.backend = create_backend(
+            inference_backend,
+            self.model,
+            artifact_path=backend_path or default_artifact_path(model_path, inference_backend),
+            device=self.device
+        )
+        
+        self.input_size = [224, 224]
+        # Reduced-scale decodes keep a 2x margin over the input: resizing a
+        # 1/2-1/8 DCT-scaled JPEG straight to 224 drifts from the full decode
+        # the model was trained on
+        self.decode_min_side = 2 * min(self.input_size)
+        self.mean = torch.tensor([0.485, 0.456, 0.406]).view(3, 1, 1)
+        self.std = torch.tensor([0.229, 0.224, 0.225]).view(3, 1, 1)
         
         self.classes = ["benign", "malignant"]
-        print(f"Model initialized on: {self.device}")
+        self.gradcam = GradCAM(self.model, self.model.backbone.layer4[-1])
+        print(f"Model initialized on: {self.device} (backend: {self.backend.name})")
     
     def _get_device(self, device: str) -> torch.device:
         if device == "auto":
@@ -75,19 +120,67 @@ class BreastTumorClassifier:
             return torch.device("cpu")
         return torch.device(device)
     
-    def predict(self, image_bytes: bytes) -> Dict:
-        """Classify a mammogram image."""
-        image = Image.open(io.BytesIO(image_bytes))
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+    def warmup(self, batch_sizes: Tuple[int, ...] = (1,), gradcam: bool = True):
+        """
+        Run dummy forward passes so the first real requests don't pay for
+        allocator growth and kernel selection.
+        
+        Args:
+            batch_sizes: Batch sizes that will be used in production
+            gradcam: Also run one forward/backward pass as Grad-CAM does
+        """
+        for batch_size in batch_sizes:
+            self.backend(torch.zeros(batch_size, 3, *self.input_size, device=self.device))
+        
+        if gradcam:
+            self.gradcam(torch.zeros(1, 3, *self.input_size, device=self.device))
+    
+    def preprocess(self, image: Union[bytes, np.ndarray]) -> torch.Tensor:
+        """
+        Convert an image to a normalized (3, 224, 224) tensor.
+        
+        Accepts raw bytes or an already decoded BGR/grayscale array (see
+        ImagePipeline). Bytes go through load_image: DICOM and 16-bit
+        images are windowed to 8 bits, JPEGs are decoded at the smallest
+        scale that still covers `decode_min_side`. The decoded buffer is only read by the
+        resize; everything after works on the 224x224 result, and grayscale
+        stays single-channel until the normalized tensor.
+        
+        The resize is PIL's antialiased bilinear filter, exactly what
+        transforms.Resize applies in training (and in the dataset cache), so
+        served images are scaled the same way the model saw them.
+        """
+        if not isinstance(image, np.ndarray):
+            image, _ = load_image(image, self.decode_min_side)
+        
+        # Channel order does not matter to the resize; BGR is flipped afterwards
+        resized = np.array(
+            Image.fromarray(image).resize(tuple(reversed(self.input_size)), Image.BILINEAR)
+        )
         
-        input_tensor = self.transform(image).unsqueeze(0).to(self.device)
+        pixels = torch.from_numpy(resized)
+        if pixels.ndim == 2:
+            pixels = pixels.unsqueeze(-1)
+        else:
+            pixels = pixels.flip(-1)  # BGR -> RGB
+        
+        tensor = pixels.permute(2, 0, 1).float().div_(255.0)
+        return (tensor - self.mean) / self.std
+    
+    def predict(self, image: Union[bytes, np.ndarray]) -> Dict:
+        """Classify a mammogram image."""
+        return self.predict_batch([self.preprocess(image)])[0]
+    
+    def predict_batch(self, input_tensors: List[torch.Tensor]) -> List[Dict]:
+        """Classify several preprocessed images in a single forward pass."""
+        batch = torch.stack(input_tensors).to(self.device)
         
-        with torch.no_grad():
-            outputs = self.model(input_tensor)
-            probabilities = F.softmax(outputs, dim=1)
+        outputs = self.backend(batch)
+        probabilities = F.softmax(outputs, dim=1)
         
-        probs = probabilities.cpu().numpy()[0]
+        return [self._format_prediction(probs) for probs in probabilities.cpu().numpy()]
+    
+    def _format_prediction(self, probs: np.ndarray) -> Dict:
         predicted_class = int(np.argmax(probs))
         confidence = float(probs[predicted_class])
         
@@ -101,62 +194,58 @@ class BreastTumorClassifier:
             "severity_score": float(probs[1]) * 100
         }
     
-    def generate_gradcam(self, image_bytes: bytes) -> Tuple[np.ndarray, Dict]:
-        """Generate Grad-CAM heatmap for model explainability."""
-        image = Image.open(io.BytesIO(image_bytes))
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        original_image = np.array(image)
-        
-        input_tensor = self.transform(image).unsqueeze(0).to(self.device)
-        input_tensor.requires_grad_(True)
-        
-        target_layer = self.model.backbone.layer4[-1]
-        
-        gradients = []
-        activations = []
-        
-        def backward_hook(module, grad_input, grad_output):
-            gradients.append(grad_output[0])
-        
-        def forward_hook(module, input, output):
-            activations.append(output)
-        
-        backward_handle = target_layer.register_full_backward_hook(backward_hook)
-        forward_handle = target_layer.register_forward_hook(forward_hook)
-        
-        outputs = self.model(input_tensor)
-        probabilities = F.softmax(outputs, dim=1)
-        probs = probabilities.cpu().detach().numpy()[0]
-        predicted_class = int(np.argmax(probs))
-        
-        self.model.zero_grad()
-        outputs[0, predicted_class].backward()
-        
-        backward_handle.remove()
-        forward_handle.remove()
-        
-        grads = gradients[0].cpu().data.numpy()[0]
-        acts = activations[0].cpu().data.numpy()[0]
-        
-        weights = np.mean(grads, axis=(1, 2))
-        cam = np.zeros(acts.shape[1:], dtype=np.float32)
-        for i, w in enumerate(weights):
-            cam += w * acts[i]
-        
-        cam = np.maximum(cam, 0)
-        cam = cv2.resize(cam, (original_image.shape[1], original_image.shape[0]))
-        cam = (cam - cam.min()) / (cam.max() - cam.min() + 1e-8)
-        
-        heatmap = cv2.applyColorMap(np.uint8(255 * cam), cv2.COLORMAP_JET)
-        heatmap = cv2.cvtColor(heatmap, cv2.COLOR_BGR2RGB)
-        overlay = np.uint8(0.6 * original_image + 0.4 * heatmap)
-        
-        prediction = {
-            "predicted_class": self.classes[predicted_class],
-            "confidence": float(probs[predicted_class]),
-            "probabilities": {"benign": float(probs[0]), "malignant": float(probs[1])},
-            "severity_score": float(probs[1]) * 100
-        }
+    def explain_batch(self, input_tensors: List[torch.Tensor]) -> List[Tuple[np.ndarray, Dict]]:
+        """
+        Predict and compute Grad-CAMs for several preprocessed images at once.
+        
+        The reported prediction always comes from the inference backend, as
+        in predict_batch; with a non-eager backend (INT8, ONNX, ...) the
+        eager Grad-CAM pass only explains the class the backend predicted.
+        
+        Returns:
+            One (cam, prediction) pair per image; `cam` is the raw (7, 7)
+            map for the predicted class, ready for render_overlay
+        """
+        batch = torch.stack(input_tensors).to(self.device)
+        if self.backend.name == "eager":
+            logits, cams = self.gradcam(batch)
+        else:
+            logits = self.backend(batch).float()
+            _, cams = self.gradcam(batch, logits.argmax(dim=1).tolist())
+        probabilities = F.softmax(logits, dim=1).cpu().numpy()
+        
+        return [
+            (cam, self._format_prediction(probs))
+            for cam, probs in zip(cams.numpy(), probabilities)
+        ]
+    
+    def generate_gradcam(
+        self,
+        image: Union[bytes, np.ndarray],
+        max_side: Optional[int] = None,
+        background: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, Dict]:
+        """
+        Generate Grad-CAM heatmap for model explainability.
+        
+        Args:
+            image: Raw bytes or decoded BGR array
+            max_side: Longest side of the overlay; the blend runs at this
+                reduced size (None = original resolution)
+            background: BGR image to draw the overlay on when it was decoded
+                separately from `image` (see ImagePipeline.overlay_pixels);
+                defaults to `image`
+        """
+        if not isinstance(image, np.ndarray):
+            pipeline = ImagePipeline.from_bytes(image, self.decode_min_side)
+            if background is None:
+                background = pipeline.overlay_pixels(image, max_side)
+            image = pipeline.pixels
+        
+        cam, prediction = self.explain_batch([self.preprocess(image)])[0]
+        
+        background = resize_to_max_side(image if background is None else background, max_side)
+        original_image = background[..., ::-1] if background.ndim == 3 else background
+        overlay = render_overlay(original_image, cam)
         
         return overlay, prediction
@@ -0,0 +1,178 @@
+"""
+Preprocessed Dataset Cache for Training
+Decodes and resizes an ImageFolder split once into a memory-mapped uint8 array
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+from torch.utils.data import Dataset
+from torchvision import datasets
+
+if TYPE_CHECKING:
+    from .dataset_index import DatasetIndex
+
+
+CACHE_VERSION = 1
+
+
+def fingerprint(samples: List[Tuple[str, int]], stats: Optional[List[Tuple[int, int]]] = None) -> str:
+    """
+    Cheap identity of a split: every file's path, label, size and mtime.
+
+    This is the one test of whether a split has changed; the dataset
+    manifest (dataset_index.py) stores the same fingerprint.
+
+    Args:
+        samples: (absolute path, label) pairs in ImageFolder order
+        stats: (size, mtime_ns) of each sample, if already known
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for position, (path, label) in enumerate(samples):
+        if stats is None:
+            stat = os.stat(path)
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+        else:
+            size, mtime_ns = stats[position]
+        digest.update(f"{path}\0{label}\0{size}\0{mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def build_cache(
+    split_dir: str,
+    cache_dir: str,
+    size: int,
+    workers: Optional[int] = None,
+    index: Optional["DatasetIndex"] = None
+) -> str:
+    """
+    Decode every image of an ImageFolder split, resize it to size x size and
+    store the results in one (N, size, size, 3) uint8 .npy file.
+
+    Images are resized exactly as transforms.Resize((size, size)) does on
+    the PIL image, so training on the cache sees the same pixels as
+    training on the files. The cache is rebuilt only when files are added,
+    removed or modified.
+
+    Args:
+        split_dir: ImageFolder root (one sub-directory per class)
+        cache_dir: Directory for the cache of this split and size
+        size: Side length of the stored images
+        workers: Decoding threads (default: all cores)
+        index: Up-to-date DatasetIndex of the split; its files and
+            fingerprint are used instead of listing the split again
+
+    Returns:
+        cache_dir
+    """
+    if index is not None:
+        samples, classes, split_fingerprint = index.samples, index.classes, index.fingerprint
+    else:
+        folder = datasets.ImageFolder(os.path.abspath(split_dir))
+        samples, classes, split_fingerprint = folder.samples, folder.classes, fingerprint(folder.samples)
+    meta = {
+        "version": CACHE_VERSION,
+        "source": os.path.abspath(split_dir),
+        "size": size,
+        "count": len(samples),
+        "classes": classes,
+        "fingerprint": split_fingerprint,
+    }
+    if _read_meta(cache_dir) == meta:
+        return cache_dir
+
+    print(f"Caching {len(samples)} images from {split_dir} at {size}x{size}...")
+    building = cache_dir.rstrip(os.sep) + ".building"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+
+    images = np.lib.format.open_memmap(
+        os.path.join(building, "images.npy"), mode="w+",
+        dtype=np.uint8, shape=(len(samples), size, size, 3)
+    )
+
+    def load(position: int):
+        with Image.open(samples[position][0]) as image:
+            images[position] = np.asarray(image.convert("RGB").resize((size, size), Image.BILINEAR))
+
+    # PIL releases the GIL while decoding and resizing
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        list(executor.map(load, range(len(samples))))
+    images.flush()
+    del images
+
+    labels = np.asarray([label for _, label in samples], dtype=np.int64)
+    np.save(os.path.join(building, "labels.npy"), labels)
+    with open(os.path.join(building, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(building, cache_dir)
+    return cache_dir
+
+
+def _read_meta(cache_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class CachedImageDataset(Dataset):
+    """
+    Dataset over a cache written by build_cache.
+
+    Behaves like the ImageFolder it was built from (`classes`, `targets`,
+    `(image, label)` items), but each item is a slice of a memory-mapped
+    array instead of a file decode. The map is opened lazily so every
+    DataLoader worker gets its own.
+    """
+
+    def __init__(self, cache_dir: str, transform: Optional[Callable] = None):
+        self.cache_dir = cache_dir
+        self.transform = transform
+        meta = _read_meta(cache_dir)
+        if meta is None:
+            raise FileNotFoundError(f"No dataset cache in {cache_dir}")
+        self.classes = meta["classes"]
+        self.class_to_idx = {name: index for index, name in enumerate(self.classes)}
+        self.size = meta["size"]
+        self.targets = np.load(os.path.join(cache_dir, "labels.npy")).tolist()
+        self._images = None
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def __getitem__(self, index: int):
+        if self._images is None:
+            self._images = np.load(os.path.join(self.cache_dir, "images.npy"), mmap_mode="r")
+        image = Image.fromarray(np.asarray(self._images[index]))
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, self.targets[index]
+
+    def __getstate__(self):
+        # Workers re-open the map instead of pickling it
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+
+def cached_image_folder(
+    split_dir: str,
+    cache_root: str,
+    size: int,
+    transform: Optional[Callable] = None,
+    index: Optional["DatasetIndex"] = None
+) -> CachedImageDataset:
+    """Build (or reuse) the cache of a split at `size` and open it."""
+    split = os.path.basename(os.path.normpath(split_dir))
+    cache_dir = build_cache(split_dir, os.path.join(cache_root, f"{split}_{size}"), size, index=index)
+    return CachedImageDataset(cache_dir, transform=transform)
@@ -0,0 +1,169 @@
+"""
+Dataset Index for Training
+Per-split file manifest with labels, sizes and content hashes, kept up to date incrementally
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from torchvision.datasets.folder import IMG_EXTENSIONS, find_classes, make_dataset
+
+from .dataset_cache import fingerprint
+
+
+MANIFEST_VERSION = 2
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DatasetIndex:
+    """
+    Files of one ImageFolder split, without decoding any of them.
+
+    Classes and sample order are exactly ImageFolder's, so `targets` lines
+    up with the dataset built from the same directory. Each entry also
+    carries the file's size, mtime and content hash. Whether the split
+    changed is decided by the dataset cache's fingerprint (paths, labels,
+    sizes and mtimes), which the manifest stores: an unchanged fingerprint
+    reuses the previous manifest as is, otherwise only files whose size or
+    mtime changed are hashed again.
+    """
+
+    def __init__(self, root: str, classes: List[str], entries: List[dict], fingerprint: str):
+        self.root = root
+        self.classes = classes
+        # {"path": relative path, "label", "size", "mtime_ns", "hash"} in ImageFolder order
+        self.entries = entries
+        # dataset_cache.fingerprint of the split
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def scan(
+        cls,
+        root: str,
+        previous: Optional["DatasetIndex"] = None,
+        workers: Optional[int] = None
+    ) -> "DatasetIndex":
+        """List a split and hash new or modified files (reusing `previous` for the rest)."""
+        root = os.path.abspath(root)
+        classes, class_to_idx = find_classes(root)
+        samples = make_dataset(root, class_to_idx, extensions=IMG_EXTENSIONS)
+        stats = [os.stat(path) for path, _ in samples]
+        split_fingerprint = fingerprint(samples, [(stat.st_size, stat.st_mtime_ns) for stat in stats])
+        if previous is not None and previous.fingerprint == split_fingerprint:
+            return previous
+        known = {entry["path"]: entry for entry in previous.entries} if previous else {}
+
+        entries, to_hash = [], []
+        for (path, label), stat in zip(samples, stats):
+            entry = {
+                "path": os.path.relpath(path, root),
+                "label": label,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "hash": None,
+            }
+            old = known.get(entry["path"])
+            if old is not None and old["size"] == entry["size"] and old["mtime_ns"] == entry["mtime_ns"]:
+                entry["hash"] = old["hash"]
+            else:
+                to_hash.append(entry)
+            entries.append(entry)
+
+        # hashlib releases the GIL on large buffers
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            digests = executor.map(hash_file, (os.path.join(root, entry["path"]) for entry in to_hash))
+            for entry, digest in zip(to_hash, digests):
+                entry["hash"] = digest
+
+        return cls(root, classes, entries, split_fingerprint)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["DatasetIndex"]:
+        """Read a saved manifest, or None if it is missing or from another version."""
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != MANIFEST_VERSION:
+            return None
+        return cls(manifest["root"], manifest["classes"], manifest["files"], manifest["fingerprint"])
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "root": self.root,
+            "classes": self.classes,
+            "fingerprint": self.fingerprint,
+            "files": self.entries,
+        }
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def samples(self) -> List[Tuple[str, int]]:
+        """(absolute path, label) pairs, as ImageFolder.samples."""
+        return [(os.path.join(self.root, entry["path"]), entry["label"]) for entry in self.entries]
+
+    @property
+    def targets(self) -> np.ndarray:
+        return np.fromiter((entry["label"] for entry in self.entries), dtype=np.int64, count=len(self.entries))
+
+    def class_counts(self) -> np.ndarray:
+        """Number of files per class index."""
+        return np.bincount(self.targets, minlength=len(self.classes))
+
+    def files_by_class(self) -> Dict[str, List[str]]:
+        """Relative file paths per class name."""
+        files = {name: [] for name in self.classes}
+        for entry in self.entries:
+            files[self.classes[entry["label"]]].append(entry["path"])
+        return files
+
+    def diff(self, previous: Optional["DatasetIndex"]) -> Dict[str, List[str]]:
+        """Files added, removed or changed in content (or class) since `previous`."""
+        if previous is None:
+            return {"added": [entry["path"] for entry in self.entries], "removed": [], "modified": []}
+        before = {entry["path"]: entry for entry in previous.entries}
+        now = {entry["path"]: entry for entry in self.entries}
+        return {
+            "added": [path for path in now if path not in before],
+            "removed": [path for path in before if path not in now],
+            "modified": [
+                path for path, entry in now.items()
+                if path in before and (entry["hash"], entry["label"]) != (before[path]["hash"], before[path]["label"])
+            ],
+        }
+
+
+def update_index(split_dir: str, manifest_path: str) -> Tuple[DatasetIndex, Dict[str, List[str]]]:
+    """
+    Rescan a split against its saved manifest and save the result.
+
+    Returns:
+        (current index, changes since the saved manifest)
+    """
+    previous = DatasetIndex.load(manifest_path)
+    if previous is not None and os.path.abspath(previous.root) != os.path.abspath(split_dir):
+        previous = None
+    index = DatasetIndex.scan(split_dir, previous)
+    changes = index.diff(previous)
+    if previous is None or index.fingerprint != previous.fingerprint:
+        index.save(manifest_path)
+    return index, changes
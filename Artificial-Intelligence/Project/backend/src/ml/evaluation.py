@@ -0,0 +1,248 @@
+"""
+Classifier Evaluation
+Tensor-accumulated confusion matrix and probabilities, with vectorized clinical and calibration metrics
+"""
+
+import contextlib
+import json
+import os
+from typing import Dict, List, Optional, Sequence
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+class EvaluationAccumulator:
+    """
+    Collects predictions batch by batch without Python-level loops.
+
+    The confusion matrix is updated with one bincount per batch; class
+    probabilities and labels are kept as CPU tensors for the ranking and
+    calibration metrics.
+    """
+
+    def __init__(self, num_classes: int):
+        self.num_classes = num_classes
+        self.confusion = torch.zeros(num_classes, num_classes, dtype=torch.int64)
+        self._probs: List[torch.Tensor] = []
+        self._labels: List[torch.Tensor] = []
+        self.loss_sum = 0.0
+
+    def update(self, logits: torch.Tensor, labels: torch.Tensor, loss: Optional[torch.Tensor] = None):
+        probs = F.softmax(logits.detach().float(), dim=1).cpu()
+        labels = labels.detach().cpu()
+        predicted = probs.argmax(dim=1)
+        # Row = true class, column = predicted class
+        self.confusion += torch.bincount(
+            labels * self.num_classes + predicted, minlength=self.num_classes ** 2
+        ).view(self.num_classes, self.num_classes)
+        self._probs.append(probs)
+        self._labels.append(labels)
+        if loss is not None:
+            self.loss_sum += loss.item() * labels.numel()
+
+    @property
+    def count(self) -> int:
+        return int(self.confusion.sum())
+
+    @property
+    def accuracy(self) -> float:
+        return float(self.confusion.diag().sum()) / max(self.count, 1)
+
+    @property
+    def loss(self) -> float:
+        return self.loss_sum / max(self.count, 1)
+
+    def probabilities(self) -> torch.Tensor:
+        return torch.cat(self._probs) if self._probs else torch.zeros(0, self.num_classes)
+
+    def labels(self) -> torch.Tensor:
+        return torch.cat(self._labels) if self._labels else torch.zeros(0, dtype=torch.int64)
+
+    def metrics(self, class_names: Sequence[str], positive_class: int = 1, calibration_bins: int = 15) -> Dict:
+        return compute_metrics(
+            self.confusion, self.probabilities(), self.labels(),
+            class_names, positive_class=positive_class, calibration_bins=calibration_bins
+        )
+
+
+def _safe_div(numerator: torch.Tensor, denominator: torch.Tensor) -> torch.Tensor:
+    return torch.where(denominator > 0, numerator / denominator.clamp(min=1), torch.zeros_like(numerator))
+
+
+def roc_auc(scores: torch.Tensor, positives: torch.Tensor) -> Optional[float]:
+    """
+    Area under the ROC curve from the rank-sum (Mann-Whitney U) statistic,
+    with tied scores given their average rank. None if only one class is present.
+    """
+    positives = positives.bool()
+    n_pos = int(positives.sum())
+    n_neg = positives.numel() - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return None
+
+    sorted_scores, order = torch.sort(scores.double())
+    _, inverse, counts = torch.unique_consecutive(sorted_scores, return_inverse=True, return_counts=True)
+    # 1-based average rank of each group of tied scores
+    group_end = torch.cumsum(counts, 0).double()
+    average_rank = group_end - (counts.double() - 1) / 2
+    ranks = torch.empty_like(average_rank[inverse])
+    ranks[order] = average_rank[inverse]
+
+    rank_sum = ranks[positives].sum().item()
+    return (rank_sum - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+
+
+def calibration(probs: torch.Tensor, labels: torch.Tensor, bins: int = 15) -> Dict:
+    """
+    Expected calibration error of the top-class confidence over equal-width
+    bins, plus the per-bin reliability table and the multi-class Brier score.
+    """
+    if labels.numel() == 0:
+        return {"ece": None, "brier": None, "bins": []}
+    confidence, predicted = probs.max(dim=1)
+    correct = predicted.eq(labels).double()
+    bin_index = (confidence.double() * bins).long().clamp(max=bins - 1)
+
+    counts = torch.bincount(bin_index, minlength=bins).double()
+    confidence_sum = torch.bincount(bin_index, weights=confidence.double(), minlength=bins)
+    correct_sum = torch.bincount(bin_index, weights=correct, minlength=bins)
+    mean_confidence = _safe_div(confidence_sum, counts)
+    bin_accuracy = _safe_div(correct_sum, counts)
+    ece = ((counts / labels.numel()) * (mean_confidence - bin_accuracy).abs()).sum().item()
+
+    one_hot = F.one_hot(labels, probs.shape[1]).double()
+    brier = ((probs.double() - one_hot) ** 2).sum(dim=1).mean().item()
+
+    occupied = counts > 0
+    table = [
+        {"lower": low / bins, "upper": (low + 1) / bins, "count": int(n),
+         "confidence": round(conf, 4), "accuracy": round(acc, 4)}
+        for low, n, conf, acc in zip(
+            torch.arange(bins)[occupied].tolist(), counts[occupied].tolist(),
+            mean_confidence[occupied].tolist(), bin_accuracy[occupied].tolist()
+        )
+    ]
+    return {"ece": round(ece, 4), "brier": round(brier, 4), "bins": table}
+
+
+def compute_metrics(
+    confusion: torch.Tensor,
+    probs: torch.Tensor,
+    labels: torch.Tensor,
+    class_names: Sequence[str],
+    positive_class: int = 1,
+    calibration_bins: int = 15
+) -> Dict:
+    """
+    Accuracy, per-class precision/recall/F1, sensitivity/specificity for the
+    positive class (malignant), ROC-AUC and calibration.
+
+    Args:
+        confusion: (C, C) counts, rows = true class, columns = prediction
+        probs: (N, C) predicted class probabilities
+        labels: (N,) true classes
+        class_names: Name of each class index
+        positive_class: Class treated as positive for sensitivity/specificity/AUC
+        calibration_bins: Number of confidence bins for the ECE
+
+    Returns:
+        JSON-serializable metrics dict
+    """
+    confusion = confusion.double()
+    total = confusion.sum()
+    true_positives = confusion.diag()
+    actual = confusion.sum(dim=1)
+    predicted = confusion.sum(dim=0)
+
+    precision = _safe_div(true_positives, predicted)
+    recall = _safe_div(true_positives, actual)
+    f1 = _safe_div(2 * precision * recall, precision + recall)
+    # One-vs-rest specificity per class: TN / (TN + FP)
+    true_negatives = total - actual - predicted + true_positives
+    specificity = _safe_div(true_negatives, total - actual)
+
+    per_class_auc = [roc_auc(probs[:, index], labels == index) for index in range(len(class_names))]
+    valid_auc = [auc for auc in per_class_auc if auc is not None]
+
+    per_class = {
+        name: {
+            "support": int(actual[index]),
+            "precision": round(precision[index].item(), 4),
+            "recall": round(recall[index].item(), 4),
+            "specificity": round(specificity[index].item(), 4),
+            "f1": round(f1[index].item(), 4),
+            "roc_auc": round(per_class_auc[index], 4) if per_class_auc[index] is not None else None,
+        }
+        for index, name in enumerate(class_names)
+    }
+
+    positive = class_names[positive_class]
+    return {
+        "samples": int(total),
+        "accuracy": round((true_positives.sum() / total.clamp(min=1)).item(), 4),
+        "balanced_accuracy": round(recall.mean().item(), 4),
+        "positive_class": positive,
+        "sensitivity": per_class[positive]["recall"],
+        "specificity": per_class[positive]["specificity"],
+        "roc_auc": per_class[positive]["roc_auc"],
+        "macro_roc_auc": round(sum(valid_auc) / len(valid_auc), 4) if valid_auc else None,
+        "macro_f1": round(f1.mean().item(), 4),
+        "calibration": calibration(probs, labels, calibration_bins),
+        "per_class": per_class,
+        "confusion_matrix": {
+            "labels": list(class_names),
+            "matrix": confusion.long().tolist(),
+        },
+    }
+
+
+def evaluate_model(
+    model: nn.Module,
+    loader,
+    device: torch.device,
+    num_classes: int = 2,
+    criterion: Optional[nn.Module] = None,
+    autocast_dtype: Optional[torch.dtype] = None,
+    memory_format: torch.memory_format = torch.contiguous_format
+) -> EvaluationAccumulator:
+    """Run a model over a loader of (images, labels) and accumulate its predictions."""
+    accumulator = EvaluationAccumulator(num_classes)
+    model.eval()
+    autocast = (torch.autocast(device_type=device.type, dtype=autocast_dtype)
+                if autocast_dtype is not None else contextlib.nullcontext())
+    with torch.inference_mode(), autocast:
+        for images, labels in loader:
+            images = images.to(device, memory_format=memory_format, non_blocking=True)
+            labels = labels.to(device, non_blocking=True)
+            logits = model(images)
+            loss = criterion(logits.float(), labels) if criterion is not None else None
+            accumulator.update(logits, labels, loss)
+    return accumulator
+
+
+def write_report(report: Dict, path: str):
+    """Write a metrics report as JSON (atomically)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def format_summary(metrics: Dict) -> str:
+    """Human-readable summary of compute_metrics output."""
+    def fmt(value):
+        return "n/a" if value is None else f"{value:.4f}"
+
+    lines = [
+        f"Accuracy: {fmt(metrics['accuracy'])} (balanced {fmt(metrics['balanced_accuracy'])}, "
+        f"{metrics['samples']} images)",
+        f"Sensitivity ({metrics['positive_class']}): {fmt(metrics['sensitivity'])} | "
+        f"Specificity: {fmt(metrics['specificity'])} | ROC-AUC: {fmt(metrics['roc_auc'])}",
+        f"Calibration: ECE {fmt(metrics['calibration']['ece'])} | Brier {fmt(metrics['calibration']['brier'])}",
+    ]
+    for name, row in metrics["per_class"].items():
+        lines.append(f"  {name}: recall {fmt(row['recall'])} | precision {fmt(row['precision'])} | "
+                     f"F1 {fmt(row['f1'])} ({row['support']} images)")
+    return "\n".join(lines)
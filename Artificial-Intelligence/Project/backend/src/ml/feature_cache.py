@@ -0,0 +1,134 @@
+"""
+Frozen-Backbone Feature Cache
+Pooled ResNet50 features per image, computed once and reused to train the classifier head
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Callable, List, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Dataset
+from torchvision.datasets.folder import default_loader
+
+from .dataset_index import DatasetIndex
+
+
+FEATURE_DIM = 2048
+
+
+def backbone_trunk(model: nn.Module) -> nn.Sequential:
+    """ResNet50 of a TransferLearningCNN up to the pooled, flattened features (shares its modules)."""
+    layers = list(model.backbone.children())[:-1]  # everything but the fc head
+    return nn.Sequential(*layers, nn.Flatten(1))
+
+
+def backbone_fingerprint(model: nn.Module) -> str:
+    """Hash of the backbone weights; cached features are only valid for the same backbone."""
+    digest = hashlib.blake2b(digest_size=16)
+    for name, tensor in backbone_trunk(model).state_dict().items():
+        digest.update(name.encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+class _ImageFiles(Dataset):
+    def __init__(self, paths: List[str], transform: Callable):
+        self.paths = paths
+        self.transform = transform
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getitem__(self, index: int) -> torch.Tensor:
+        return self.transform(default_loader(self.paths[index]))
+
+
+def build_feature_cache(
+    index: DatasetIndex,
+    cache_dir: str,
+    model: nn.Module,
+    transform: Callable,
+    device: torch.device,
+    batch_size: int = 64,
+    num_workers: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pooled backbone features for every file of a split, in index order.
+
+    Features are stored per file content hash (from the dataset manifest),
+    so when images are added or changed only those go through the
+    backbone; the rest are copied from the previous cache. Changing the
+    backbone weights invalidates the whole cache.
+
+    Args:
+        index: Current DatasetIndex of the split
+        cache_dir: Feature cache directory of this split
+        model: TransferLearningCNN whose backbone is used (frozen)
+        transform: Deterministic preprocessing (the evaluation transform)
+        device: Device for the forward passes
+        batch_size: Images per forward pass
+        num_workers: DataLoader workers for decoding
+
+    Returns:
+        (features, labels): memory-mapped (N, 2048) float32 features and (N,) int64 labels
+    """
+    fingerprint = backbone_fingerprint(model)
+    hashes = [entry["hash"] for entry in index.entries]
+
+    cached_rows, cached = {}, None
+    meta = _read_meta(cache_dir)
+    if meta is not None and meta["backbone"] == fingerprint:
+        cached = np.load(os.path.join(cache_dir, "features.npy"), mmap_mode="r")
+        cached_rows = {digest: row for row, digest in enumerate(meta["hashes"])}
+
+    missing = sorted({position for position, digest in enumerate(hashes) if digest not in cached_rows})
+    print(f"Features for {index.root}: {len(hashes) - len(missing)} cached, {len(missing)} to compute")
+
+    building = cache_dir.rstrip(os.sep) + ".building"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+    features = np.lib.format.open_memmap(
+        os.path.join(building, "features.npy"), mode="w+", dtype=np.float32, shape=(len(hashes), FEATURE_DIM)
+    )
+
+    for position, digest in enumerate(hashes):
+        if digest in cached_rows:
+            features[position] = cached[cached_rows[digest]]
+
+    if missing:
+        samples = index.samples
+        loader = DataLoader(
+            _ImageFiles([samples[position][0] for position in missing], transform),
+            batch_size=batch_size, num_workers=num_workers
+        )
+        trunk = backbone_trunk(model).to(device).eval()
+        done = 0
+        with torch.inference_mode():
+            for images in loader:
+                batch = trunk(images.to(device)).float().cpu().numpy()
+                features[missing[done:done + len(batch)]] = batch
+                done += len(batch)
+
+    features.flush()
+    del features, cached
+    np.save(os.path.join(building, "labels.npy"), index.targets)
+    with open(os.path.join(building, "meta.json"), "w") as f:
+        json.dump({"backbone": fingerprint, "hashes": hashes}, f)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(building, cache_dir)
+    return (np.load(os.path.join(cache_dir, "features.npy"), mmap_mode="r"),
+            np.load(os.path.join(cache_dir, "labels.npy")))
+
+
+def _read_meta(cache_dir: str):
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,286 @@
+"""
+Mammogram Ingestion
+Loads DICOM and 12/16-bit grayscale images single-channel, with modality/VOI LUT windowing
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .preprocessing import IGNORE_ORIENTATION, InvalidImageError, decode_image_reduced, open_buffer, reduction_factor
+
+try:
+    import pydicom
+    from pydicom.errors import InvalidDicomError
+except ImportError:  # DICOM input is optional
+    pydicom = None
+    InvalidDicomError = None
+
+
+# PIL modes of grayscale images with more than 8 bits per pixel
+HIGH_BIT_DEPTH_MODES = ("I", "I;16", "I;16B", "I;16L", "I;16N")
+
+# Errors raised by the decoders for corrupt or truncated data
+_DECODE_ERRORS = (cv2.error, InvalidDicomError) if InvalidDicomError is not None else (cv2.error,)
+
+# Transfer syntaxes whose pixel data is stored raw and can be mapped directly
+_UNCOMPRESSED_SYNTAXES = (
+    "1.2.840.10008.1.2",    # Implicit VR Little Endian
+    "1.2.840.10008.1.2.1",  # Explicit VR Little Endian
+    "1.2.840.10008.1.2.2",  # Explicit VR Big Endian
+)
+
+
+@dataclass
+class Windowing:
+    """How stored pixel values map to 8-bit display values (DICOM PS3.3 C.11)."""
+    # Modality LUT: output = stored * slope + intercept
+    slope: float = 1.0
+    intercept: float = 0.0
+    # VOI window/level; without it the full range of the image is used
+    center: Optional[float] = None
+    width: Optional[float] = None
+    # VOI LUT (takes precedence over center/width): table, first mapped value, bits per entry
+    voi_lut: Optional[np.ndarray] = None
+    voi_lut_first: int = 0
+    voi_lut_bits: int = 16
+    # Significant bits of each stored value (BitsStored); the rest are masked off
+    bits_stored: Optional[int] = None
+    # MONOCHROME1: low values are displayed bright
+    invert: bool = False
+
+
+def is_dicom(data: bytes) -> bool:
+    """True if the bytes carry the DICOM Part 10 preamble."""
+    return len(data) >= 132 and bytes(data[128:132]) == b"DICM"
+
+
+def load_image(
+    image_bytes: bytes,
+    min_side: int = 0,
+    min_long_side: int = 0
+) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Decode any supported upload into a uint8 image for the pipeline.
+
+    DICOM and 16-bit PNG/TIFF are read single-channel at full depth and
+    windowed to 8 bits; everything else goes through decode_image_reduced.
+
+    Args:
+        image_bytes: Raw upload bytes
+        min_side: Minimum shorter side of the result (0 = full resolution)
+        min_long_side: Minimum longer side of the result
+
+    Returns:
+        Tuple of (BGR or grayscale uint8 array, original (width, height))
+
+    Raises:
+        InvalidImageError: The data is empty or not a decodable image
+    """
+    if not len(image_bytes):
+        raise InvalidImageError("Empty image")
+    try:
+        return _load_image(image_bytes, min_side, min_long_side)
+    except _DECODE_ERRORS as e:
+        # e.g. OpenCV assertions on truncated data
+        raise InvalidImageError("Could not decode image") from e
+
+
+def _load_image(image_bytes: bytes, min_side: int, min_long_side: int) -> Tuple[np.ndarray, Tuple[int, int]]:
+    if is_dicom(image_bytes):
+        pixels, windowing = read_dicom(image_bytes)
+    else:
+        try:
+            with Image.open(open_buffer(image_bytes)) as probe:
+                high_bit_depth = probe.mode in HIGH_BIT_DEPTH_MODES
+        except Exception:
+            high_bit_depth = False
+        if not high_bit_depth:
+            return decode_image_reduced(image_bytes, min_side, min_long_side)
+        pixels, windowing = read_high_bit_depth(image_bytes), Windowing()
+
+    height, width = pixels.shape[:2]
+    if pixels.ndim == 3:
+        # Color DICOM is rare and already 8-bit
+        image = np.ascontiguousarray(pixels[..., ::-1]).astype(np.uint8, copy=False)
+    else:
+        image = window_to_uint8(pixels, windowing)
+
+    factor = reduction_factor(width, height, min_side, min_long_side)
+    if factor > 1:
+        size = (-(-width // factor), -(-height // factor))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return image, (width, height)
+
+
+def read_high_bit_depth(image_bytes: bytes) -> np.ndarray:
+    """Decode a 16-bit PNG/TIFF into a single-channel array without reducing its depth."""
+    pixels = cv2.imdecode(
+        np.frombuffer(image_bytes, np.uint8),
+        cv2.IMREAD_ANYDEPTH | cv2.IMREAD_GRAYSCALE | IGNORE_ORIENTATION
+    )
+    if pixels is None:
+        raise InvalidImageError("Could not decode image")
+    return pixels
+
+
+def read_dicom(source: Union[bytes, str]) -> Tuple[np.ndarray, Windowing]:
+    """
+    Read the first frame of a DICOM file and its display windowing.
+
+    Uncompressed pixel data is not copied: it is memory-mapped when `source`
+    is a path, or viewed in place when it is bytes. Compressed transfer
+    syntaxes are decoded by pydicom's pixel handlers.
+
+    Args:
+        source: File path or raw DICOM bytes
+
+    Returns:
+        Tuple of (stored pixel values, Windowing)
+    """
+    if pydicom is None:
+        raise ImportError("DICOM input requires pydicom (pip install pydicom)")
+
+    fileobj = source if isinstance(source, str) else open_buffer(source)
+    # Large elements (the pixel data) are skipped and only their offsets kept
+    dataset = pydicom.dcmread(fileobj, defer_size=1024)
+    if "PixelData" not in dataset:
+        raise InvalidImageError("DICOM file has no pixel data")
+
+    pixels = _map_pixel_data(dataset, source)
+    if pixels is None:
+        pixels = dataset.pixel_array
+        if int(dataset.get("NumberOfFrames", 1) or 1) > 1:
+            pixels = pixels[0]
+
+    return pixels, _dicom_windowing(dataset)
+
+
+def _map_pixel_data(dataset, source: Union[bytes, str]) -> Optional[np.ndarray]:
+    """Zero-copy view of uncompressed single-sample pixel data, or None."""
+    syntax = str(dataset.file_meta.get("TransferSyntaxUID", ""))
+    bits = int(dataset.get("BitsAllocated", 0))
+    if syntax not in _UNCOMPRESSED_SYNTAXES or bits not in (8, 16) or dataset.get("SamplesPerPixel", 1) != 1:
+        return None
+
+    try:
+        element = dataset.get_item("PixelData", keep_deferred=True)
+    except TypeError:  # pydicom < 2.2
+        element = dataset.get_item("PixelData")
+    offset = getattr(element, "value_tell", None)
+    if offset is None:
+        return None
+
+    byte_order = ">" if syntax == "1.2.840.10008.1.2.2" else "<"
+    kind = "i" if dataset.get("PixelRepresentation", 0) == 1 else "u"
+    dtype = np.dtype(f"{byte_order}{kind}{bits // 8}")
+    shape = (int(dataset.Rows), int(dataset.Columns))
+
+    if isinstance(source, str):
+        return np.memmap(source, dtype=dtype, mode="r", offset=offset, shape=shape)
+    return np.frombuffer(source, dtype=dtype, count=shape[0] * shape[1], offset=offset).reshape(shape)
+
+
+def _first_value(value) -> Optional[float]:
+    """First entry of a possibly multi-valued DICOM number (e.g. several window presets)."""
+    if value is None or value == "":
+        return None
+    if not isinstance(value, (int, float, str)):
+        value = value[0]
+    return float(value)
+
+
+def _dicom_windowing(dataset) -> Windowing:
+    windowing = Windowing(
+        slope=float(dataset.get("RescaleSlope", 1.0) or 1.0),
+        intercept=float(dataset.get("RescaleIntercept", 0.0) or 0.0),
+        center=_first_value(dataset.get("WindowCenter")),
+        width=_first_value(dataset.get("WindowWidth")),
+        bits_stored=dataset.get("BitsStored"),
+        invert=dataset.get("PhotometricInterpretation") == "MONOCHROME1",
+    )
+
+    voi_sequence = dataset.get("VOILUTSequence")
+    if voi_sequence:
+        item = voi_sequence[0]
+        entries, first, bits = (int(v) for v in item.LUTDescriptor)
+        data = item.LUTData
+        if isinstance(data, bytes):
+            data = np.frombuffer(data, dtype=np.uint8 if bits <= 8 else "<u2")
+        windowing.voi_lut = np.asarray(data, dtype=np.float64)[:entries or 65536]
+        windowing.voi_lut_first = first
+        windowing.voi_lut_bits = bits
+
+    return windowing
+
+
+def window_to_uint8(pixels: np.ndarray, windowing: Windowing) -> np.ndarray:
+    """
+    Map single-channel stored values to uint8 display values.
+
+    For 8/16-bit integer data the modality LUT, VOI LUT or window/level and
+    inversion are folded into one lookup table over every possible value,
+    so the image itself is only touched by one indexing pass (plus min/max
+    when no window is given).
+
+    Args:
+        pixels: 2D array of stored values (may be a memory map)
+        windowing: Display mapping
+
+    Returns:
+        2D uint8 array
+    """
+    if pixels.dtype.kind in "iu" and pixels.dtype.itemsize <= 2:
+        if not pixels.dtype.isnative:
+            pixels = pixels.astype(pixels.dtype.newbyteorder("="))
+        stored = _stored_values(pixels.dtype, windowing.bits_stored)
+        data_range = None
+        if windowing.voi_lut is None and (windowing.center is None or not windowing.width):
+            low, high = stored.min(), stored.max()
+            data_range = (max(float(pixels.min()), low), min(float(pixels.max()), high))
+        lut = _display_values(stored, windowing, data_range)
+        # Index the table by raw bit pattern
+        return lut[pixels.view(f"u{pixels.dtype.itemsize}")]
+
+    values = pixels.astype(np.float64)
+    return _display_values(values, windowing, (float(values.min()), float(values.max())))
+
+
+def _stored_values(dtype: np.dtype, bits_stored: Optional[int]) -> np.ndarray:
+    """Numeric value of every raw bit pattern, honouring BitsStored and the sign."""
+    total_bits = 8 * dtype.itemsize
+    bits = min(int(bits_stored or total_bits), total_bits)
+    values = np.arange(1 << total_bits, dtype=np.int64) & ((1 << bits) - 1)
+    if dtype.kind == "i":
+        values = np.where(values >= 1 << (bits - 1), values - (1 << bits), values)
+    return values.astype(np.float64)
+
+
+def _display_values(
+    stored: np.ndarray,
+    windowing: Windowing,
+    data_range: Optional[Tuple[float, float]]
+) -> np.ndarray:
+    values = stored * windowing.slope + windowing.intercept
+
+    if windowing.voi_lut is not None:
+        lut = windowing.voi_lut
+        index = np.clip(values - windowing.voi_lut_first, 0, len(lut) - 1).astype(np.int64)
+        display = lut[index] / float((1 << windowing.voi_lut_bits) - 1)
+    elif windowing.center is not None and windowing.width:
+        # Linear VOI function, DICOM PS3.3 C.11.2.1.2.1
+        width = max(windowing.width, 1.0)
+        display = (values - (windowing.center - 0.5)) / max(width - 1.0, 1.0) + 0.5
+    else:
+        low, high = data_range
+        low, high = sorted((low * windowing.slope + windowing.intercept,
+                            high * windowing.slope + windowing.intercept))
+        display = (values - low) / max(high - low, 1e-6)
+
+    display = np.clip(display, 0.0, 1.0)
+    if windowing.invert:
+        display = 1.0 - display
+    return np.rint(display * 255.0).astype(np.uint8)
@@ -0,0 +1,99 @@
+"""
+Decode-Once Image Pipeline
+Shares a single decoded pixel buffer between enhancement, statistics and the classifier
+"""
+
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .ingest import load_image
+from .preprocessing import enhance_contrast_array, compute_image_stats, resize_to_max_side
+
+
+class ImagePipeline:
+    """
+    Holds one decoded mammogram for the lifetime of a request.
+
+    The upload is decoded exactly once. CLAHE is applied in place on the
+    same buffer, statistics read a cached grayscale view of it, and the
+    classifier builds its input tensor from it directly - no intermediate
+    PNG encode/decode round-trips.
+
+    Uploads are read with load_image (DICOM, 16-bit and ordinary images);
+    large JPEGs can be decoded at reduced scale, and grayscale sources stay
+    single-channel; `source_size` keeps the original (width, height). The
+    scale depends only on what the classifier needs: Grad-CAM overlays that
+    need more resolution get their own decode (see overlay_pixels).
+    """
+
+    def __init__(self, pixels: np.ndarray, source_size: Optional[Tuple[int, int]] = None):
+        self.pixels = pixels
+        self.source_size = source_size or (pixels.shape[1], pixels.shape[0])
+        self._gray: Optional[np.ndarray] = None
+        self._clip_limit: Optional[float] = None
+
+    @classmethod
+    def from_bytes(cls, image_bytes: bytes, min_side: int = 0, min_long_side: int = 0) -> "ImagePipeline":
+        """
+        Decode an upload into a new pipeline.
+
+        Args:
+            image_bytes: Raw upload bytes
+            min_side: Shorter side the consumers need (0 = full resolution)
+            min_long_side: Longer side the consumers need
+        """
+        pixels, source_size = load_image(image_bytes, min_side, min_long_side)
+        return cls(pixels, source_size)
+
+    @property
+    def gray(self) -> np.ndarray:
+        """Grayscale version of the current pixels (computed once)."""
+        if self._gray is None:
+            if self.pixels.ndim == 2:
+                self._gray = self.pixels
+            else:
+                self._gray = cv2.cvtColor(self.pixels, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def enhance_contrast(self, clip_limit: float = 2.0) -> "ImagePipeline":
+        """Apply CLAHE in place."""
+        enhance_contrast_array(self.pixels, clip_limit)
+        self._gray = None
+        self._clip_limit = clip_limit
+        return self
+
+    def overlay_pixels(self, image_bytes: bytes, max_side: Optional[int] = None) -> np.ndarray:
+        """
+        Pixels for a Grad-CAM overlay whose longest side is `max_side` (0/None = original size).
+
+        The current pixels are downscaled when they are large enough;
+        otherwise the upload is decoded again at the overlay's scale, with the
+        same contrast enhancement. Either way the classifier input is unchanged.
+        """
+        height, width = self.pixels.shape[:2]
+        if (width, height) == self.source_size or (max_side and max(height, width) >= max_side):
+            return resize_to_max_side(self.pixels, max_side)
+
+        if max_side:
+            pixels, _ = load_image(image_bytes, 1, max_side)
+        else:
+            pixels, _ = load_image(image_bytes)
+        if self._clip_limit is not None:
+            enhance_contrast_array(pixels, self._clip_limit)
+        return resize_to_max_side(pixels, max_side)
+
+    def stats(self) -> dict:
+        """
+        Image statistics of the current pixels, with the original dimensions.
+
+        `width`/`height` are the upload's stored (unrotated) size. The
+        intensity statistics are measured on the pixels actually decoded,
+        which for large JPEGs is a 1/2-1/8 scale decode; `analysis_width`/
+        `analysis_height` report that size so clients can tell.
+        """
+        stats = compute_image_stats(self.gray)
+        stats["analysis_width"], stats["analysis_height"] = stats["width"], stats["height"]
+        stats["width"], stats["height"] = self.source_size
+        return stats
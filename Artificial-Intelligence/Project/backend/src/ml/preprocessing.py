@@ -6,8 +6,9 @@ Handles resizing, normalization, contrast enhancement, and noise removal
 import numpy as np
 from PIL import Image
 import cv2
-from typing import Tuple, Optional
+from typing import BinaryIO, Tuple, Optional
 import io
+import mmap
 
 
 def preprocess_image(
@@ -51,31 +52,173 @@ def preprocess_image(
     return img_array
 
 
-def enhance_contrast(image_bytes: bytes, clip_limit: float = 2.0) -> bytes:
+class InvalidImageError(ValueError):
+    """Upload data that is empty or cannot be decoded as an image."""
+
+
+def open_buffer(image_bytes) -> BinaryIO:
     """
-    Apply CLAHE (Contrast Limited Adaptive Histogram Equalization) 
-    to enhance mammogram contrast.
+    File-like view of image data for header parsers (PIL, pydicom).
+    
+    Memory-mapped uploads are already file-like and are rewound and used
+    directly rather than copied into a BytesIO.
+    """
+    if isinstance(image_bytes, mmap.mmap):
+        image_bytes.seek(0)
+        return image_bytes
+    return io.BytesIO(image_bytes)
+
+
+# cv2.imdecode rotates JPEGs by their EXIF Orientation tag; PIL (and so the
+# training pipeline) does not, so the classifier path decodes without rotating
+IGNORE_ORIENTATION = cv2.IMREAD_IGNORE_ORIENTATION
+
+
+def decode_image(image_bytes: bytes) -> np.ndarray:
+    """
+    Decode raw image bytes into a BGR pixel array, ignoring EXIF orientation.
     
     Args:
-        image_bytes: Raw image bytes
-        clip_limit: Threshold for contrast limiting
+        image_bytes: Raw image bytes (any buffer-protocol object)
     
     Returns:
-        Enhanced image as bytes
+        Decoded image as uint8 array of shape (height, width, 3)
     """
-    # Decode image
     nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR | IGNORE_ORIENTATION)
+    if img is None:
+        raise InvalidImageError("Could not decode image")
+    return img
+
+
+# OpenCV decodes JPEGs at 1/2, 1/4 or 1/8 scale via libjpeg DCT scaling
+_REDUCED_COLOR = {
+    2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8
+}
+_REDUCED_GRAYSCALE = {
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8
+}
+_GRAYSCALE_MODES = ("1", "L", "I", "I;16", "I;16B", "I;16L", "F")
+
+
+def reduction_factor(width: int, height: int, min_side: int = 0, min_long_side: int = 0) -> int:
+    """
+    Largest downscale factor (8, 4, 2 or 1) that keeps the image at least
+    `min_side` on its shorter side and `min_long_side` on its longer side.
+    
+    A `min_side` of 0 means the full resolution is needed.
+    """
+    if not min_side:
+        return 1
+    short_side, long_side = sorted((width, height))
+    for factor in (8, 4, 2):
+        if short_side / factor >= min_side and long_side / factor >= min_long_side:
+            return factor
+    return 1
+
+
+def decode_image_reduced(
+    image_bytes: bytes,
+    min_side: int = 0,
+    min_long_side: int = 0
+) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Decode an image at the smallest scale that still covers the target size.
+    
+    JPEGs are decoded directly at 1/2, 1/4 or 1/8 scale, so the full-resolution
+    buffer is never allocated; other formats are decoded at full size.
+    Grayscale sources are returned single-channel. Like decode_image, the
+    EXIF orientation is ignored, matching how PIL loads training images.
+    
+    Args:
+        image_bytes: Raw image bytes (any buffer-protocol object)
+        min_side: Minimum shorter side of the result (0 = full resolution)
+        min_long_side: Minimum longer side of the result
+    
+    Returns:
+        Tuple of (BGR or grayscale uint8 array, original (width, height))
+    """
+    try:
+        with Image.open(open_buffer(image_bytes)) as probe:
+            (width, height), mode, image_format = probe.size, probe.mode, probe.format
+    except Exception:
+        # Let OpenCV try formats PIL cannot identify
+        img = decode_image(image_bytes)
+        return img, (img.shape[1], img.shape[0])
+    
+    grayscale = mode in _GRAYSCALE_MODES
+    factor = reduction_factor(width, height, min_side, min_long_side) if image_format == "JPEG" else 1
+    
+    if factor > 1:
+        flag = (_REDUCED_GRAYSCALE if grayscale else _REDUCED_COLOR)[factor]
+    else:
+        flag = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag | IGNORE_ORIENTATION)
+    if img is None:
+        raise InvalidImageError("Could not decode image")
+    return img, (width, height)
+
+
+def resize_to_max_side(img: np.ndarray, max_side: Optional[int]) -> np.ndarray:
+    """
+    Downscale an image so its longest side is at most `max_side` pixels.
+    
+    Args:
+        img: Decoded image
+        max_side: Size limit in pixels; None or 0 keeps the original size
+    
+    Returns:
+        The resized image, or `img` itself if it already fits
+    """
+    height, width = img.shape[:2]
+    if not max_side or max(height, width) <= max_side:
+        return img
+    scale = max_side / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+def enhance_contrast_array(img: np.ndarray, clip_limit: float = 2.0) -> np.ndarray:
+    """
+    Apply CLAHE to a decoded BGR or grayscale image, writing the result back into `img`.
+    
+    Args:
+        img: Decoded BGR or single-channel image
+        clip_limit: Threshold for contrast limiting
+    
+    Returns:
+        The same array, enhanced in place
+    """
+    clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(8, 8))
+    if img.ndim == 2:
+        img[...] = clahe.apply(img)
+        return img
     
     # Convert to LAB color space
     lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
     
     # Apply CLAHE to L channel
-    clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(8, 8))
     lab[:, :, 0] = clahe.apply(lab[:, :, 0])
     
-    # Convert back to BGR
-    enhanced = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+    # Convert back to BGR into the original buffer
+    cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=img)
+    return img
+
+
+def enhance_contrast(image_bytes: bytes, clip_limit: float = 2.0) -> bytes:
+    """
+    Apply CLAHE (Contrast Limited Adaptive Histogram Equalization) 
+    to enhance mammogram contrast.
+    
+    Args:
+        image_bytes: Raw image bytes
+        clip_limit: Threshold for contrast limiting
+    
+    Returns:
+        Enhanced image as bytes
+    """
+    enhanced = enhance_contrast_array(decode_image(image_bytes), clip_limit)
     
     # Encode back to bytes
     _, buffer = cv2.imencode('.png', enhanced)
@@ -116,13 +259,28 @@ def get_image_stats(image_bytes: bytes) -> dict:
     nparr = np.frombuffer(image_bytes, np.uint8)
     img = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
     
+    return compute_image_stats(img)
+
+
+def compute_image_stats(img: np.ndarray) -> dict:
+    """
+    Calculate basic image statistics from a decoded grayscale image.
+    
+    Args:
+        img: Grayscale image array
+    
+    Returns:
+        Dictionary with image statistics
+    """
+    min_intensity, max_intensity = int(img.min()), int(img.max())
+    mean, std = cv2.meanStdDev(img)
+    
     return {
-        "mean_intensity": float(np.mean(img)),
-        "std_intensity": float(np.std(img)),
-        "min_intensity": int(np.min(img)),
-        "max_intensity": int(np.max(img)),
-        "contrast_ratio": float(np.max(img) - np.min(img)) / 255.0,
+        "mean_intensity": float(mean[0, 0]),
+        "std_intensity": float(std[0, 0]),
+        "min_intensity": min_intensity,
+        "max_intensity": max_intensity,
+        "contrast_ratio": float(max_intensity - min_intensity) / 255.0,
         "width": img.shape[1],
         "height": img.shape[0]
     }
-
@@ -0,0 +1,62 @@
+"""
+INT8 Quantization for CPU Inference
+Static post-training quantization of the ResNet50 backbone plus dynamic quantization of the fc head
+"""
+
+from typing import Iterable, Optional
+
+import torch
+import torch.nn as nn
+from torch.ao.quantization import QConfigMapping, get_default_qconfig, default_dynamic_qconfig
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+
+def default_engine() -> str:
+    """Best available quantized kernel library (x86/fbgemm on Intel/AMD, qnnpack on ARM)."""
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            return engine
+    raise RuntimeError("No quantized engine available in this PyTorch build")
+
+
+def quantize_model(
+    model: nn.Module,
+    calibration_batches: Iterable[torch.Tensor],
+    engine: Optional[str] = None
+) -> nn.Module:
+    """
+    Quantize a trained TransferLearningCNN to INT8.
+
+    The convolutional backbone gets static quantization: observers are
+    inserted, the calibration batches are run through to record activation
+    ranges, and conv/bn/relu are fused into int8 kernels. The fc head
+    (Linear layers on a single pooled vector) gets dynamic quantization,
+    where weights are int8 and activations are quantized on the fly.
+
+    Args:
+        model: Float model in eval mode, on CPU
+        calibration_batches: Preprocessed (N, 3, 224, 224) tensors
+        engine: Quantized backend ("x86", "fbgemm", "qnnpack"); auto-detected if None
+
+    Returns:
+        Quantized GraphModule
+    """
+    engine = engine or default_engine()
+    torch.backends.quantized.engine = engine
+
+    qconfig_mapping = (
+        QConfigMapping()
+        .set_global(get_default_qconfig(engine))
+        .set_module_name("backbone.fc", default_dynamic_qconfig)
+    )
+
+    model = model.cpu().eval()
+    example = torch.zeros(1, 3, 224, 224)
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs=(example,))
+
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+
+    return convert_fx(prepared)
@@ -0,0 +1,46 @@
+"""
+Shared fixtures: a randomly initialized checkpoint (no ImageNet download)
+and synthetic mammogram-like images.
+"""
+
+import io
+
+import cv2
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from src.ml.cnn_classifier import BreastTumorClassifier, TransferLearningCNN
+
+
+@pytest.fixture(scope="session")
+def checkpoint(tmp_path_factory) -> str:
+    torch.manual_seed(0)
+    path = tmp_path_factory.mktemp("models") / "best_model.pth"
+    torch.save(TransferLearningCNN(num_classes=2, pretrained=False).state_dict(), path)
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def classifier(checkpoint) -> BreastTumorClassifier:
+    return BreastTumorClassifier(model_path=checkpoint, device="cpu")
+
+
+def make_image(height: int, width: int, ext: str = ".png", gray: bool = False, seed: int = 0) -> bytes:
+    """Smooth random image encoded as `ext`."""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (height, width) if gray else (height, width, 3), dtype=np.uint8)
+    pixels = cv2.GaussianBlur(pixels, (15, 15), 5)
+    return cv2.imencode(ext, pixels)[1].tobytes()
+
+
+def make_rotated_jpeg(height: int, width: int, orientation: int = 6, gray: bool = False, seed: int = 0) -> bytes:
+    """JPEG whose EXIF Orientation tag asks viewers to rotate it."""
+    pixels = cv2.imdecode(np.frombuffer(make_image(height, width, ".png", gray, seed), np.uint8), cv2.IMREAD_UNCHANGED)
+    image = Image.fromarray(pixels if gray else pixels[..., ::-1])
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=95, exif=exif)
+    return buffer.getvalue()
@@ -0,0 +1,126 @@
+"""Admission control: shedding with Retry-After, and slot accounting after deadlines."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from src.api.admission import AdmissionController
+from src.api.executor import run_preprocess
+
+
+def controller(**overrides) -> AdmissionController:
+    options = dict(max_in_flight=1, max_queue=1, queue_timeout=5.0, deadline=5.0)
+    options.update(overrides)
+    return AdmissionController("test", **options)
+
+
+async def sleep_in_thread(seconds: float, running: threading.Event = None):
+    def work():
+        if running is not None:
+            running.set()
+        time.sleep(seconds)
+        if running is not None:
+            running.clear()
+    await run_preprocess(work)
+    return seconds
+
+
+def test_full_queue_returns_429_with_retry_after():
+    async def scenario():
+        budget = controller(max_queue=1)
+        first = asyncio.ensure_future(budget.run(sleep_in_thread, 0.2))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(budget.run(sleep_in_thread, 0.2))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as rejected:
+            await budget.run(sleep_in_thread, 0.2)
+        assert await first == await second == 0.2
+        return budget, rejected.value
+
+    budget, rejected = asyncio.run(scenario())
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert budget.shed["queue_full"] == 1
+    assert budget.in_flight == 0
+
+
+def test_queue_timeout_returns_503_with_retry_after():
+    async def scenario():
+        budget = controller(queue_timeout=0.05)
+        first = asyncio.ensure_future(budget.run(sleep_in_thread, 0.3))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as rejected:
+            await budget.run(sleep_in_thread, 0.1)
+        await first
+        return budget, rejected.value
+
+    budget, rejected = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert "Retry-After" in rejected.headers
+    assert budget.shed["queue_timeout"] == 1
+    assert budget.stats()["queued"] == 0
+
+
+def test_expected_wait_is_rejected_up_front():
+    async def scenario():
+        budget = controller(queue_timeout=0.1)
+        await budget.run(sleep_in_thread, 0.3)  # seeds the service time
+        first = asyncio.ensure_future(budget.run(sleep_in_thread, 0.3))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as rejected:
+            await budget.run(sleep_in_thread, 0.1)
+        await first
+        return budget, rejected.value
+
+    budget, rejected = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert budget.shed["expected_wait"] == 1
+
+
+def test_deadline_keeps_the_slot_until_the_work_stops():
+    running = threading.Event()
+
+    async def scenario():
+        budget = controller(max_queue=0, deadline=0.05)
+        with pytest.raises(HTTPException) as timed_out:
+            await budget.run(sleep_in_thread, 0.4, running)
+        assert timed_out.value.status_code == 503
+        assert "Retry-After" in timed_out.value.headers
+
+        # The thread is still sleeping, so the slot is still taken
+        assert running.is_set()
+        assert budget.in_flight == 1
+        with pytest.raises(HTTPException) as shed:
+            await budget.run(sleep_in_thread, 0.01)
+        assert shed.value.status_code == 429
+
+        while budget.in_flight:
+            await asyncio.sleep(0.01)
+        assert not running.is_set()
+        assert await budget.run(sleep_in_thread, 0.01) == 0.01
+        return budget
+
+    budget = asyncio.run(scenario())
+    assert budget.shed == {"deadline": 1, "queue_full": 1}
+    assert budget.in_flight == 0
+
+
+def test_abandoned_request_does_not_start_its_next_stage():
+    stages = []
+
+    async def two_stages():
+        await run_preprocess(time.sleep, 0.2)
+        stages.append("second")
+
+    async def scenario():
+        budget = controller(deadline=0.05)
+        with pytest.raises(HTTPException):
+            await budget.run(two_stages)
+        while budget.in_flight:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert stages == []
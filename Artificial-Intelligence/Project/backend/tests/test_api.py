@@ -0,0 +1,187 @@
+"""End-to-end checks of the diagnosis routes on a random-weight model."""
+
+import asyncio
+import dataclasses
+import os
+import time
+
+import pytest
+import torch
+from fastapi.testclient import TestClient
+
+from src.config import get_settings
+from src.api.cache import cache_key
+
+from conftest import make_image, make_rotated_jpeg
+
+
+@pytest.fixture(scope="module")
+def api(classifier, tmp_path_factory):
+    os.environ["JOBS_DIR"] = str(tmp_path_factory.mktemp("jobs"))
+    get_settings.cache_clear()
+    import main
+    from src.api import routes
+
+    routes.classifier = classifier
+    with TestClient(main.app) as client:
+        for _ in range(600):
+            if client.get("/api/ready").status_code == 200:
+                break
+            time.sleep(0.05)
+        yield client, routes
+
+
+def clear_caches(routes):
+    routes.get_prediction_cache().clear()
+    routes.get_gradcam_cache().clear()
+
+
+def diagnose(client, image_bytes: bytes, **data) -> dict:
+    response = client.post(
+        "/api/diagnose", files={"image": ("a.jpg", image_bytes, "image/jpeg")}, data=data
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_explain_returns_the_same_prediction(api):
+    client, routes = api
+    # Large enough to be decoded at reduced scale
+    image_bytes = make_image(2400, 1800, ext=".jpg")
+
+    clear_caches(routes)
+    plain = diagnose(client, image_bytes)
+    clear_caches(routes)
+    explained = diagnose(client, image_bytes, explain="true")
+
+    assert "gradcam" in explained
+    assert explained["ml_prediction"]["probabilities"] == pytest.approx(
+        plain["ml_prediction"]["probabilities"], abs=1e-6
+    )
+    assert explained["image_stats"] == plain["image_stats"]
+
+
+def test_explain_keeps_the_cached_prediction(api):
+    client, routes = api
+    image_bytes = make_image(900, 700, ext=".jpg", seed=1)
+
+    clear_caches(routes)
+    plain = diagnose(client, image_bytes)
+    cached = routes.get_prediction_cache().get(cache_key(image_bytes, enhance=False))
+    explained = diagnose(client, image_bytes, explain="true")
+
+    assert routes.get_prediction_cache().get(cache_key(image_bytes, enhance=False)) is cached
+    assert explained["ml_prediction"] == plain["ml_prediction"]
+
+
+class DriftingBackend:
+    """Stands in for a quantized/ONNX runtime whose logits differ from eager."""
+
+    name = "quantized"
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, batch):
+        with torch.inference_mode():
+            logits = self.model(batch)
+        return logits * 0.5 + torch.tensor([0.3, -0.3])
+
+
+@pytest.fixture
+def drifting_backend(api, monkeypatch):
+    _, routes = api
+    classifier = routes.get_classifier()
+    monkeypatch.setattr(classifier, "backend", DriftingBackend(classifier.model))
+    clear_caches(routes)
+    yield
+    clear_caches(routes)
+
+
+def test_explain_reports_the_backend_prediction(api, drifting_backend):
+    client, routes = api
+    image_bytes = make_image(900, 700, ext=".jpg", seed=2)
+
+    # Explain first: it seeds the prediction cache that plain requests read
+    explained = diagnose(client, image_bytes, explain="true")
+    plain = diagnose(client, image_bytes)
+    clear_caches(routes)
+    uncached = diagnose(client, image_bytes)
+    gradcam = client.post("/api/gradcam", files={"image": ("a.jpg", image_bytes, "image/jpeg")})
+
+    expected = uncached["ml_prediction"]["probabilities"]
+    assert explained["ml_prediction"]["probabilities"] == pytest.approx(expected, abs=1e-6)
+    assert plain["ml_prediction"]["probabilities"] == pytest.approx(expected, abs=1e-6)
+    assert gradcam.json()["prediction"]["probabilities"] == pytest.approx(expected, abs=1e-6)
+
+
+def test_image_stats_report_source_and_analysis_size(api):
+    client, routes = api
+    clear_caches(routes)
+    # EXIF Orientation=6 must not swap the reported dimensions
+    stats = diagnose(client, make_rotated_jpeg(2400, 1800, orientation=6))["image_stats"]
+
+    assert (stats["width"], stats["height"]) == (1800, 2400)
+    assert stats["analysis_width"] < stats["width"]
+    assert stats["analysis_width"] / stats["analysis_height"] == pytest.approx(1800 / 2400)
+
+
+def test_failed_model_load_returns_503(api):
+    client, routes = api
+    previous = dict(routes.model_status)
+    routes.model_status.update(state="failed", error="checkpoint not found")
+    try:
+        response = client.post(
+            "/api/diagnose", files={"image": ("a.png", make_image(300, 250), "image/png")}
+        )
+    finally:
+        routes.model_status.update(previous)
+    assert response.status_code == 503
+    assert "failed to load" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("path", ["/api/diagnose", "/api/gradcam"])
+@pytest.mark.parametrize("content", [b"", b"not an image", make_image(300, 250, ext=".jpg")[:200]])
+def test_undecodable_upload_returns_400(api, path, content):
+    client, _ = api
+    response = client.post(path, files={"image": ("a.jpg", content, "image/jpeg")})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid image"
+
+
+def test_single_image_jobs_keep_the_single_upload_limit(api, monkeypatch):
+    client, routes = api
+    # About 30 KB, over a 0.01 MB single-upload limit but far under the batch limit
+    image_bytes = make_image(200, 200)
+    settings = dataclasses.replace(get_settings(), max_upload_mb=0.01)
+    monkeypatch.setattr(routes, "get_settings", lambda: settings)
+    files = {"image": ("a.png", image_bytes, "image/png")}
+
+    for kind in ("diagnose", "gradcam"):
+        response = client.post("/api/jobs", data={"kind": kind}, files=files)
+        assert response.status_code == 413, response.text
+
+    response = client.post("/api/jobs", data={"kind": "batch"}, files={"images": ("a.png", image_bytes, "image/png")})
+    assert response.status_code == 202, response.text
+
+
+def test_streaming_requests_are_timed_to_their_last_chunk(api):
+    client, _ = api
+    import main
+    from fastapi.responses import StreamingResponse
+    from src.metrics import IN_FLIGHT, REQUEST_SECONDS
+
+    async def chunks():
+        for _ in range(3):
+            await asyncio.sleep(0.1)
+            yield b"{}\n"
+
+    path = "/test/slow-stream"
+    main.app.add_api_route(path, lambda: StreamingResponse(chunks()), methods=["GET"])
+    response = client.get(path)
+    assert response.content == b"{}\n" * 3
+
+    state = REQUEST_SECONDS._values[(path,)]
+    assert state["count"] == 1
+    assert state["sum"] >= 0.3
+    assert IN_FLIGHT._values[(path,)] == 0
@@ -0,0 +1,124 @@
+"""Micro-batching: coalescing concurrent requests and dropping abandoned ones."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+import torch
+
+from src.ml.batching import BatchingEngine
+
+
+class RecordingClassifier:
+    """Echoes each input's id and records the batches it was given."""
+
+    def __init__(self, delay: float = 0.0, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.batches = []
+        self.running = threading.Event()
+
+    def predict_batch(self, input_tensors):
+        self.running.set()
+        self.batches.append([int(tensor[0]) for tensor in input_tensors])
+        time.sleep(self.delay)
+        self.running.clear()
+        if self.error is not None:
+            raise self.error
+        return [{"id": int(tensor[0])} for tensor in input_tensors]
+
+
+def image(index: int) -> torch.Tensor:
+    return torch.full((3,), float(index))
+
+
+def run(engine: BatchingEngine, scenario):
+    """Run `scenario()` on a fresh event loop, then stop the engine's batching task."""
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await engine.stop()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_one_forward_pass():
+    classifier = RecordingClassifier()
+    engine = BatchingEngine(classifier, max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        return await asyncio.gather(*(engine.predict(image(i)) for i in range(5)))
+
+    results = run(engine, scenario)
+    assert [result["id"] for result in results] == [0, 1, 2, 3, 4]
+    assert classifier.batches == [[0, 1, 2, 3, 4]]
+
+
+def test_batches_are_capped_at_max_batch_size():
+    classifier = RecordingClassifier()
+    engine = BatchingEngine(classifier, max_batch_size=4, max_wait_ms=50)
+
+    async def scenario():
+        return await asyncio.gather(*(engine.predict(image(i)) for i in range(10)))
+
+    results = run(engine, scenario)
+    assert [result["id"] for result in results] == list(range(10))
+    assert [len(batch) for batch in classifier.batches] == [4, 4, 2]
+
+
+def test_lone_request_waits_at_most_max_wait():
+    engine = BatchingEngine(RecordingClassifier(), max_batch_size=8, max_wait_ms=20)
+
+    async def scenario():
+        start = time.perf_counter()
+        await engine.predict(image(0))
+        return time.perf_counter() - start
+
+    assert run(engine, scenario) < 0.5
+
+
+def test_cancelled_requests_are_dropped_from_their_batch():
+    classifier = RecordingClassifier()
+    engine = BatchingEngine(classifier, max_batch_size=8, max_wait_ms=100)
+
+    async def scenario():
+        kept = asyncio.ensure_future(engine.predict(image(0)))
+        dropped = asyncio.ensure_future(engine.predict(image(1)))
+        await asyncio.sleep(0.01)
+        dropped.cancel()
+        result = await kept
+        with pytest.raises(asyncio.CancelledError):
+            await dropped
+        return result
+
+    assert run(engine, scenario) == {"id": 0}
+    assert classifier.batches == [[0]]
+
+
+def test_cancelling_a_dispatched_request_waits_for_its_forward_pass():
+    classifier = RecordingClassifier(delay=0.3)
+    engine = BatchingEngine(classifier, max_batch_size=8, max_wait_ms=0)
+
+    async def scenario():
+        request = asyncio.ensure_future(engine.predict(image(0)))
+        while not classifier.running.is_set():
+            await asyncio.sleep(0.005)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        # The forward pass could not be interrupted; it has ended by now
+        return classifier.running.is_set()
+
+    assert run(engine, scenario) is False
+
+
+def test_forward_pass_errors_reach_every_caller():
+    engine = BatchingEngine(RecordingClassifier(error=RuntimeError("out of memory")), max_wait_ms=20)
+
+    async def scenario():
+        return await asyncio.gather(*(engine.predict(image(i)) for i in range(3)), return_exceptions=True)
+
+    results = run(engine, scenario)
+    assert all(isinstance(result, RuntimeError) for result in results)
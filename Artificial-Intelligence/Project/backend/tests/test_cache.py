@@ -0,0 +1,76 @@
+"""Result cache: keys, LRU order, time-to-live and the memory cap."""
+
+import numpy as np
+
+from src.api import cache as cache_module
+from src.api.cache import ResultCache, cache_key, derive_key
+
+
+def test_keys_depend_on_content_and_flags():
+    assert cache_key(b"image") == cache_key(bytearray(b"image"))
+    assert cache_key(b"image") != cache_key(b"other")
+    assert cache_key(b"image", enhance=True) != cache_key(b"image", enhance=False)
+    assert derive_key(cache_key(b"image"), enhance=True) == cache_key(b"image", enhance=True)
+    assert derive_key("key", b=1, a=2) == derive_key("key", a=2, b=1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = ResultCache(ttl_seconds=60)
+    cache.put("a", 1)
+
+    now[0] += 59
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_byte_cap_evicts_oldest_and_skips_oversized_values():
+    array = np.zeros(1000, dtype=np.uint8)
+    cache = ResultCache(max_entries=100, max_bytes=2500)
+    for key in "abc":
+        cache.put(key, array)
+
+    assert cache.get("a") is None
+    assert cache.get("b") is not None and cache.get("c") is not None
+    assert cache.stats()["bytes"] == 2000
+
+    cache.put("big", np.zeros(3000, dtype=np.uint8))
+    assert cache.get("big") is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_replacing_an_entry_updates_its_size():
+    cache = ResultCache(max_bytes=10_000)
+    cache.put("a", np.zeros(1000, dtype=np.uint8))
+    cache.put("a", np.zeros(500, dtype=np.uint8))
+    assert cache.stats()["bytes"] == 500
+
+
+def test_zero_entries_disables_caching_and_counters_survive_clear():
+    disabled = ResultCache(max_entries=0)
+    disabled.put("a", 1)
+    assert disabled.get("a") is None
+
+    cache = ResultCache()
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("missing")
+    cache.clear()
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["hits"], stats["misses"]) == (0, 0, 1, 1)
+    assert stats["hit_rate"] == 0.5
@@ -0,0 +1,107 @@
+"""Training checkpoints: atomic writes, background saving and exact resumption."""
+
+import os
+import random
+
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+
+from src.ml import checkpoint as checkpoint_module
+from src.ml.checkpoint import AsyncCheckpointer, atomic_save, load_checkpoint, rng_state, set_rng_state
+
+
+def test_interrupted_write_keeps_the_previous_checkpoint(tmp_path, monkeypatch):
+    path = str(tmp_path / "last_checkpoint.pth")
+    atomic_save({"epoch": 1}, path)
+
+    def crash_midway(obj, f):
+        f.write(b"partial")
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(checkpoint_module.torch, "save", crash_midway)
+    with pytest.raises(KeyboardInterrupt):
+        atomic_save({"epoch": 2}, path)
+
+    monkeypatch.undo()
+    assert load_checkpoint(path) == {"epoch": 1}
+    assert os.listdir(tmp_path) == ["last_checkpoint.pth"]
+
+
+def test_async_saves_snapshot_the_state_when_called(tmp_path):
+    weights = torch.zeros(4)
+    checkpointer = AsyncCheckpointer(max_pending=1)
+    paths = [str(tmp_path / f"epoch_{epoch}.pth") for epoch in range(3)]
+    for epoch, path in enumerate(paths):
+        weights.fill_(epoch)
+        checkpointer.save({"epoch": epoch, "weights": weights}, path)
+        weights.fill_(-1)  # the next optimizer step must not leak into the file
+    checkpointer.close()
+
+    for epoch, path in enumerate(paths):
+        state = load_checkpoint(path)
+        assert state["epoch"] == epoch
+        assert torch.equal(state["weights"], torch.full((4,), float(epoch)))
+
+
+def test_async_write_errors_are_raised_on_wait(tmp_path):
+    checkpointer = AsyncCheckpointer()
+    checkpointer.save({"epoch": 1}, str(tmp_path / "missing" / "checkpoint.pth"))
+    with pytest.raises(OSError):
+        checkpointer.wait()
+    checkpointer.close()
+
+
+def train_steps(model, optimizer, steps: int):
+    """A few SGD steps on random data, drawing from every RNG train.py uses."""
+    draws = []
+    for _ in range(steps):
+        inputs = torch.randn(8, 4)
+        targets = torch.randint(0, 2, (8,))
+        draws.append((random.random(), float(np.random.rand())))
+        optimizer.zero_grad()
+        nn.functional.cross_entropy(model(inputs), targets).backward()
+        optimizer.step()
+    return draws
+
+
+def make_model():
+    model = nn.Sequential(nn.Linear(4, 8), nn.ReLU(), nn.Dropout(0.5), nn.Linear(8, 2))
+    optimizer = torch.optim.AdamW(model.parameters(), lr=1e-2)
+    return model, optimizer
+
+
+def test_resume_restores_rng_and_optimizer_state(tmp_path):
+    path = str(tmp_path / "last_checkpoint.pth")
+    torch.manual_seed(0)
+    random.seed(0)
+    np.random.seed(0)
+    model, optimizer = make_model()
+    train_steps(model, optimizer, 3)
+
+    checkpointer = AsyncCheckpointer()
+    checkpointer.save({
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "rng": rng_state(),
+    }, path)
+    checkpointer.close()
+
+    # The uninterrupted run
+    expected_draws = train_steps(model, optimizer, 3)
+    expected = {name: tensor.clone() for name, tensor in model.state_dict().items()}
+
+    # A fresh process resuming from the checkpoint
+    torch.manual_seed(123)
+    random.seed(123)
+    np.random.seed(123)
+    resumed, resumed_optimizer = make_model()
+    state = load_checkpoint(path)
+    resumed.load_state_dict(state["model"])
+    resumed_optimizer.load_state_dict(state["optimizer"])
+    set_rng_state(state["rng"])
+
+    assert train_steps(resumed, resumed_optimizer, 3) == expected_draws
+    for name, tensor in resumed.state_dict().items():
+        torch.testing.assert_close(tensor, expected[name], atol=0, rtol=0)
@@ -0,0 +1,110 @@
+"""Dataset manifest: ImageFolder order, reuse when unchanged, invalidation on file changes."""
+
+import json
+import os
+
+import pytest
+from torchvision.datasets import ImageFolder
+
+from src.ml import dataset_index
+from src.ml.dataset_cache import fingerprint
+from src.ml.dataset_index import DatasetIndex, update_index
+
+from conftest import make_image
+
+
+@pytest.fixture
+def split(tmp_path):
+    root = tmp_path / "train"
+    for label, name in enumerate(("benign", "malignant")):
+        (root / name).mkdir(parents=True)
+        for i in range(3):
+            (root / name / f"case_{i}.png").write_bytes(make_image(40, 30, seed=10 * label + i))
+    return root
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """Relative paths of the files hashed by each scan."""
+    calls = []
+    hash_file = dataset_index.hash_file
+
+    def counting(path, *args, **kwargs):
+        calls.append(os.path.basename(os.path.dirname(path)) + "/" + os.path.basename(path))
+        return hash_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(dataset_index, "hash_file", counting)
+    return calls
+
+
+def test_index_matches_image_folder(split):
+    index = DatasetIndex.scan(str(split))
+    folder = ImageFolder(str(split))
+
+    assert index.classes == folder.classes
+    assert index.samples == folder.samples
+    assert index.targets.tolist() == folder.targets
+    assert index.class_counts().tolist() == [3, 3]
+    # The same fingerprint the dataset cache computes
+    assert index.fingerprint == fingerprint(folder.samples)
+
+
+def test_unchanged_split_reuses_the_manifest(split, tmp_path, hashed):
+    manifest = str(tmp_path / "manifest.json")
+    index, changes = update_index(str(split), manifest)
+    assert len(changes["added"]) == 6 and len(hashed) == 6
+    saved_at = os.stat(manifest).st_mtime_ns
+
+    hashed.clear()
+    again, changes = update_index(str(split), manifest)
+    assert changes == {"added": [], "removed": [], "modified": []}
+    assert hashed == []
+    assert again.fingerprint == index.fingerprint
+    assert os.stat(manifest).st_mtime_ns == saved_at  # not rewritten
+
+
+def test_changed_files_are_rehashed_and_reported(split, tmp_path, hashed):
+    manifest = str(tmp_path / "manifest.json")
+    index, _ = update_index(str(split), manifest)
+
+    (split / "benign" / "case_0.png").write_bytes(make_image(40, 30, seed=99))
+    os.remove(split / "malignant" / "case_2.png")
+    (split / "malignant" / "case_3.png").write_bytes(make_image(40, 30, seed=98))
+
+    hashed.clear()
+    updated, changes = update_index(str(split), manifest)
+    assert changes == {
+        "added": ["malignant/case_3.png"],
+        "removed": ["malignant/case_2.png"],
+        "modified": ["benign/case_0.png"],
+    }
+    assert sorted(hashed) == ["benign/case_0.png", "malignant/case_3.png"]
+    assert updated.fingerprint != index.fingerprint
+    assert DatasetIndex.load(manifest).fingerprint == updated.fingerprint
+
+
+def test_touched_file_is_rehashed_but_not_modified(split, tmp_path, hashed):
+    manifest = str(tmp_path / "manifest.json")
+    update_index(str(split), manifest)
+    path = split / "benign" / "case_1.png"
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    hashed.clear()
+    _, changes = update_index(str(split), manifest)
+    assert hashed == ["benign/case_1.png"]
+    assert changes["modified"] == []
+
+
+def test_manifest_from_another_version_is_ignored(split, tmp_path):
+    manifest = str(tmp_path / "manifest.json")
+    update_index(str(split), manifest)
+    with open(manifest) as f:
+        data = json.load(f)
+    data["version"] = dataset_index.MANIFEST_VERSION - 1
+    with open(manifest, "w") as f:
+        json.dump(data, f)
+
+    assert DatasetIndex.load(manifest) is None
+    _, changes = update_index(str(split), manifest)
+    assert len(changes["added"]) == 6
@@ -0,0 +1,89 @@
+"""Evaluation metrics and checkpoint loading for evaluate.py."""
+
+import pytest
+import torch
+
+from src.ml.evaluation import EvaluationAccumulator, calibration, roc_auc
+
+
+def brute_force_auc(scores, positives) -> float:
+    """P(score of a positive > score of a negative), ties counting one half."""
+    pos = [s for s, p in zip(scores, positives) if p]
+    neg = [s for s, p in zip(scores, positives) if not p]
+    wins = sum((a > b) + 0.5 * (a == b) for a in pos for b in neg)
+    return wins / (len(pos) * len(neg))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_roc_auc_matches_mann_whitney_with_ties(seed):
+    generator = torch.Generator().manual_seed(seed)
+    # Few distinct values, so many scores are tied
+    scores = torch.randint(0, 6, (200,), generator=generator).float() / 5
+    positives = torch.rand(200, generator=generator) < scores * 0.6 + 0.2
+    expected = brute_force_auc(scores.tolist(), positives.tolist())
+    assert roc_auc(scores, positives) == pytest.approx(expected, abs=1e-12)
+
+
+def test_roc_auc_edge_cases():
+    assert roc_auc(torch.tensor([0.1, 0.4, 0.35, 0.8]), torch.tensor([0, 0, 1, 1])) == pytest.approx(0.75)
+    assert roc_auc(torch.tensor([0.1, 0.2, 0.9]), torch.tensor([0, 0, 1])) == 1.0
+    assert roc_auc(torch.tensor([0.9, 0.2, 0.1]), torch.tensor([0, 0, 1])) == 0.0
+    assert roc_auc(torch.full((4,), 0.5), torch.tensor([0, 1, 0, 1])) == 0.5
+    # Only one class present
+    assert roc_auc(torch.tensor([0.2, 0.7]), torch.tensor([1, 1])) is None
+    assert roc_auc(torch.tensor([0.2, 0.7]), torch.tensor([0, 0])) is None
+
+
+def test_calibration_bins_ece_and_brier():
+    probs = torch.tensor([[0.92, 0.08], [0.83, 0.17], [0.26, 0.74], [0.45, 0.55]])
+    labels = torch.tensor([0, 1, 1, 1])
+    result = calibration(probs, labels, bins=10)
+
+    # Confidences 0.92, 0.83, 0.74, 0.55 each fall in their own bin
+    assert [(b["lower"], b["count"], b["accuracy"]) for b in result["bins"]] == [
+        (0.5, 1, 1.0), (0.7, 1, 1.0), (0.8, 1, 0.0), (0.9, 1, 1.0)
+    ]
+    assert result["ece"] == pytest.approx((0.45 + 0.26 + 0.83 + 0.08) / 4, abs=1e-4)
+    expected_brier = 2 * (0.08 ** 2 + 0.83 ** 2 + 0.26 ** 2 + 0.45 ** 2) / 4
+    assert result["brier"] == pytest.approx(expected_brier, abs=1e-4)
+
+
+def test_calibration_puts_certain_predictions_in_the_top_bin():
+    result = calibration(torch.tensor([[0.0, 1.0], [1.0, 0.0]]), torch.tensor([1, 0]), bins=15)
+    assert len(result["bins"]) == 1
+    assert result["bins"][0]["upper"] == 1.0
+    assert result["ece"] == 0.0 and result["brier"] == 0.0
+
+
+def test_calibration_of_nothing():
+    assert calibration(torch.zeros(0, 2), torch.zeros(0, dtype=torch.int64)) == {
+        "ece": None, "brier": None, "bins": []
+    }
+
+
+def test_accumulator_confusion_matrix():
+    accumulator = EvaluationAccumulator(num_classes=2)
+    accumulator.update(torch.tensor([[2.0, 0.0], [0.0, 2.0]]), torch.tensor([0, 0]))
+    accumulator.update(torch.tensor([[0.0, 3.0]]), torch.tensor([1]))
+    metrics = accumulator.metrics(["benign", "malignant"])
+
+    assert metrics["confusion_matrix"]["matrix"] == [[1, 1], [0, 1]]
+    assert metrics["sensitivity"] == 1.0
+    assert metrics["specificity"] == 0.5
+    assert metrics["accuracy"] == pytest.approx(2 / 3, abs=1e-4)
+
+
+@pytest.mark.parametrize("training_state", [False, True])
+def test_evaluate_loads_weights_and_training_checkpoints(checkpoint, tmp_path, training_state):
+    from evaluate import load_weights
+
+    weights = torch.load(checkpoint)
+    path = checkpoint
+    if training_state:
+        # What train.py writes to last_checkpoint.pth
+        path = str(tmp_path / "last_checkpoint.pth")
+        torch.save({"epoch": 3, "model": weights, "optimizer": {}, "args": {"seed": 42}}, path)
+
+    model = load_weights(path, torch.device("cpu"))
+    for name, tensor in model.state_dict().items():
+        torch.testing.assert_close(tensor, weights[name])
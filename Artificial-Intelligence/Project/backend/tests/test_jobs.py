@@ -0,0 +1,183 @@
+"""Job store and worker pool: lifecycle, restart recovery and deletion."""
+
+import asyncio
+import os
+import sqlite3
+
+from src.api.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobManager, JobStore
+
+
+async def wait_until_finished(store: JobStore, *job_ids: str, timeout: float = 5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        jobs = [store.get(job_id) for job_id in job_ids]
+        if all(job is not None and job["status"] in (SUCCEEDED, FAILED) for job in jobs):
+            return jobs
+        await asyncio.sleep(0.01)
+    raise TimeoutError(f"jobs did not finish: {job_ids}")
+
+
+def test_job_lifecycle_with_progress_events(tmp_path):
+    store = JobStore(str(tmp_path))
+
+    async def count_bytes(job, input_dir, report):
+        await report(0, 2)
+        with open(os.path.join(input_dir, "image.png"), "rb") as f:
+            size = len(f.read())
+        await report(2, 2)
+        return {"bytes": size, "scale": job["params"]["scale"]}
+
+    def save_inputs(directory):
+        with open(os.path.join(directory, "image.png"), "wb") as f:
+            f.write(b"x" * 10)
+
+    async def scenario():
+        manager = JobManager(store, {"count": count_bytes}, workers=1, ttl_seconds=60)
+        manager.start()
+        try:
+            view = await manager.submit("count", {"scale": 2}, save_inputs=save_inputs)
+            assert view["status"] == QUEUED
+            events = manager.subscribe(view["job_id"])
+            (job,) = await wait_until_finished(store, view["job_id"])
+            received = []
+            while not events.empty():
+                received.append(events.get_nowait())
+            return job, received
+        finally:
+            await manager.stop()
+
+    job, received = asyncio.run(scenario())
+    assert job["status"] == SUCCEEDED
+    assert job["result"] == {"bytes": 10, "scale": 2}
+    assert (job["progress"], job["total"]) == (2, 2)
+    assert job["expires_at"] == job["finished_at"] + 60
+    assert not os.path.exists(store.input_dir(job["id"]))  # inputs dropped once run
+    assert [event for event, _ in received] == ["status", "progress", "progress", "done"]
+    assert received[-1][1]["result"] == {"bytes": 10, "scale": 2}
+
+
+def test_failed_job_records_its_error(tmp_path):
+    store = JobStore(str(tmp_path))
+
+    async def broken(job, input_dir, report):
+        raise ValueError("Invalid image")
+
+    async def scenario():
+        manager = JobManager(store, {"broken": broken}, workers=1)
+        manager.start()
+        try:
+            view = await manager.submit("broken", {})
+            return (await wait_until_finished(store, view["job_id"]))[0]
+        finally:
+            await manager.stop()
+
+    job = asyncio.run(scenario())
+    assert job["status"] == FAILED
+    assert job["error"] == "Invalid image"
+
+
+def test_restart_reruns_interrupted_and_queued_jobs(tmp_path):
+    # A previous server queued two jobs and was stopped while running one of them
+    previous = JobStore(str(tmp_path))
+    interrupted, queued = previous.create("echo", {"n": 1}), previous.create("echo", {"n": 2})
+    assert previous.claim(interrupted)
+    previous.close()
+
+    store = JobStore(str(tmp_path))
+
+    async def echo(job, input_dir, report):
+        return job["params"]["n"]
+
+    async def scenario(recover):
+        manager = JobManager(store, {"echo": echo}, workers=2)
+        manager.start(recover=recover)
+        try:
+            await asyncio.sleep(0.2)
+        finally:
+            await manager.stop()
+
+    # Without recovery a running job may belong to a live sibling process
+    asyncio.run(scenario(recover=False))
+    assert store.get(interrupted)["status"] == RUNNING
+    assert store.get(queued)["result"] == 2
+
+    asyncio.run(scenario(recover=True))
+    assert store.get(interrupted)["status"] == SUCCEEDED
+    assert store.get(interrupted)["result"] == 1
+
+
+def test_job_deleted_while_queued_never_runs(tmp_path):
+    store = JobStore(str(tmp_path))
+    started = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def blocking(job, input_dir, report):
+            started.append(job["id"])
+            await release.wait()
+            return "done"
+
+        manager = JobManager(store, {"blocking": blocking}, workers=1)
+        manager.start()
+        try:
+            first = (await manager.submit("blocking", {}))["job_id"]
+            second = (await manager.submit("blocking", {}))["job_id"]
+            while not started:
+                await asyncio.sleep(0.01)
+            # What DELETE /api/jobs/{id} does for a queued job
+            assert store.get(second)["status"] == QUEUED
+            store.delete(second)
+            release.set()
+            await wait_until_finished(store, first)
+            await asyncio.sleep(0.1)
+            return first, second
+        finally:
+            await manager.stop()
+
+    first, second = asyncio.run(scenario())
+    assert started == [first]
+    assert store.get(second) is None
+    assert not os.path.exists(store.input_dir(second))
+
+
+def test_requeue_only_the_dead_workers_jobs(tmp_path):
+    store = JobStore(str(tmp_path))
+    mine, sibling = store.create("diagnose", {}), store.create("diagnose", {})
+    assert store.claim(mine)
+    assert store.get(mine)["owner_pid"] == os.getpid()
+    assert store.claim(sibling)
+    store.update(sibling, owner_pid=os.getpid() + 1)
+
+    assert store.requeue_interrupted(owner_pid=os.getpid()) == 1
+    assert store.get(mine)["status"] == QUEUED
+    assert store.get(mine)["owner_pid"] is None
+    assert store.get(sibling)["status"] == RUNNING
+    assert store.queued() == [mine]
+
+
+def test_store_without_owner_column_is_migrated(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "jobs.sqlite3"))
+    conn.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+        "params TEXT NOT NULL, result TEXT, error TEXT, progress INTEGER NOT NULL DEFAULT 0, "
+        "total INTEGER, created_at REAL NOT NULL, started_at REAL, finished_at REAL, expires_at REAL)"
+    )
+    conn.close()
+
+    store = JobStore(str(tmp_path))
+    job_id = store.create("diagnose", {})
+    assert store.claim(job_id)
+    assert store.get(job_id)["owner_pid"] == os.getpid()
+
+
+def test_expired_jobs_are_purged(tmp_path):
+    store = JobStore(str(tmp_path))
+    expired, current, unfinished = (store.create("echo", {}) for _ in range(3))
+    store.update(expired, status=SUCCEEDED, expires_at=100.0)
+    store.update(current, status=SUCCEEDED, expires_at=300.0)
+
+    assert store.purge_expired(now=200.0) == 1
+    assert store.get(expired) is None
+    assert store.get(current) is not None and store.get(unfinished) is not None
@@ -0,0 +1,55 @@
+"""Metrics from several serve.py workers are merged into one exposition."""
+
+import os
+import subprocess
+import sys
+import textwrap
+
+from src import metrics
+
+
+WORKER = textwrap.dedent("""
+    import sys
+    from src import metrics
+    metrics.enable_multiprocess(sys.argv[1], interval=60)
+    metrics.REQUESTS.inc(endpoint="/api/diagnose", method="POST", status=200)
+    metrics.REQUEST_SECONDS.observe(0.2, endpoint="/api/diagnose")
+    metrics.IN_FLIGHT.set(1, endpoint="/api/diagnose")
+    metrics.MODEL_LOAD_SECONDS.set(float(sys.argv[2]))
+    metrics._write_snapshot()
+""")
+
+
+def sample(text: str, prefix: str) -> float:
+    (line,) = [line for line in text.splitlines() if line.startswith(prefix + " ")]
+    return float(line.rsplit(" ", 1)[1])
+
+
+def test_scrape_merges_every_worker(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    metrics.reset_multiprocess_dir(directory)
+    # Two workers that have exited, plus this process as the scraped worker
+    for load_seconds in ("3", "5"):
+        subprocess.run([sys.executable, "-c", WORKER, directory, load_seconds], check=True, cwd=os.getcwd())
+
+    for metric in metrics.REGISTRY:
+        monkeypatch.setattr(metric, "_values", {})
+    monkeypatch.setattr(metrics, "_multiprocess_dir", directory)
+    metrics.REQUESTS.inc(endpoint="/api/diagnose", method="POST", status=200)
+    metrics.REQUEST_SECONDS.observe(0.2, endpoint="/api/diagnose")
+    metrics.IN_FLIGHT.set(1, endpoint="/api/diagnose")
+    metrics.MODEL_LOAD_SECONDS.set(4.0)
+
+    text = metrics.render_metrics()
+    assert sample(text, 'diagnosis_requests_total{endpoint="/api/diagnose",method="POST",status="200"}') == 3
+    assert sample(text, 'diagnosis_request_duration_seconds_count{endpoint="/api/diagnose"}') == 3
+    assert sample(text, 'diagnosis_request_duration_seconds_bucket{endpoint="/api/diagnose",le="0.25"}') == 3
+    # Gauges only count live workers; the load time is the slowest live worker's
+    assert sample(text, 'diagnosis_requests_in_flight{endpoint="/api/diagnose"}') == 1
+    assert sample(text, "diagnosis_model_load_seconds") == 4
+
+
+def test_reset_drops_old_snapshots(tmp_path):
+    (tmp_path / "123.json").write_text("{}")
+    metrics.reset_multiprocess_dir(str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
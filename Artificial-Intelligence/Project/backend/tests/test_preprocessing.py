@@ -0,0 +1,210 @@
+"""Serving preprocessing must match the training transforms; DICOM/16-bit ingestion windowing."""
+
+import io
+import mmap
+
+import cv2
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from src.ml.preprocessing import decode_image
+from src.ml.ingest import load_image, read_dicom
+
+from conftest import make_image, make_rotated_jpeg
+
+
+# train.py's evaluation transform (also the dataset cache's resize)
+TRAINING_TRANSFORM = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+])
+
+
+def training_tensor(image_bytes: bytes) -> torch.Tensor:
+    return TRAINING_TRANSFORM(Image.open(io.BytesIO(image_bytes)).convert("RGB"))
+
+
+@pytest.mark.parametrize("size", [(1200, 900), (500, 600), (200, 180)])
+@pytest.mark.parametrize("ext", [".png", ".jpg"])
+@pytest.mark.parametrize("gray", [False, True])
+def test_full_resolution_matches_training(classifier, size, ext, gray):
+    image_bytes = make_image(*size, ext=ext, gray=gray)
+    pixels, _ = load_image(image_bytes)  # no reduced-scale decode
+    expected = training_tensor(image_bytes)
+    torch.testing.assert_close(classifier.preprocess(pixels), expected, atol=1e-6, rtol=0)
+    torch.testing.assert_close(classifier.preprocess(decode_image(image_bytes)), expected, atol=1e-6, rtol=0)
+
+
+@pytest.mark.parametrize("size", [(3000, 2400), (1800, 1400), (1000, 950)])
+@pytest.mark.parametrize("gray", [False, True])
+def test_reduced_scale_decode_stays_close_to_training(classifier, size, gray):
+    image_bytes = make_image(*size, ext=".jpg", gray=gray)
+    pixels, _ = load_image(image_bytes, classifier.decode_min_side)
+    assert min(pixels.shape[:2]) < min(size)  # decoded at 1/2 scale or less
+    difference = (classifier.preprocess(image_bytes) - training_tensor(image_bytes)).abs()
+    # Normalized units: 0.05 is about 3 gray levels
+    assert difference.max().item() < 0.05
+    assert difference.mean().item() < 0.005
+
+
+@pytest.mark.parametrize("size", [(600, 400), (2400, 1800)])
+@pytest.mark.parametrize("gray", [False, True])
+def test_exif_orientation_is_ignored_like_training(classifier, size, gray):
+    # PIL (ImageFolder, the dataset cache) does not apply EXIF Orientation
+    image_bytes = make_rotated_jpeg(*size, orientation=6, gray=gray)
+    expected = training_tensor(image_bytes)
+
+    pixels, source_size = load_image(image_bytes)
+    assert pixels.shape[:2] == size
+    assert source_size == (size[1], size[0])
+    torch.testing.assert_close(classifier.preprocess(pixels), expected, atol=1e-6, rtol=0)
+
+    difference = (classifier.preprocess(image_bytes) - expected).abs()
+    assert difference.max().item() < 0.05
+
+
+# DICOM and 16-bit grayscale ingestion: stored values -> 8-bit display values
+
+def make_dicom(
+    stored,
+    window=None,
+    slope=1.0,
+    intercept=0.0,
+    monochrome1=False,
+    voi_lut=None,
+    big_endian=False,
+    bits_stored=12
+) -> bytes:
+    """Single-frame, uncompressed 16-bit DICOM file written by pydicom."""
+    pytest.importorskip("pydicom")  # optional dependency
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRBigEndian, ExplicitVRLittleEndian, generate_uid
+
+    meta = FileMetaDataset()
+    meta.TransferSyntaxUID = ExplicitVRBigEndian if big_endian else ExplicitVRLittleEndian
+    meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.1.2"  # digital mammography
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    dataset = Dataset()
+    dataset.file_meta = meta
+    dataset.Rows, dataset.Columns = stored.shape
+    dataset.SamplesPerPixel = 1
+    dataset.PhotometricInterpretation = "MONOCHROME1" if monochrome1 else "MONOCHROME2"
+    dataset.BitsAllocated = 16
+    dataset.BitsStored = bits_stored
+    dataset.HighBit = bits_stored - 1
+    dataset.PixelRepresentation = 0
+    dataset.RescaleSlope = slope
+    dataset.RescaleIntercept = intercept
+    if window is not None:
+        dataset.WindowCenter, dataset.WindowWidth = window
+    if voi_lut is not None:
+        item = Dataset()
+        item.LUTDescriptor = [len(voi_lut), 0, 16]
+        item.LUTData = voi_lut.astype("<u2").tobytes()
+        dataset.VOILUTSequence = [item]
+    dataset.PixelData = stored.astype(">u2" if big_endian else "<u2").tobytes()
+
+    buffer = io.BytesIO()
+    dataset.save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
+
+
+def stored_pixels(height: int = 300, width: int = 250) -> np.ndarray:
+    """Smooth 12-bit image spanning most of its range."""
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 4096, (height, width)).astype(np.float32)
+    return cv2.GaussianBlur(noise, (0, 0), 3).astype(np.uint16)
+
+
+def linear_window(values: np.ndarray, center: float, width: float) -> np.ndarray:
+    """DICOM PS3.3 C.11.2.1.2.1 linear VOI function, scaled to 0-255."""
+    display = (values - (center - 0.5)) / (width - 1) + 0.5
+    return np.rint(np.clip(display, 0, 1) * 255)
+
+
+def assert_display_close(image: np.ndarray, expected: np.ndarray):
+    assert image.dtype == np.uint8 and image.ndim == 2
+    # Rounding of values that land exactly between two display levels
+    assert np.abs(image.astype(int) - expected).max() <= 1
+
+
+def test_dicom_window_and_level():
+    stored = stored_pixels()
+    image, source_size = load_image(make_dicom(stored, window=(2048, 1000)))
+    assert source_size == (250, 300)
+    assert_display_close(image, linear_window(stored.astype(float), 2048, 1000))
+
+    # pydicom's own modality + VOI LUT pipeline agrees
+    from pydicom import dcmread
+    from pydicom.pixels import apply_modality_lut, apply_voi_lut
+    dataset = dcmread(io.BytesIO(make_dicom(stored, window=(2048, 1000))))
+    reference = apply_voi_lut(apply_modality_lut(dataset.pixel_array, dataset), dataset)
+    assert_display_close(image, np.rint(reference / 4095 * 255))
+
+
+def test_dicom_monochrome1_is_inverted():
+    stored = stored_pixels()
+    image, _ = load_image(make_dicom(stored, window=(2048, 1000), monochrome1=True))
+    assert_display_close(image, 255 - linear_window(stored.astype(float), 2048, 1000))
+
+
+def test_dicom_rescale_slope_and_intercept():
+    stored = stored_pixels()
+    # The window is given in rescaled (e.g. Hounsfield-like) units
+    image, _ = load_image(make_dicom(stored, window=(3000, 4000), slope=2.0, intercept=-1024.0))
+    assert_display_close(image, linear_window(stored * 2.0 - 1024.0, 3000, 4000))
+
+
+def test_dicom_without_window_stretches_min_to_max():
+    stored = stored_pixels()
+    image, _ = load_image(make_dicom(stored))
+    low, high = float(stored.min()), float(stored.max())
+    assert_display_close(image, np.rint((stored - low) / (high - low) * 255))
+    assert image.min() == 0 and image.max() == 255
+
+
+def test_dicom_voi_lut_takes_precedence_over_window():
+    stored = stored_pixels()
+    lut = (np.sqrt(np.arange(4096) / 4095) * 65535).astype(np.uint16)
+    image, _ = load_image(make_dicom(stored, window=(100, 10), voi_lut=lut))
+    assert_display_close(image, np.rint(lut[stored] / 65535 * 255))
+
+
+def test_dicom_big_endian_matches_little_endian():
+    stored = stored_pixels()
+    little, _ = load_image(make_dicom(stored, window=(2048, 1000)))
+    big, _ = load_image(make_dicom(stored, window=(2048, 1000), big_endian=True))
+    np.testing.assert_array_equal(big, little)
+
+
+def test_dicom_pixel_data_is_mapped_not_copied(tmp_path):
+    stored = stored_pixels()
+    data = make_dicom(stored, window=(2048, 1000))
+    path = tmp_path / "image.dcm"
+    path.write_bytes(data)
+
+    # A path is memory-mapped, bytes are viewed in place
+    pixels, windowing = read_dicom(str(path))
+    assert isinstance(pixels, np.memmap)
+    np.testing.assert_array_equal(pixels, stored)
+    assert (windowing.center, windowing.width) == (2048, 1000)
+    pixels, _ = read_dicom(data)
+    assert not pixels.flags.owndata
+    np.testing.assert_array_equal(pixels, stored)
+
+    # Uploads spooled to disk reach load_image as an mmap
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        image, _ = load_image(mapped)
+    np.testing.assert_array_equal(image, load_image(data)[0])
+
+
+def test_16_bit_png_is_read_single_channel_at_full_depth():
+    stored = stored_pixels() * 16  # 16-bit range
+    image, source_size = load_image(cv2.imencode(".png", stored)[1].tobytes())
+    assert source_size == (250, 300)
+    low, high = float(stored.min()), float(stored.max())
+    assert_display_close(image, np.rint((stored - low) / (high - low) * 255))
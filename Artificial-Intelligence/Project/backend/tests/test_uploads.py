@@ -0,0 +1,25 @@
+"""Zero-copy access to spooled uploads."""
+
+import mmap
+import tempfile
+
+from src.api.uploads import map_upload
+
+
+def test_small_spooled_upload_stays_in_memory():
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024)
+    spooled.write(b"x" * 100)
+    assert map_upload(spooled) == b"x" * 100
+    assert not spooled._rolled
+
+
+def test_upload_on_disk_is_mapped():
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024)
+    spooled.write(b"x" * 4096)
+    mapped = map_upload(spooled)
+    assert isinstance(mapped, mmap.mmap)
+    assert mapped[:] == b"x" * 4096
+
+
+def test_empty_upload():
+    assert map_upload(tempfile.SpooledTemporaryFile(max_size=1024)) == b""
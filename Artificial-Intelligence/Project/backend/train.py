@@ -5,19 +5,49 @@ Training Script for Breast Tumor Classifier
 Uses Transfer Learning with ResNet50 pretrained on ImageNet.
 Best for small datasets (<5000 images) - achieves 80-90% accuracy.
 
+Images are decoded and resized once into a memory-mapped cache under
+<data-dir>/.cache (see src/ml/dataset_cache.py); epochs only apply the
+random augmentations. Pass --no-cache to read the image files directly.
+
 Usage:
     python3 train.py --data-dir ../datasets/mammograms --epochs 30
 """
 
 import os
+import json
+import time
+import random
 import argparse
+import contextlib
 
+import numpy as np
 import torch
 import torch.nn as nn
 from torch.utils.data import DataLoader
 from torchvision import datasets, transforms
 
 from src.ml.cnn_classifier import TransferLearningCNN
+from src.ml.dataset_cache import cached_image_folder
+from src.ml.dataset_index import update_index
+from src.ml.checkpoint import AsyncCheckpointer, atomic_save, load_checkpoint, rng_state, set_rng_state
+from src.ml.feature_cache import build_feature_cache
+from src.ml.evaluation import evaluate_model, format_summary, write_report
+
+
+# --precision -> autocast dtype (None = plain FP32)
+PRECISIONS = {
+    "fp32": None,
+    "bf16": torch.bfloat16,
+    "fp16": torch.float16,
+}
+
+# Flags a resumed run must share with its checkpoint: they change the
+# numerics, the batch order or the meaning of the recorded throughput
+RESUME_FLAGS = ("precision", "channels_last", "seed", "batch_size")
+
+# Side length of stored images per split: training crops from 256, evaluation resizes to 224
+TRAIN_IMAGE_SIZE = 256
+EVAL_IMAGE_SIZE = 224
 
 
 def get_device():
@@ -34,10 +64,66 @@ def get_device():
     return device
 
 
-def get_transforms():
-    """Get data augmentation transforms for transfer learning."""
+def seed_everything(seed: int):
+    """Same seed, same initialization, shuffling and augmentations (for comparing runs)."""
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def autocast(device: torch.device, precision: str):
+    """Autocast context for --precision (a no-op for fp32)."""
+    if PRECISIONS[precision] is None:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=device.type, dtype=PRECISIONS[precision])
+
+
+def run_mode(args) -> str:
+    """Precision and memory format of a run, e.g. "bf16+channels_last"."""
+    return args.precision + ("+channels_last" if args.channels_last else "")
+
+
+def memory_format(args) -> torch.memory_format:
+    return torch.channels_last if args.channels_last else torch.contiguous_format
+
+
+def to_device(images, labels, device: torch.device, args):
+    return (images.to(device, memory_format=memory_format(args), non_blocking=True),
+            labels.to(device, non_blocking=True))
+
+
+def train_step(model, images, labels, criterion, optimizer, scaler, args):
+    """One optimizer step; returns the outputs and loss."""
+    optimizer.zero_grad()
+    with autocast(images.device, args.precision):
+        outputs = model(images)
+        loss = criterion(outputs, labels)
+    
+    if scaler is not None:
+        # FP16 gradients are scaled to avoid underflow; unscale before clipping
+        scaler.scale(loss).backward()
+        scaler.unscale_(optimizer)
+        torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
+        scaler.step(optimizer)
+        scaler.update()
+    else:
+        loss.backward()
+        # Gradient clipping for stability
+        torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
+        optimizer.step()
+    return outputs, loss
+
+
+def get_transforms(resize: bool = True):
+    """
+    Get data augmentation transforms for transfer learning.
+    
+    Args:
+        resize: Include the initial resize; False for images that are
+            already stored at that size (the dataset cache)
+    """
     train_transform = transforms.Compose([
-        transforms.Resize((256, 256)),
+        *([transforms.Resize((TRAIN_IMAGE_SIZE, TRAIN_IMAGE_SIZE))] if resize else []),
         transforms.RandomResizedCrop(224, scale=(0.8, 1.0)),
         transforms.RandomHorizontalFlip(),
         transforms.RandomVerticalFlip(),
@@ -49,7 +135,7 @@ def get_transforms():
     ])
     
     val_transform = transforms.Compose([
-        transforms.Resize((224, 224)),
+        *([transforms.Resize((EVAL_IMAGE_SIZE, EVAL_IMAGE_SIZE))] if resize else []),
         transforms.ToTensor(),
         transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
     ])
@@ -57,6 +143,93 @@ def get_transforms():
     return train_transform, val_transform
 
 
+def index_split(args, split_dir: str):
+    """Update a split's manifest and report what changed since the last run."""
+    split = os.path.basename(os.path.normpath(split_dir))
+    index, changes = update_index(split_dir, os.path.join(args.cache_dir, f"{split}.manifest.json"))
+    if any(changes.values()):
+        print(f"  {split}: {len(changes['added'])} added, {len(changes['modified'])} modified, "
+              f"{len(changes['removed'])} removed since the last manifest")
+    return index
+
+
+def class_weights_for(counts: np.ndarray) -> torch.Tensor:
+    """Inverse-frequency weights, total / (num_classes * count); 1.0 for empty classes."""
+    counts = counts.astype(np.float64)
+    weights = np.where(counts > 0, counts.sum() / (len(counts) * np.maximum(counts, 1)), 1.0)
+    return torch.tensor(weights, dtype=torch.float32)
+
+
+def load_split(args, split_dir: str, image_size: int, transform, index=None):
+    """
+    ImageFolder for a split, served from the preprocessed cache unless --no-cache.
+    
+    With the split's DatasetIndex, the cache reuses its fingerprint instead
+    of checking the files again.
+    """
+    if args.no_cache:
+        return datasets.ImageFolder(split_dir, transform=transform)
+    return cached_image_folder(split_dir, args.cache_dir, image_size, transform=transform, index=index)
+
+
+def make_loader(dataset, args, device: torch.device, shuffle: bool = False, drop_last: bool = False) -> DataLoader:
+    """DataLoader with the worker, prefetch and pinned-memory settings from the command line."""
+    workers = args.num_workers
+    return DataLoader(
+        dataset,
+        batch_size=args.batch_size,
+        shuffle=shuffle,
+        drop_last=drop_last,
+        num_workers=workers,
+        # Pinned pages allow asynchronous host-to-GPU copies
+        pin_memory=device.type == "cuda" if args.pin_memory is None else args.pin_memory,
+        persistent_workers=workers > 0,
+        prefetch_factor=args.prefetch_factor if workers > 0 else None
+    )
+
+
+def benchmark_loader(loader, model, criterion, optimizer, scaler, device, args) -> dict:
+    """
+    Throughput of the input pipeline alone versus a full training step.
+    
+    When loading alone is not much faster than end-to-end, the model is
+    waiting for data: raise --num-workers (or --prefetch-factor).
+    """
+    def measure(step) -> float:
+        images_seen, start, iterator = 0, None, iter(loader)
+        for index in range(args.benchmark_loader + 1):
+            try:
+                images, labels = next(iterator)
+            except StopIteration:
+                iterator = iter(loader)
+                images, labels = next(iterator)
+            step(images, labels)
+            if index == 0:
+                # The first batch pays for worker start-up
+                start = time.perf_counter()
+            else:
+                images_seen += labels.size(0)
+        return images_seen / (time.perf_counter() - start)
+    
+    def load_only(images, labels):
+        to_device(images, labels, device, args)
+    
+    def full_step(images, labels):
+        images, labels = to_device(images, labels, device, args)
+        train_step(model, images, labels, criterion, optimizer, scaler, args)
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+    
+    model.train()
+    loader_rate = measure(load_only)
+    end_to_end_rate = measure(full_step)
+    return {
+        "loader_images_per_sec": round(loader_rate, 1),
+        "end_to_end_images_per_sec": round(end_to_end_rate, 1),
+        "input_bound": loader_rate < 1.2 * end_to_end_rate,
+    }
+
+
 def train(args):
     """Main training function."""
     print("=" * 60)
@@ -66,10 +239,13 @@ def train(args):
     device = get_device()
     print(f"PyTorch version: {torch.__version__}")
     print(f"Using Transfer Learning with ResNet50")
+    print(f"Precision: {args.precision}, memory format: {'channels_last' if args.channels_last else 'NCHW'}, "
+          f"seed: {args.seed}")
     print()
+    seed_everything(args.seed)
     
-    # Get transforms
-    train_transform, val_transform = get_transforms()
+    # Get transforms (cached images are already resized)
+    train_transform, val_transform = get_transforms(resize=args.no_cache)
     
     # Load datasets
     print("Loading datasets...")
@@ -77,40 +253,36 @@ def train(args):
     val_dir = os.path.join(args.data_dir, 'val')
     test_dir = os.path.join(args.data_dir, 'test')
     
-    train_dataset = datasets.ImageFolder(train_dir, transform=train_transform)
-    val_dataset = datasets.ImageFolder(val_dir, transform=val_transform)
+    train_index = index_split(args, train_dir)
+    train_dataset = load_split(args, train_dir, TRAIN_IMAGE_SIZE, train_transform, train_index)
+    val_dataset = load_split(args, val_dir, EVAL_IMAGE_SIZE, val_transform)
     
     print(f"Training samples: {len(train_dataset)}")
     print(f"Validation samples: {len(val_dataset)}")
     print(f"Classes: {train_dataset.classes}")
     
-    # Class weights for imbalanced data
-    class_counts = [0, 0]
-    for _, label in train_dataset:
-        class_counts[label] += 1
-    
-    total = sum(class_counts)
-    class_weights = torch.tensor([
-        total / (2 * class_counts[0]) if class_counts[0] > 0 else 1.0,
-        total / (2 * class_counts[1]) if class_counts[1] > 0 else 1.0
-    ], dtype=torch.float32).to(device)
+    # Class weights for imbalanced data, from the manifest's labels (no decoding)
+    class_counts = train_index.class_counts()
+    class_weights = class_weights_for(class_counts).to(device)
     
-    print(f"Class distribution: benign={class_counts[0]}, malignant={class_counts[1]}")
+    print("Class distribution: " + ", ".join(
+        f"{name}={count}" for name, count in zip(train_index.classes, class_counts)))
     
-    # Data loaders
-    train_loader = DataLoader(
-        train_dataset, batch_size=args.batch_size, shuffle=True,
-        num_workers=0, pin_memory=False
-    )
-    val_loader = DataLoader(
-        val_dataset, batch_size=args.batch_size, shuffle=False,
-        num_workers=0, pin_memory=False
+    # Data loaders; BatchNorm1d in the head cannot train on a final batch of one
+    train_loader = make_loader(
+        train_dataset, args, device, shuffle=True,
+        drop_last=len(train_dataset) % args.batch_size == 1
     )
+    val_loader = make_loader(val_dataset, args, device)
+    print(f"Data loader workers: {args.num_workers} (prefetch factor {args.prefetch_factor})")
     
     # Create model
     print(f"\nCreating model...")
     model = TransferLearningCNN(num_classes=2, dropout_rate=args.dropout)
     model = model.to(device)
+    if args.channels_last:
+        # NHWC lets oneDNN/cuDNN convolutions skip layout conversions
+        model = model.to(memory_format=torch.channels_last)
     
     total_params = sum(p.numel() for p in model.parameters())
     trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
@@ -127,32 +299,72 @@ def train(args):
     
     print(f"Learning rate: {lr}")
     
+    # Loss scaling is only needed for FP16 (bfloat16 has FP32's exponent range)
+    scaler = torch.amp.GradScaler("cuda") if args.precision == "fp16" else None
+    
+    if args.benchmark_loader:
+        print(f"\nBenchmarking the input pipeline over {args.benchmark_loader} batches...")
+        result = benchmark_loader(train_loader, model, criterion, optimizer, scaler, device, args)
+        print(f"Loader only: {result['loader_images_per_sec']} images/s")
+        print(f"End to end:  {result['end_to_end_images_per_sec']} images/s")
+        if result["input_bound"]:
+            print("Training is input-bound: increase --num-workers or --prefetch-factor")
+        return None
+    
     # Create model directory
     os.makedirs(args.model_dir, exist_ok=True)
+    checkpoint_path = os.path.join(args.model_dir, 'last_checkpoint.pth')
+    checkpointer = AsyncCheckpointer()
+    
+    best_val_acc = 0.0
+    patience_counter = 0
+    epoch_throughput = []
+    start_epoch = 0
+    
+    if args.resume is not None:
+        resume_path = args.resume or checkpoint_path
+        if os.path.exists(resume_path):
+            state = load_checkpoint(resume_path)
+            saved_args = state.get("args", {})
+            mismatched = [flag for flag in RESUME_FLAGS
+                          if flag in saved_args and saved_args[flag] != getattr(args, flag)]
+            if mismatched:
+                checkpointer.close()
+                print(f"\nError: {resume_path} was trained with different settings: " + ", ".join(
+                    f"{flag} {saved_args[flag]} (now {getattr(args, flag)})" for flag in mismatched))
+                print("Resume with the same flags, or start a new run")
+                raise SystemExit(1)
+            model.load_state_dict(state["model"])
+            optimizer.load_state_dict(state["optimizer"])
+            scheduler.load_state_dict(state["scheduler"])
+            if scaler is not None and state.get("scaler") is not None:
+                scaler.load_state_dict(state["scaler"])
+            set_rng_state(state["rng"])
+            start_epoch = state["epoch"]
+            best_val_acc = state["best_val_acc"]
+            patience_counter = state["patience_counter"]
+            # Samples from older checkpoints carry no mode and can't be compared
+            epoch_throughput = [sample for sample in state["epoch_throughput"] if isinstance(sample, dict)]
+            print(f"\nResumed from {resume_path} after epoch {start_epoch}")
+            if patience_counter >= args.patience:
+                print("That run had already stopped early")
+                start_epoch = args.epochs
+        else:
+            print(f"\nNo checkpoint at {resume_path}, starting from scratch")
     
     # Training loop
     print(f"\nStarting training for {args.epochs} epochs...")
     print("-" * 60)
     
-    best_val_acc = 0.0
-    patience_counter = 0
-    
-    for epoch in range(args.epochs):
+    for epoch in range(start_epoch, args.epochs):
         # Training
         model.train()
         train_loss, train_correct, train_total = 0.0, 0, 0
+        epoch_start = time.perf_counter()
         
         for images, labels in train_loader:
-            images, labels = images.to(device), labels.to(device)
-            
-            optimizer.zero_grad()
-            outputs = model(images)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            
-            # Gradient clipping for stability
-            torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
-            optimizer.step()
+            images, labels = to_device(images, labels, device, args)
+            outputs, loss = train_step(model, images, labels, criterion, optimizer, scaler, args)
             
             train_loss += loss.item()
             _, predicted = outputs.max(1)
@@ -161,49 +373,62 @@ def train(args):
         
         train_loss /= len(train_loader)
         train_acc = train_correct / train_total
+        # Tagged with the mode, so only like-for-like samples are ever averaged;
+        # the first epoch of each process includes warm-up (allocator growth,
+        # kernel selection)
+        epoch_throughput.append({
+            "mode": run_mode(args),
+            "images_per_sec": train_total / (time.perf_counter() - epoch_start),
+            "warmup": epoch == start_epoch,
+        })
         
-        # Validation
-        model.eval()
-        val_loss, val_correct, val_total = 0.0, 0, 0
-        
-        with torch.no_grad():
-            for images, labels in val_loader:
-                images, labels = images.to(device), labels.to(device)
-                outputs = model(images)
-                loss = criterion(outputs, labels)
-                
-                val_loss += loss.item()
-                _, predicted = outputs.max(1)
-                val_total += labels.size(0)
-                val_correct += predicted.eq(labels).sum().item()
-        
-        val_loss /= len(val_loader)
-        val_acc = val_correct / val_total
+        # Validation (every --val-every epochs and after the last one)
+        validate = (epoch + 1) % args.val_every == 0 or epoch + 1 == args.epochs
+        if validate:
+            val_acc = evaluate_model(
+                model, val_loader, device, criterion=criterion,
+                autocast_dtype=PRECISIONS[args.precision], memory_format=memory_format(args)
+            ).accuracy
         
         scheduler.step()
         
         # Print progress
         current_lr = optimizer.param_groups[0]['lr']
         print(f"Epoch {epoch+1:3d}/{args.epochs} | "
-              f"Train: {train_acc:.4f} | Val: {val_acc:.4f} | "
-              f"LR: {current_lr:.2e}")
+              f"Train: {train_acc:.4f} | Val: {f'{val_acc:.4f}' if validate else '  -   '} | "
+              f"LR: {current_lr:.2e} | {epoch_throughput[-1]['images_per_sec']:.1f} img/s")
         
         # Save best model
-        if val_acc > best_val_acc:
+        if validate and val_acc > best_val_acc:
             best_val_acc = val_acc
-            torch.save(model.state_dict(), os.path.join(args.model_dir, 'best_model.pth'))
+            checkpointer.save(model.state_dict(), os.path.join(args.model_dir, 'best_model.pth'))
             patience_counter = 0
             print(f"  ↳ New best model saved! (val_acc: {val_acc:.4f})")
-        else:
+        elif validate:
             patience_counter += 1
         
+        # Full training state for --resume, written while the next epoch runs
+        checkpointer.save({
+            "epoch": epoch + 1,
+            "model": model.state_dict(),
+            "optimizer": optimizer.state_dict(),
+            "scheduler": scheduler.state_dict(),
+            "scaler": scaler.state_dict() if scaler is not None else None,
+            "rng": rng_state(),
+            "best_val_acc": best_val_acc,
+            "patience_counter": patience_counter,
+            "epoch_throughput": epoch_throughput,
+            "args": vars(args),
+        }, checkpoint_path)
+        
         # Early stopping
         if patience_counter >= args.patience:
             print(f"\nEarly stopping at epoch {epoch+1}")
             break
     
     # Save final model
-    torch.save(model.state_dict(), os.path.join(args.model_dir, 'final_model.pth'))
+    checkpointer.save(model.state_dict(), os.path.join(args.model_dir, 'final_model.pth'))
+    checkpointer.close()
     
     print(f"\n" + "=" * 60)
     print(f"Training complete!")
@@ -216,45 +441,170 @@ def train(args):
         print("Evaluating on Test Set")
         print("=" * 60)
         
-        test_dataset = datasets.ImageFolder(test_dir, transform=val_transform)
-        test_loader = DataLoader(test_dataset, batch_size=args.batch_size, shuffle=False)
+        test_dataset = load_split(args, test_dir, EVAL_IMAGE_SIZE, val_transform)
+        test_loader = make_loader(test_dataset, args, device)
         
         # Load best model
         model.load_state_dict(torch.load(os.path.join(args.model_dir, 'best_model.pth')))
-        model.eval()
         
-        test_correct, test_total = 0, 0
-        all_preds, all_labels = [], []
+        metrics = evaluate_model(
+            model, test_loader, device,
+            autocast_dtype=PRECISIONS[args.precision], memory_format=memory_format(args)
+        ).metrics(test_dataset.classes)
+        test_acc = metrics["accuracy"]
+        print(format_summary(metrics))
         
-        with torch.no_grad():
-            for images, labels in test_loader:
-                images, labels = images.to(device), labels.to(device)
-                outputs = model(images)
-                _, predicted = outputs.max(1)
-                test_total += labels.size(0)
-                test_correct += predicted.eq(labels).sum().item()
-                all_preds.extend(predicted.cpu().numpy())
-                all_labels.extend(labels.cpu().numpy())
-        
-        test_acc = test_correct / test_total
-        print(f"Test Accuracy: {test_acc:.4f}")
+        report_path = os.path.join(args.model_dir, 'evaluation_report.json')
+        write_report({
+            "checkpoint": os.path.join(args.model_dir, 'best_model.pth'),
+            "data_dir": test_dir,
+            "precision": args.precision,
+            **metrics,
+        }, report_path)
+        print(f"Report written to {report_path}")
+    
+    samples = [sample for sample in epoch_throughput if sample["mode"] == run_mode(args)]
+    steady = [sample["images_per_sec"] for sample in samples if not sample["warmup"]]
+    record_run(args, {
+        "device": device.type,
+        "batch_size": args.batch_size,
+        "epochs": len(samples),
+        "images_per_sec": round(float(np.mean(steady or [sample["images_per_sec"] for sample in samples])), 2),
+        "best_val_acc": round(best_val_acc, 4),
+        "test_acc": round(test_acc, 4) if os.path.exists(test_dir) else None,
+    })
+    
+    return best_val_acc
+
+
+def train_head_only(args):
+    """
+    Retrain only the classifier head on cached backbone features.
+    
+    The backbone (from --backbone-checkpoint, else ImageNet) is frozen and
+    run once per image; its pooled 2048-d features are cached on disk and
+    reused, so later runs only embed new or changed images. The head then
+    trains on the in-memory features in seconds. There is no image
+    augmentation in this mode.
+    """
+    print("=" * 60)
+    print("Breast Tumor Classifier Head Training (frozen backbone)")
+    print("=" * 60)
+    
+    device = get_device()
+    seed_everything(args.seed)
+    _, val_transform = get_transforms()
+    
+    backbone_path = args.backbone_checkpoint
+    if backbone_path is None and os.path.exists(os.path.join(args.model_dir, 'best_model.pth')):
+        backbone_path = os.path.join(args.model_dir, 'best_model.pth')
+    model = TransferLearningCNN(num_classes=2, dropout_rate=args.dropout, pretrained=backbone_path is None)
+    if backbone_path is not None:
+        print(f"Backbone: {backbone_path}")
+        model.load_state_dict(torch.load(backbone_path, map_location="cpu"))
+    else:
+        print("Backbone: ImageNet weights")
+    model = model.to(device).eval()
+    
+    print("\nIndexing datasets...")
+    splits = {}
+    for split in ('train', 'val'):
+        split_dir = os.path.join(args.data_dir, split)
+        features, labels = build_feature_cache(
+            index_split(args, split_dir),
+            os.path.join(args.cache_dir, 'features', split),
+            model, val_transform, device,
+            batch_size=args.batch_size, num_workers=args.num_workers
+        )
+        splits[split] = (torch.from_numpy(np.array(features)).to(device), torch.from_numpy(labels).to(device))
+    (train_x, train_y), (val_x, val_y) = splits['train'], splits['val']
+    print(f"Training samples: {len(train_y)}, validation samples: {len(val_y)}")
+    
+    head = model.backbone.fc
+    counts = np.bincount(train_y.cpu().numpy(), minlength=2)
+    criterion = nn.CrossEntropyLoss(weight=class_weights_for(counts).to(device))
+    optimizer = torch.optim.AdamW(head.parameters(), lr=args.learning_rate, weight_decay=0.01)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=args.epochs)
+    
+    print(f"\nTraining head for {args.epochs} epochs...")
+    print("-" * 60)
+    best_val_acc, best_head, patience_counter = 0.0, None, 0
+    start = time.perf_counter()
+    
+    for epoch in range(args.epochs):
+        head.train()
+        order = torch.randperm(len(train_y), device=device)
+        for first in range(0, len(order), args.batch_size):
+            batch = order[first:first + args.batch_size]
+            if len(batch) < 2:
+                continue  # BatchNorm1d cannot train on a batch of one
+            optimizer.zero_grad()
+            loss = criterion(head(train_x[batch]), train_y[batch])
+            loss.backward()
+            optimizer.step()
+        scheduler.step()
         
-        # Per-class accuracy
-        from collections import defaultdict
-        class_correct = defaultdict(int)
-        class_total = defaultdict(int)
-        for pred, label in zip(all_preds, all_labels):
-            class_total[label] += 1
-            if pred == label:
-                class_correct[label] += 1
+        head.eval()
+        with torch.no_grad():
+            train_acc = head(train_x).argmax(1).eq(train_y).float().mean().item()
+            val_acc = head(val_x).argmax(1).eq(val_y).float().mean().item()
+        print(f"Epoch {epoch+1:3d}/{args.epochs} | Train: {train_acc:.4f} | Val: {val_acc:.4f}")
         
-        for cls_idx, cls_name in enumerate(test_dataset.classes):
-            acc = class_correct[cls_idx] / class_total[cls_idx] if class_total[cls_idx] > 0 else 0
-            print(f"  {cls_name}: {acc:.4f} ({class_correct[cls_idx]}/{class_total[cls_idx]})")
+        if val_acc > best_val_acc:
+            best_val_acc, patience_counter = val_acc, 0
+            best_head = {name: tensor.clone() for name, tensor in head.state_dict().items()}
+        else:
+            patience_counter += 1
+            if patience_counter >= args.patience:
+                print(f"\nEarly stopping at epoch {epoch+1}")
+                break
+    
+    if best_head is not None:
+        head.load_state_dict(best_head)
+    os.makedirs(args.model_dir, exist_ok=True)
+    # Full model state dict: serving loads it like any other checkpoint
+    atomic_save(model.state_dict(), os.path.join(args.model_dir, 'best_model.pth'))
     
+    print(f"\n" + "=" * 60)
+    print(f"Head training complete in {time.perf_counter() - start:.1f}s")
+    print(f"Best validation accuracy: {best_val_acc:.4f}")
+    print(f"Model saved to: {args.model_dir}/best_model.pth")
     return best_val_acc
 
 
+def record_run(args, summary: dict):
+    """
+    Store this run's throughput and accuracy in <model-dir>/training_runs.json,
+    keyed by precision and memory format, and compare it with the FP32
+    baseline if one was recorded under the same conditions (seed, device
+    and batch size).
+    """
+    mode = run_mode(args)
+    path = os.path.join(args.model_dir, 'training_runs.json')
+    try:
+        with open(path) as f:
+            runs = json.load(f)
+    except (OSError, ValueError):
+        runs = {}
+    runs[mode] = {"mode": mode, "seed": args.seed, **summary}
+    with open(path, 'w') as f:
+        json.dump(runs, f, indent=2)
+    
+    baseline = runs.get("fp32")
+    if mode == "fp32" or baseline is None:
+        return
+    comparable = all(baseline.get(key) == runs[mode][key] for key in ("seed", "device", "batch_size"))
+    if not comparable:
+        print("\nNot comparing with the fp32 baseline: it was recorded with a different seed, device or batch size")
+        return
+    print(f"\n{mode} vs fp32 baseline (seed {args.seed}):")
+    print(f"  Throughput: {summary['images_per_sec']:.1f} vs {baseline['images_per_sec']:.1f} img/s "
+          f"({summary['images_per_sec'] / max(baseline['images_per_sec'], 1e-9):.2f}x)")
+    print(f"  Best val accuracy: {summary['best_val_acc']:.4f} vs {baseline['best_val_acc']:.4f}")
+    if summary["test_acc"] is not None and baseline.get("test_acc") is not None:
+        print(f"  Test accuracy: {summary['test_acc']:.4f} vs {baseline['test_acc']:.4f}")
+
+
 def main():
     parser = argparse.ArgumentParser(description='Train Breast Tumor Classifier')
     parser.add_argument('--data-dir', type=str, default='../datasets/mammograms')
@@ -264,6 +614,31 @@ def main():
     parser.add_argument('--learning-rate', type=float, default=0.001)
     parser.add_argument('--dropout', type=float, default=0.5)
     parser.add_argument('--patience', type=int, default=10)
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Preprocessed image cache (default: <data-dir>/.cache)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Decode the image files every epoch instead of using the cache')
+    parser.add_argument('--num-workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='Data loading worker processes (0 = load in the training process)')
+    parser.add_argument('--prefetch-factor', type=int, default=2,
+                        help='Batches loaded ahead by each worker')
+    parser.add_argument('--pin-memory', action=argparse.BooleanOptionalAction, default=None,
+                        help='Pin host memory for faster GPU copies (default: on for CUDA)')
+    parser.add_argument('--precision', type=str, choices=list(PRECISIONS), default='fp32',
+                        help='Mixed precision: bf16 autocast (CPU or GPU) or fp16 with loss scaling (CUDA)')
+    parser.add_argument('--channels-last', action='store_true',
+                        help='Train with NHWC (channels_last) memory format')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--val-every', type=int, default=1, metavar='EPOCHS',
+                        help='Validate every N epochs (and after the last); early-stopping patience counts validations')
+    parser.add_argument('--resume', type=str, nargs='?', const='', default=None, metavar='CHECKPOINT',
+                        help='Continue an interrupted run (default checkpoint: <model-dir>/last_checkpoint.pth)')
+    parser.add_argument('--head-only', action='store_true',
+                        help='Freeze the backbone and train only the fc head on cached features')
+    parser.add_argument('--backbone-checkpoint', type=str, default=None,
+                        help='Backbone for --head-only (default: <model-dir>/best_model.pth, else ImageNet)')
+    parser.add_argument('--benchmark-loader', type=int, default=0, metavar='BATCHES',
+                        help='Measure loader-only vs end-to-end images/s over this many batches, then exit')
     
     args = parser.parse_args()
     
@@ -275,8 +650,20 @@ def main():
     if not os.path.exists(args.data_dir):
         print(f"Error: Data directory not found: {args.data_dir}")
         return 1
+    if args.cache_dir is None:
+        args.cache_dir = os.path.join(args.data_dir, '.cache')
+    if args.precision == 'fp16' and not torch.cuda.is_available():
+        print("Error: --precision fp16 needs CUDA; use bf16 on CPU")
+        return 1
     
-    train(args)
+    if args.head_only and args.resume is not None:
+        print("Error: --resume continues full training; --head-only runs are short enough to rerun")
+        return 1
+    
+    if args.head_only:
+        train_head_only(args)
+    else:
+        train(args)
     return 0
 
 